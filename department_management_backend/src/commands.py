@@ -0,0 +1,159 @@
+import click
+
+def register_commands(app):
+    """تسجيل أوامر سطر الأوامر الخاصة بالتطبيق"""
+    
+    @app.cli.command('index-advisor')
+    @click.option('--all', 'show_all', is_flag=True, help='عرض خطط جميع الاستعلامات وليس فقط التي تمسح الجداول كاملة')
+    def index_advisor_command(show_all):
+        """فحص خطط EXPLAIN لاستعلامات المسارات والإبلاغ عن المسح الكامل للجداول"""
+        from src.services.index_advisor import analyze_endpoint_queries
+        
+        report = analyze_endpoint_queries()
+        flagged = [item for item in report if item['full_scans']]
+        
+        for item in report:
+            if not item['full_scans'] and not show_all:
+                continue
+            status = 'FULL SCAN' if item['full_scans'] else 'OK'
+            click.echo(f"[{status}] {item['query']}")
+            click.echo(f"    {item['sql']}")
+            for line in item['full_scans'] or item['plan']:
+                click.echo(f"    -> {line}")
+        
+        click.echo(f'{len(flagged)} من {len(report)} استعلامات تمسح جداول كاملة')
+    
+    @app.cli.command('replay-failed-audit')
+    def replay_failed_audit_command():
+        """إعادة إدراج سجلات المراجعة التي تعذرت كتابتها وحُفظت في AUDIT_FAILED_PATH"""
+        from src.services.audit_writer import audit_writer
+        
+        audit_writer.configure(app)
+        written, remaining = audit_writer.replay_failed()
+        click.echo(f'تمت كتابة {written} سجل، وتبقى {remaining}')
+    
+    @app.cli.command('process-rayat-import')
+    @click.argument('import_id', type=int)
+    def process_rayat_import_command(import_id):
+        """معالجة ملف رايات مرفوع"""
+        from src.services.rayat_import import process_rayat_import
+        
+        rayat_import = process_rayat_import(import_id)
+        click.echo(f'{rayat_import.status}: {rayat_import.records_success} ناجح، {rayat_import.records_failed} فاشل')
+    
+    @app.cli.command('run-jobs')
+    @click.option('--concurrency', type=int, default=None, help='عدد العمال')
+    def run_jobs_command(concurrency):
+        """تشغيل منفذ مهام الخلفية في عملية مستقلة"""
+        from src.services.job_runner import job_runner
+        
+        if concurrency:
+            app.config['JOB_RUNNER_CONCURRENCY'] = concurrency
+        click.echo(f'تشغيل منفذ المهام: {job_runner.worker_id}')
+        job_runner.run_forever(app)
+    
+    @app.cli.command('rebuild-dashboard-rollups')
+    def rebuild_dashboard_rollups_command():
+        """إعادة بناء تجميعات لوحة التحكم من الجداول الأصلية"""
+        from src.services.dashboard_metrics import rebuild_dashboard_rollups
+        
+        rebuild_dashboard_rollups()
+        click.echo('تم إعادة بناء تجميعات لوحة التحكم')
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """إعادة بناء فهرس البحث النصي من الجداول الأصلية"""
+        from src.services.search import rebuild_search_index
+        
+        count = rebuild_search_index()
+        click.echo(f'تمت فهرسة {count} سجل')
+    
+    @app.cli.command('rebuild-behavior-scorecards')
+    def rebuild_behavior_scorecards_command():
+        """إعادة بناء بطاقات سلوك المتدربين من سجلات السلوك"""
+        from src.services.behavior_scorecards import rebuild_scorecards
+        
+        count = rebuild_scorecards()
+        click.echo(f'تم تجميع {count} سجل سلوك')
+    
+    @app.cli.command('rebuild-kpi-latest')
+    def rebuild_kpi_latest_command():
+        """إعادة بناء جدول آخر قيم مؤشرات الأداء"""
+        from src.services.kpi_latest import rebuild_latest_values
+        
+        count = rebuild_latest_values()
+        click.echo(f'تم تحديث آخر قيمة لـ {count} مؤشر')
+    
+    @app.cli.command('rebuild-kpi-rollups')
+    @click.option('--kpi-id', type=int, default=None, help='إعادة البناء لمؤشر واحد فقط')
+    def rebuild_kpi_rollups_command(kpi_id):
+        """إعادة بناء تجميعات السلاسل الزمنية لمؤشرات الأداء"""
+        from src.services.kpi_rollups import rebuild_kpi_rollups
+        
+        count = rebuild_kpi_rollups(kpi_id)
+        click.echo(f'تم تجميع {count} قيمة')
+    
+    @app.cli.command('compute-quality-scores')
+    @click.argument('period')
+    def compute_quality_scores_command(period):
+        """إعادة حساب درجات معايير الجودة ومؤشر القسم لفترة (2024 أو 2024-Q1 أو 2024-03)"""
+        from src.models.quality import db
+        from src.services.quality_scores import compute_quality_scores, get_quality_scores
+        
+        compute_quality_scores(period)
+        db.session.commit()
+        index = get_quality_scores(period)['index']
+        click.echo(f"مؤشر القسم للفترة {period}: {index['score']}")
+    
+    @app.cli.command('send-follow-up-reminders')
+    def send_follow_up_reminders_command():
+        """إنشاء تذكيرات متابعات سجلات السلوك المستحقة اليوم والمتأخرة"""
+        from src.services.follow_ups import send_follow_up_reminders
+        
+        count = send_follow_up_reminders(app.config.get('FOLLOW_UP_REMINDER_BATCH_SIZE', 500))
+        click.echo(f'تم إنشاء {count} تذكير')
+    
+    @app.cli.command('prune-report-cache')
+    def prune_report_cache_command():
+        """حذف لقطات بيانات التقارير المنتهية وملفات الإخراج غير المستخدمة"""
+        from src.services.report_renderer import prune_report_cache
+        
+        click.echo(f'تم حذف {prune_report_cache()} ملف')
+    
+    @app.cli.command('flush-survey-buffer')
+    def flush_survey_buffer_command():
+        """نقل استجابات الاستبيانات المنتظرة في السجل المحلي إلى قاعدة البيانات"""
+        from department_management_backend.src.services.survey_buffer import survey_buffer
+        
+        survey_buffer.configure(app)
+        count = survey_buffer.flush()
+        click.echo(f'تم نقل {count} استجابة')
+        for entry in survey_buffer.failed_entries():
+            click.echo(f"[FAILED] {entry['submission_key']}: {entry['error']}")
+    
+    @app.cli.command('rebuild-survey-results')
+    @click.option('--survey-id', type=int, default=None, help='إعادة الحساب لاستبيان واحد فقط')
+    def rebuild_survey_results_command(survey_id):
+        """إعادة حساب تجميعات نتائج الاستبيانات من الإجابات الأصلية"""
+        from department_management_backend.src.services.survey_results import rebuild_survey_results
+        
+        count = rebuild_survey_results(survey_id)
+        click.echo(f'تم تجميع {count} إجابة')
+    
+    @app.cli.command('export-survey-analytics')
+    @click.argument('survey_id', type=int)
+    @click.option('--output', 'output_dir', default='survey_analytics', help='مجلد الإخراج')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default='csv')
+    def export_survey_analytics_command(survey_id, output_dir, fmt):
+        """تصدير الجداول التحليلية لاستبيان إلى ملفات CSV أو Parquet"""
+        from department_management_backend.src.services.survey_analytics import export_survey_analytics
+        
+        for path in export_survey_analytics(survey_id, output_dir, fmt, app.config.get('SURVEY_LIKERT_SCALE', 5)):
+            click.echo(path)
+    
+    @app.cli.command('reconcile-survey-counters')
+    def reconcile_survey_counters_command():
+        """تصحيح عدادات استجابات الاستبيانات من العدد الفعلي للاستجابات"""
+        from department_management_backend.src.services.survey_submission import reconcile_survey_counters
+        
+        click.echo(f'تم تصحيح {reconcile_survey_counters()} استبيان')
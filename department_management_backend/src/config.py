@@ -5,6 +5,72 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.environ.get("SECRET_KEY") or "a_very_secret_key_that_should_be_changed"
     CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "http://localhost:3000").split(",")
+    # مدة صلاحية التخزين المؤقت لصلاحيات المستخدمين (بالثواني)
+    PERMISSION_CACHE_TTL = int(os.environ.get("PERMISSION_CACHE_TTL", 60))
+    # الوضع عديم الحالة: تضمين الأدوار والصلاحيات في التوكن للمسارات القرائية
+    JWT_STATELESS_AUTH = os.environ.get("JWT_STATELESS_AUTH", "false").lower() == "true"
+    # عمر توكن المطالبات (بالثواني)، وهو الحد الأقصى لتأخر تطبيق تغييرات الصلاحيات؛ توكن الجلسة لا يتأثر به
+    JWT_CLAIMS_LIFETIME = int(os.environ.get("JWT_CLAIMS_LIFETIME", 300))
+    # فترة تحديث سجل إبطال التوكنات (بالثواني)، وهي الحد الأقصى لتأخر حظر المستخدمين الموقوفين
+    JWT_REVOCATION_REFRESH = int(os.environ.get("JWT_REVOCATION_REFRESH", 30))
+    # كتابة سجل المراجعة عبر طابور غير متزامن ودفعات جماعية
+    AUDIT_ASYNC = os.environ.get("AUDIT_ASYNC", "true").lower() == "true"
+    AUDIT_QUEUE_MAXSIZE = int(os.environ.get("AUDIT_QUEUE_MAXSIZE", 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 200))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0))
+    AUDIT_ENQUEUE_TIMEOUT = float(os.environ.get("AUDIT_ENQUEUE_TIMEOUT", 0.05))
+    # إعادة محاولة كتابة الدفعة عند فشل قاعدة البيانات، وملف حفظ السجلات التي تعذرت كتابتها
+    AUDIT_WRITE_RETRIES = int(os.environ.get("AUDIT_WRITE_RETRIES", 3))
+    AUDIT_RETRY_DELAY = float(os.environ.get("AUDIT_RETRY_DELAY", 0.5))
+    AUDIT_FAILED_PATH = os.environ.get("AUDIT_FAILED_PATH", "audit_failed.jsonl")
+    # استخدام الجدول المُجسَّد kpi_latest_value لآخر قيم المؤشرات
+    KPI_LATEST_MATERIALIZED = os.environ.get("KPI_LATEST_MATERIALIZED", "false").lower() == "true"
+    # عدد الأسطر في كل دفعة عند معالجة ملفات رايات
+    RAYAT_IMPORT_CHUNK_SIZE = int(os.environ.get("RAYAT_IMPORT_CHUNK_SIZE", 1000))
+    # منفذ مهام الخلفية (إنشاء التقارير ومعالجة ملفات رايات)
+    JOB_RUNNER_IN_PROCESS = os.environ.get("JOB_RUNNER_IN_PROCESS", "true").lower() == "true"
+    JOB_RUNNER_CONCURRENCY = int(os.environ.get("JOB_RUNNER_CONCURRENCY", 2))
+    JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 2.0))
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+    JOB_TIMEOUT = int(os.environ.get("JOB_TIMEOUT", 600))
+    JOB_RETRY_BACKOFF = int(os.environ.get("JOB_RETRY_BACKOFF", 30))
+    # فترة نبض العامل (بالثواني)؛ المهمة الجارية تُعد متوقفة إذا لم يصلها نبض خلال JOB_TIMEOUT
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get("JOB_HEARTBEAT_INTERVAL", 30))
+    # لوحة التحكم: الحد الأقصى لتقادم المؤشرات المخزنة (بالثواني) والمقررات الحرجة ودرجة النجاح
+    DASHBOARD_CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", 60))
+    DASHBOARD_CRITICAL_COURSES = [c for c in os.environ.get("DASHBOARD_CRITICAL_COURSES", "").split(",") if c]
+    DASHBOARD_PASS_MARK = float(os.environ.get("DASHBOARD_PASS_MARK", 60))
+    # الحد الأقصى لعدد الاستجابات في طلب الإرسال الجماعي للاستبيانات
+    SURVEY_BATCH_MAX_SIZE = int(os.environ.get("SURVEY_BATCH_MAX_SIZE", 500))
+    # استقبال استجابات الاستبيانات عبر سجل محلي ونقلها على دفعات (لأوقات الذروة)
+    SURVEY_BUFFERED_INGESTION = os.environ.get("SURVEY_BUFFERED_INGESTION", "false").lower() == "true"
+    SURVEY_BUFFER_PATH = os.environ.get("SURVEY_BUFFER_PATH")
+    SURVEY_BUFFER_BATCH_SIZE = int(os.environ.get("SURVEY_BUFFER_BATCH_SIZE", 500))
+    # الحد الأقصى لتأخر ظهور الاستجابة في قاعدة البيانات (بالثواني)
+    SURVEY_BUFFER_MAX_LAG = float(os.environ.get("SURVEY_BUFFER_MAX_LAG", 5.0))
+    SURVEY_BUFFER_LEASE = int(os.environ.get("SURVEY_BUFFER_LEASE", 60))
+    # عدد درجات مقياس ليكرت في تحليلات الاستبيانات
+    SURVEY_LIKERT_SCALE = int(os.environ.get("SURVEY_LIKERT_SCALE", 5))
+    # فترة تشغيل مهمة تصحيح عدادات استجابات الاستبيانات (بالثواني، 0 للتعطيل)
+    SURVEY_COUNTER_RECONCILE_INTERVAL = int(os.environ.get("SURVEY_COUNTER_RECONCILE_INTERVAL", 3600))
+    # التخزين المؤقت لاستجابات مسارات الجودة: memory (داخل العملية) أو file (مشترك بين العمليات) أو none
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+    RESPONSE_CACHE_MAXSIZE = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", 512))
+    RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR")
+    # الحد الأقصى لعدد سجلات السلوك في الطلب الجماعي الواحد
+    BEHAVIOR_BATCH_MAX_SIZE = int(os.environ.get("BEHAVIOR_BATCH_MAX_SIZE", 500))
+    # فترة إنشاء تذكيرات متابعات سجلات السلوك (بالثواني، 0 للتعطيل) وحجم الدفعة
+    FOLLOW_UP_REMINDER_INTERVAL = int(os.environ.get("FOLLOW_UP_REMINDER_INTERVAL", 3600))
+    FOLLOW_UP_REMINDER_BATCH_SIZE = int(os.environ.get("FOLLOW_UP_REMINDER_BATCH_SIZE", 500))
+    # عدد الصفوف المقروءة في كل دفعة عند تصدير البيانات
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 2000))
+    # مجلد لقطات بيانات التقارير وملفاتها، ومدة إعادة استخدام اللقطة لنفس القالب والمعاملات (بالثواني)
+    REPORTS_FOLDER = os.environ.get("REPORTS_FOLDER", "reports")
+    REPORT_SNAPSHOT_TTL = int(os.environ.get("REPORT_SNAPSHOT_TTL", 3600))
+    # الحد الأقصى لعدد الصفوف في قسم التقرير، وخط TrueType يدعم العربية لملفات PDF
+    REPORT_MAX_ROWS = int(os.environ.get("REPORT_MAX_ROWS", 10000))
+    REPORT_PDF_FONT = os.environ.get("REPORT_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
     # Add other configurations as needed
 
 
@@ -1,6 +1,11 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from datetime import datetime, timedelta
+from threading import RLock
+import time
 import jwt
 from enum import Enum
 
@@ -65,6 +70,7 @@ class User(db.Model):
     position = db.Column(db.String(100))
     hire_date = db.Column(db.Date)
     is_active = db.Column(db.Boolean, default=True)
+    token_version = db.Column(db.Integer, default=0, nullable=False)  # رقم إصدار التوكنات لإبطالها
     last_login = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -84,45 +90,71 @@ class User(db.Model):
     
     def has_role(self, role):
         """التحقق من وجود دور معين"""
-        return self.roles.filter_by(role=role.value).first() is not None
+        return role.value in permission_resolver.resolve(self.id).roles
     
     def has_permission(self, permission):
         """التحقق من وجود صلاحية معينة"""
-        # التحقق من الصلاحيات المباشرة
-        if self.permissions.filter_by(permission=permission.value).first():
-            return True
-        
-        # التحقق من الصلاحيات المرتبطة بالأدوار
-        for user_role in self.roles:
-            role_permissions = RolePermission.query.filter_by(role=user_role.role).all()
-            for role_perm in role_permissions:
-                if role_perm.permission == permission.value:
-                    return True
-        
-        return False
+        # مجموعة الصلاحيات الفعلية (المباشرة + المرتبطة بالأدوار) محسوبة مرة واحدة ومخزنة مؤقتاً
+        return permission.value in permission_resolver.resolve(self.id).permissions
     
-    def generate_token(self, secret_key, expires_in=3600):
-        """إنشاء JWT token"""
+    def generate_token(self, secret_key, expires_in=3600, embed_claims=False):
+        """إنشاء JWT token (توكن الجلسة، أو توكن مطالبات قصير العمر عند embed_claims)"""
         payload = {
             'user_id': self.id,
             'username': self.username,
-            'exp': datetime.utcnow() + timedelta(seconds=expires_in)
+            'ver': self.token_version or 0
         }
+        
+        if embed_claims:
+            # تضمين الأدوار والصلاحيات في التوكن مع عمر قصير للتحقق دون قاعدة البيانات
+            effective = permission_resolver.resolve(self.id)
+            payload['roles'] = sorted(effective.roles)
+            payload['perms'] = sorted(effective.permissions)
+            payload['active'] = bool(self.is_active)
+            expires_in = min(expires_in, current_app.config.get('JWT_CLAIMS_LIFETIME', 300)
+                             if has_app_context() else 300)
+        
+        payload['exp'] = datetime.utcnow() + timedelta(seconds=expires_in)
         return jwt.encode(payload, secret_key, algorithm='HS256')
     
+    def revoke_tokens(self):
+        """إبطال جميع التوكنات الصادرة للمستخدم"""
+        self.token_version = (self.token_version or 0) + 1
+    
     @staticmethod
     def verify_token(token, secret_key):
         """التحقق من JWT token"""
         try:
             payload = jwt.decode(token, secret_key, algorithms=['HS256'])
-            return User.query.get(payload['user_id'])
+            user = User.query.get(payload['user_id'])
+            if user and payload.get('ver', 0) < (user.token_version or 0):
+                return None
+            return user
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
     
-    def to_dict(self):
-        """تحويل المستخدم إلى قاموس"""
+    @staticmethod
+    def verify_token_claims(token, secret_key):
+        """التحقق من JWT token اعتماداً على المطالبات الموقعة فقط دون تحميل المستخدم"""
+        try:
+            payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
+        
+        if 'perms' not in payload:
+            return None
+        
+        if token_revocations.is_revoked(payload['user_id'], payload.get('ver', 0)):
+            return None
+        
+        return TokenPrincipal(payload)
+    
+    def to_dict(self, roles=None, permissions=None):
+        """تحويل المستخدم إلى قاموس (يمكن تمرير الأدوار والصلاحيات المحملة مسبقاً لتجنب الاستعلامات)"""
         return {
             'id': self.id,
             'username': self.username,
@@ -137,12 +169,54 @@ class User(db.Model):
             'is_active': self.is_active,
             'last_login': self.last_login.isoformat() if self.last_login else None,
             'created_at': self.created_at.isoformat(),
-            'roles': [role.role for role in self.roles],
-            'permissions': [perm.permission for perm in self.permissions]
+            'roles': [role.role for role in self.roles] if roles is None else roles,
+            'permissions': [perm.permission for perm in self.permissions] if permissions is None else permissions
         }
+    
+    @staticmethod
+    def to_dict_list(users):
+        """تحويل قائمة مستخدمين إلى قواميس مع تحميل أدوار وصلاحيات الصفحة كاملة باستعلامين فقط"""
+        user_ids = [user.id for user in users]
+        roles = {user_id: [] for user_id in user_ids}
+        permissions = {user_id: [] for user_id in user_ids}
+        
+        if user_ids:
+            for user_id, role in db.session.query(UserRole.user_id, UserRole.role)\
+                    .filter(UserRole.user_id.in_(user_ids))\
+                    .order_by(UserRole.id):
+                roles[user_id].append(role)
+            
+            for user_id, permission in db.session.query(UserPermission.user_id, UserPermission.permission)\
+                    .filter(UserPermission.user_id.in_(user_ids))\
+                    .order_by(UserPermission.id):
+                permissions[user_id].append(permission)
+        
+        return [user.to_dict(roles=roles[user.id], permissions=permissions[user.id]) for user in users]
+
+class TokenPrincipal:
+    """مستخدم مبني من مطالبات التوكن فقط (للمسارات القرائية)"""
+    
+    def __init__(self, payload):
+        self.id = payload['user_id']
+        self.username = payload.get('username')
+        self.is_active = payload.get('active', False)
+        self.token_version = payload.get('ver', 0)
+        self.roles = frozenset(payload.get('roles', ()))
+        self.permissions = frozenset(payload.get('perms', ()))
+    
+    def has_role(self, role):
+        """التحقق من وجود دور معين"""
+        return role.value in self.roles
+    
+    def has_permission(self, permission):
+        """التحقق من وجود صلاحية معينة"""
+        return permission.value in self.permissions
 
 class UserRole(db.Model):
     __tablename__ = 'user_roles'
+    __table_args__ = (
+        db.Index('ix_user_roles_user_id', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -154,6 +228,9 @@ class UserRole(db.Model):
 
 class UserPermission(db.Model):
     __tablename__ = 'user_permissions'
+    __table_args__ = (
+        db.Index('ix_user_permissions_user_id', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -165,6 +242,9 @@ class UserPermission(db.Model):
 
 class RolePermission(db.Model):
     __tablename__ = 'role_permissions'
+    __table_args__ = (
+        db.Index('ix_role_permissions_role', 'role'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     role = db.Column(db.String(50), nullable=False)
@@ -173,6 +253,10 @@ class RolePermission(db.Model):
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_timestamp', 'timestamp'),
+        db.Index('ix_audit_logs_user_action', 'user_id', 'action'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -197,6 +281,196 @@ class AuditLog(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+class EffectivePermissions:
+    """الأدوار والصلاحيات الفعلية لمستخدم في لحظة معينة"""
+    
+    __slots__ = ('roles', 'permissions', 'expires_at')
+    
+    def __init__(self, roles, permissions, expires_at):
+        self.roles = roles
+        self.permissions = permissions
+        self.expires_at = expires_at
+
+class PermissionResolver:
+    """حساب الصلاحيات الفعلية للمستخدمين مع تخزين مؤقت داخل العملية"""
+    
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._lock = RLock()
+    
+    def _get_ttl(self):
+        if has_app_context():
+            return current_app.config.get('PERMISSION_CACHE_TTL', self.ttl)
+        return self.ttl
+    
+    def resolve(self, user_id):
+        """الحصول على الأدوار والصلاحيات الفعلية للمستخدم"""
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._entries.get(user_id)
+            generation = self._generation
+        if entry is not None and entry.expires_at > now:
+            return entry
+        
+        roles, permissions = self._load(user_id)
+        entry = EffectivePermissions(frozenset(roles), frozenset(permissions), now + self._get_ttl())
+        
+        # لا تُخزَّن نتيجة حُمّلت قبل إبطال حدث أثناء التحميل
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = entry
+        return entry
+    
+    def _load(self, user_id):
+        """بناء مجموعة الصلاحيات من قاعدة البيانات (استعلامان فقط)"""
+        now = datetime.utcnow()
+        
+        roles = [row.role for row in db.session.query(UserRole.role).filter(
+            UserRole.user_id == user_id,
+            UserRole.is_active == True,
+            db.or_(UserRole.expires_at.is_(None), UserRole.expires_at > now)
+        )]
+        
+        query = db.session.query(UserPermission.permission).filter(
+            UserPermission.user_id == user_id,
+            UserPermission.is_active == True,
+            db.or_(UserPermission.expires_at.is_(None), UserPermission.expires_at > now)
+        )
+        if roles:
+            query = query.union(
+                db.session.query(RolePermission.permission).filter(RolePermission.role.in_(roles))
+            )
+        
+        return roles, [row[0] for row in query]
+    
+    def invalidate(self, user_id=None):
+        """إبطال الصلاحيات المخزنة لمستخدم معين أو لجميع المستخدمين"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+permission_resolver = PermissionResolver()
+
+class TokenRevocationRegistry:
+    """سجل إبطال التوكنات: أدنى إصدار صالح وحالة التفعيل لكل مستخدم متأثر"""
+    
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._state = {}
+        self._loaded_at = None
+        self._lock = RLock()
+    
+    def _get_refresh_interval(self):
+        if has_app_context():
+            return current_app.config.get('JWT_REVOCATION_REFRESH', self.refresh_interval)
+        return self.refresh_interval
+    
+    def _refresh(self):
+        """تحميل المستخدمين الموقوفين أو الذين تم إبطال توكناتهم باستعلام واحد"""
+        rows = db.session.query(User.id, User.token_version, User.is_active).filter(
+            db.or_(User.is_active == False, User.token_version > 0)
+        ).all()
+        with self._lock:
+            self._state = {row.id: (row.token_version or 0, bool(row.is_active)) for row in rows}
+            self._loaded_at = time.monotonic()
+    
+    def is_revoked(self, user_id, version):
+        """التحقق من إبطال توكن بإصدار معين"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self._get_refresh_interval():
+            self._refresh()
+        
+        with self._lock:
+            state = self._state.get(user_id)
+        if state is None:
+            return False
+        
+        current_version, is_active = state
+        return not is_active or version < current_version
+    
+    def note(self, user_id, version, is_active):
+        """تحديث حالة مستخدم فوراً داخل العملية الحالية"""
+        with self._lock:
+            if is_active and not version:
+                self._state.pop(user_id, None)
+            else:
+                self._state[user_id] = (version or 0, bool(is_active))
+
+token_revocations = TokenRevocationRegistry()
+
+_PENDING_REVOCATIONS = 'pending_token_revocations'
+
+@event.listens_for(User, 'after_update')
+def _note_user_revocation(mapper, connection, target):
+    # لا تُحدَّث الحالة في الذاكرة إلا بعد تأكيد المعاملة، حتى لا يبقى إصدار لم يُحفظ بعد التراجع
+    pending = object_session(target).info.setdefault(_PENDING_REVOCATIONS, {})
+    pending[target.id] = (target.token_version, target.is_active)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_token_revocations(session):
+    pending = session.info.pop(_PENDING_REVOCATIONS, None)
+    for user_id, (version, is_active) in (pending or {}).items():
+        token_revocations.note(user_id, version, is_active)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_token_revocations(session):
+    session.info.pop(_PENDING_REVOCATIONS, None)
+
+@event.listens_for(User.is_active, 'set', active_history=True)
+def _revoke_on_deactivation(target, value, oldvalue, initiator):
+    # إيقاف الحساب يبطل توكناته فوراً، ولا تعود صالحة عند إعادة التفعيل
+    if oldvalue is True and not value:
+        target.revoke_tokens()
+
+_PENDING_INVALIDATIONS = 'pending_permission_invalidations'
+
+def _queue_invalidation(session, user_id=None):
+    """تسجيل إبطال مؤجل حتى تأكيد المعاملة (None تعني جميع المستخدمين)"""
+    pending = session.info.setdefault(_PENDING_INVALIDATIONS, set())
+    pending.add(user_id)
+
+def _invalidate_user_permissions(mapper, connection, target):
+    _queue_invalidation(object_session(target), target.user_id)
+
+def _invalidate_all_permissions(mapper, connection, target):
+    _queue_invalidation(object_session(target))
+
+# إبطال التخزين المؤقت عند أي تغيير في أدوار أو صلاحيات المستخدمين، ويُطبَّق بعد commit فقط
+for _model, _listener in ((UserRole, _invalidate_user_permissions),
+                          (UserPermission, _invalidate_user_permissions),
+                          (RolePermission, _invalidate_all_permissions)):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _listener)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_on_bulk_change(orm_execute_state):
+    # عمليات query.update()/delete() والإدراج المجمّع لا تمر بأحداث الـ mapper فتُبطل الجميع
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (UserRole, UserPermission, RolePermission):
+        _queue_invalidation(orm_execute_state.session)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_permission_invalidations(session):
+    pending = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if not pending:
+        return
+    if None in pending:
+        permission_resolver.invalidate()
+    else:
+        for user_id in pending:
+            permission_resolver.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_permission_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
 def init_default_roles_permissions():
     """تهيئة الأدوار والصلاحيات الافتراضية"""
     
@@ -1,6 +1,12 @@
 from department_management_backend.src.database import db
 
 class BehaviorRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_behavior_record_trainee_date', 'trainee_id', 'date_recorded'),
+        db.Index('ix_behavior_record_trainer_date', 'recorded_by_trainer_id', 'date_recorded'),
+        db.Index('ix_behavior_record_date', 'date_recorded', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     trainee_id = db.Column(db.Integer, nullable=False) # Assuming trainee_id from Rayat or internal system
     behavior_type = db.Column(db.String(100), nullable=False) # e.g., 'عدم التزام باللبس الرسمي', 'تدخين'
@@ -179,6 +179,10 @@ class BehaviorCategory(Enum):
 class BehaviorRecord(db.Model):
     """سجلات السلوك"""
     __tablename__ = 'behavior_records'
+    __table_args__ = (
+        db.Index('ix_behavior_records_trainee_date', 'trainee_id', 'incident_date'),
+        db.Index('ix_behavior_records_reported_by_date', 'reported_by', 'incident_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     trainee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -251,6 +255,91 @@ class BehaviorRecord(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+# فهرس جزئي للمتابعات المفتوحة فقط، يبقى صغيراً مهما كبر جدول السجلات؛ الشرط مبني من تعبيرات
+# الأعمدة نفسها المستخدمة في استعلامات المتابعة ليُصاغ بالنص ذاته (= 1 في SQLite و = true في PostgreSQL)
+# فيطابقه المخطط
+_open_follow_up = db.and_(BehaviorRecord.follow_up_required == True, BehaviorRecord.is_resolved == False)
+db.Index(
+    'ix_behavior_records_open_follow_ups', BehaviorRecord.follow_up_date, BehaviorRecord.id,
+    sqlite_where=_open_follow_up,
+    postgresql_where=_open_follow_up
+)
+
+class TraineeScorecard(db.Model):
+    """بطاقة سلوك المتدرب: مجاميع سجلات السلوك المحدثة مع كل إضافة أو تعديل أو حل"""
+    __tablename__ = 'trainee_scorecards'
+    __table_args__ = (
+        # ترتيب المتدربين الأكثر عرضة للخطر دون مسح سجلات السلوك
+        db.Index('ix_trainee_scorecards_risk', 'net_points', 'open_follow_ups'),
+    )
+    
+    trainee_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    net_points = db.Column(db.Integer, default=0, nullable=False)
+    points_awarded = db.Column(db.Integer, default=0, nullable=False)
+    points_deducted = db.Column(db.Integer, default=0, nullable=False)
+    positive_count = db.Column(db.Integer, default=0, nullable=False)
+    negative_count = db.Column(db.Integer, default=0, nullable=False)
+    unresolved_count = db.Column(db.Integer, default=0, nullable=False)
+    open_follow_ups = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self, counts=None):
+        return {
+            'trainee_id': self.trainee_id,
+            'net_points': self.net_points,
+            'points_awarded': self.points_awarded,
+            'points_deducted': self.points_deducted,
+            'positive_count': self.positive_count,
+            'negative_count': self.negative_count,
+            'unresolved_count': self.unresolved_count,
+            'open_follow_ups': self.open_follow_ups,
+            'by_category': (counts or {}).get('category', {}),
+            'by_severity': (counts or {}).get('severity', {}),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TraineeScorecardCount(db.Model):
+    """عدد حوادث المتدرب حسب الفئة ومستوى الشدة"""
+    __tablename__ = 'trainee_scorecard_counts'
+    __table_args__ = (
+        db.UniqueConstraint('trainee_id', 'dimension', 'value', name='uq_trainee_scorecard_counts_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    trainee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)  # category, severity
+    value = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class FollowUpReminder(db.Model):
+    """تذكيرات المتابعة المستحقة لسجلات السلوك (تذكير واحد لكل سجل في اليوم)"""
+    __tablename__ = 'follow_up_reminders'
+    __table_args__ = (
+        db.UniqueConstraint('record_id', 'reminded_on', name='uq_follow_up_reminders_record_day'),
+        db.Index('ix_follow_up_reminders_recipient', 'recipient_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    record_id = db.Column(db.Integer, db.ForeignKey('behavior_records.id'), nullable=False)
+    trainee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # مُبلِّغ السجل
+    follow_up_date = db.Column(db.Date, nullable=False)
+    reminded_on = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # due, overdue
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'record_id': self.record_id,
+            'trainee_id': self.trainee_id,
+            'recipient_id': self.recipient_id,
+            'follow_up_date': self.follow_up_date.isoformat(),
+            'reminded_on': self.reminded_on.isoformat(),
+            'status': self.status,
+            'created_at': self.created_at.isoformat()
+        }
+
 class Survey(db.Model):
     """الاستبيانات"""
     __tablename__ = 'surveys'
@@ -374,6 +463,9 @@ class SurveyQuestion(db.Model):
 class SurveyResponse(db.Model):
     """استجابات الاستبيان"""
     __tablename__ = 'survey_responses'
+    __table_args__ = (
+        db.Index('ix_survey_responses_survey_started', 'survey_id', 'started_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     survey_id = db.Column(db.Integer, db.ForeignKey('surveys.id'), nullable=False)
@@ -406,6 +498,10 @@ class SurveyResponse(db.Model):
 class SurveyAnswer(db.Model):
     """إجابات الاستبيان"""
     __tablename__ = 'survey_answers'
+    __table_args__ = (
+        db.Index('ix_survey_answers_response_question', 'response_id', 'question_id'),
+        db.Index('ix_survey_answers_question', 'question_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     response_id = db.Column(db.Integer, db.ForeignKey('survey_responses.id'), nullable=False)
@@ -544,3 +640,7 @@ def init_default_survey_templates():
     # قوالب استبيانات جاهزة مثل تقييم المقررات، رضا المتدربين، إلخ
     pass
 
+
+# تسجيل مستمعي بطاقات السلوك مع النموذج حتى تُحدَّث البطاقات في أي عملية تكتب BehaviorRecord هذا
+# (جدول behavior_record في الواجهة القديمة نموذج منفصل بلا فئة أو نقاط، فلا يدخل في البطاقات)
+from src.services import behavior_scorecards  # noqa: E402,F401
@@ -8,6 +8,9 @@ db = SQLAlchemy()
 class QualityStandard(db.Model):
     """معايير الجودة"""
     __tablename__ = 'quality_standards'
+    __table_args__ = (
+        db.Index('ix_quality_standards_category', 'category'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)  # رمز المعيار
@@ -85,6 +88,11 @@ class QualityIndicator(db.Model):
 class QualityMeasurement(db.Model):
     """قياسات الجودة"""
     __tablename__ = 'quality_measurements'
+    __table_args__ = (
+        db.Index('ix_quality_measurements_indicator_date', 'indicator_id', 'measurement_date'),
+        db.Index('ix_quality_measurements_standard_date', 'standard_id', 'measurement_date'),
+        db.Index('ix_quality_measurements_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     standard_id = db.Column(db.Integer, db.ForeignKey('quality_standards.id'), nullable=False)
@@ -158,6 +166,10 @@ class ReportTemplate(db.Model):
 class GeneratedReport(db.Model):
     """التقارير المُنشأة"""
     __tablename__ = 'generated_reports'
+    __table_args__ = (
+        db.Index('ix_generated_reports_generated_by_at', 'generated_by', 'generated_at'),
+        db.Index('ix_generated_reports_generated_at', 'generated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     template_id = db.Column(db.Integer, db.ForeignKey('report_templates.id'), nullable=False)
@@ -201,6 +213,9 @@ class GeneratedReport(db.Model):
 class RayatImport(db.Model):
     """استيراد بيانات رايات"""
     __tablename__ = 'rayat_imports'
+    __table_args__ = (
+        db.Index('ix_rayat_imports_imported_at', 'imported_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     file_name = db.Column(db.String(300), nullable=False)
@@ -235,6 +250,109 @@ class RayatImport(db.Model):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+class BackgroundJob(db.Model):
+    """مهام الخلفية (إنشاء التقارير ومعالجة ملفات رايات)"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # generate_report, process_rayat_import
+    payload = db.Column(db.Text)  # معاملات المهمة بصيغة JSON
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, completed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    timeout_seconds = db.Column(db.Integer, default=600, nullable=False)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100))  # معرف العامل الذي يعالج المهمة
+    locked_at = db.Column(db.DateTime)  # آخر نبض من العامل
+    started_at = db.Column(db.DateTime)  # بداية المحاولة الحالية (لقياس المهلة)
+    unique_key = db.Column(db.String(200), unique=True)  # يمنع تكرار المهمة النشطة نفسها، ويُفرَّغ عند انتهائها
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def get_payload(self):
+        """الحصول على معاملات المهمة"""
+        if self.payload:
+            return json.loads(self.payload)
+        return {}
+    
+    def set_payload(self, payload):
+        """تحديد معاملات المهمة"""
+        self.payload = json.dumps(payload, ensure_ascii=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'payload': self.get_payload(),
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'timeout_seconds': self.timeout_seconds,
+            'run_after': self.run_after.isoformat(),
+            'locked_by': self.locked_by,
+            'locked_at': self.locked_at.isoformat() if self.locked_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class RayatAttendance(db.Model):
+    """سجلات الحضور المستوردة من رايات"""
+    __tablename__ = 'rayat_attendance'
+    __table_args__ = (
+        db.UniqueConstraint('trainee_id', 'course_code', 'attendance_date', name='uq_rayat_attendance_entry'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    trainee_id = db.Column(db.String(20), nullable=False)  # الرقم التدريبي في رايات
+    course_code = db.Column(db.String(20), nullable=False)
+    attendance_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # present, absent, late, excused
+    hours = db.Column(db.Float)
+    import_id = db.Column(db.Integer, db.ForeignKey('rayat_imports.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RayatGrade(db.Model):
+    """الدرجات المستوردة من رايات"""
+    __tablename__ = 'rayat_grades'
+    __table_args__ = (
+        db.UniqueConstraint('trainee_id', 'course_code', 'semester', name='uq_rayat_grades_entry'),
+        db.Index('ix_rayat_grades_semester_course', 'semester', 'course_code'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    trainee_id = db.Column(db.String(20), nullable=False)
+    course_code = db.Column(db.String(20), nullable=False)
+    semester = db.Column(db.String(20), nullable=False)  # الفصل التدريبي
+    grade = db.Column(db.Float)
+    letter_grade = db.Column(db.String(5))
+    import_id = db.Column(db.Integer, db.ForeignKey('rayat_imports.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RayatSchedule(db.Model):
+    """الجداول التدريبية المستوردة من رايات"""
+    __tablename__ = 'rayat_schedules'
+    __table_args__ = (
+        db.UniqueConstraint('semester', 'course_code', 'section', 'day', 'start_time', name='uq_rayat_schedules_entry'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    semester = db.Column(db.String(20), nullable=False)
+    course_code = db.Column(db.String(20), nullable=False)
+    section = db.Column(db.String(20), nullable=False)  # الشعبة
+    day = db.Column(db.String(20), nullable=False)
+    start_time = db.Column(db.String(5), nullable=False)  # HH:MM
+    end_time = db.Column(db.String(5))
+    room = db.Column(db.String(50))
+    trainer_name = db.Column(db.String(200))
+    import_id = db.Column(db.Integer, db.ForeignKey('rayat_imports.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class KPI(db.Model):
     """مؤشرات الأداء الرئيسية"""
     __tablename__ = 'kpis'
@@ -290,6 +408,10 @@ class KPI(db.Model):
 class KPIValue(db.Model):
     """قيم مؤشرات الأداء"""
     __tablename__ = 'kpi_values'
+    __table_args__ = (
+        # قيمة واحدة لكل مؤشر في كل تاريخ، ويُستخدم القيد كفهرس لاستعلامات السجل التاريخي
+        db.UniqueConstraint('kpi_id', 'measurement_date', name='uq_kpi_values_kpi_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), nullable=False)
@@ -318,6 +440,105 @@ class KPIValue(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class KPILatestValue(db.Model):
+    """آخر قيمة لكل مؤشر أداء (جدول مُجسَّد يُحدَّث عند إضافة القيم)"""
+    __tablename__ = 'kpi_latest_value'
+    
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), primary_key=True)
+    kpi_value_id = db.Column(db.Integer, db.ForeignKey('kpi_values.id'), nullable=False)
+    measurement_date = db.Column(db.Date, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # العلاقات
+    kpi_value = db.relationship('KPIValue', lazy='joined')
+
+class KPIRollup(db.Model):
+    """تجميعات قيم مؤشرات الأداء لكل فترة (أسبوع، شهر، فصل، سنة) لرسم السلاسل الزمنية"""
+    __tablename__ = 'kpi_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('kpi_id', 'granularity', 'period_start', name='uq_kpi_rollups_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # week, month, quarter, year
+    period_start = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    value_sum = db.Column(db.Float, default=0.0, nullable=False)
+    last_value = db.Column(db.Float, nullable=False)
+    last_date = db.Column(db.Date, nullable=False)  # تاريخ آخر قيمة في الفترة
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'period_start': self.period_start.isoformat(),
+            'count': self.count,
+            'min': self.min_value,
+            'max': self.max_value,
+            'mean': self.value_sum / self.count if self.count else None,
+            'last': self.last_value
+        }
+
+class QualityScore(db.Model):
+    """درجات الجودة المحسوبة لكل معيار ولكل فترة، والصف ذو standard_id = 0 هو مؤشر القسم العام"""
+    __tablename__ = 'quality_scores'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'standard_id', name='uq_quality_scores_period_standard'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)  # YYYY أو YYYY-Qn أو YYYY-MM
+    standard_id = db.Column(db.Integer, nullable=False, default=0)
+    score = db.Column(db.Float)  # من 0 إلى 100
+    weight = db.Column(db.Float, default=0.0, nullable=False)  # مجموع أوزان المؤشرات المقاسة
+    indicators_count = db.Column(db.Integer, default=0, nullable=False)
+    measurements_count = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20))  # on_target, warning, critical
+    is_stale = db.Column(db.Boolean, default=False, nullable=False)  # قياسات جديدة تتطلب إعادة الحساب
+    computed_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'standard_id': self.standard_id or None,
+            'score': round(self.score, 2) if self.score is not None else None,
+            'weight': self.weight,
+            'indicators_count': self.indicators_count,
+            'measurements_count': self.measurements_count,
+            'status': self.status,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+class DashboardRollup(db.Model):
+    """تجميعات لوحة التحكم المحدثة تدريجياً (عدد ومجموع لكل مقياس وبُعد وفترة)"""
+    __tablename__ = 'dashboard_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'dimension', 'period', name='uq_dashboard_rollups_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)  # behavior_incidents, survey_rating, course_grades
+    dimension = db.Column(db.String(100), nullable=False, default='')  # نوع السلوك، فئة المستجيبين، رمز المقرر
+    period = db.Column(db.String(20), nullable=False, default='')  # الشهر YYYY-MM أو الفصل التدريبي
+    count = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SearchDocument(db.Model):
+    """فهرس البحث النصي: نص مطبَّع لكل سجل قابل للبحث (مستخدم، معيار، مبادرة، سجل سلوك)"""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_search_documents_entity'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 def init_default_quality_standards():
     """تهيئة معايير الجودة الافتراضية"""
     
@@ -6,6 +6,8 @@ class Survey(db.Model):
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     is_active = db.Column(db.Boolean, default=True)
+    max_responses = db.Column(db.Integer, nullable=True) # No limit when null
+    response_count = db.Column(db.Integer, nullable=False, default=0) # Maintained atomically on submission
 
 class SurveyQuestion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,17 +17,40 @@ class SurveyQuestion(db.Model):
     options = db.Column(db.Text, nullable=True) # JSON string for options
 
 class SurveyResponse(db.Model):
+    __table_args__ = (
+        db.Index('ix_survey_response_survey_submitted', 'survey_id', 'submitted_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     survey_id = db.Column(db.Integer, db.ForeignKey("survey.id"), nullable=False)
     trainee_id = db.Column(db.Integer, nullable=True) # Can be null for anonymous surveys
     trainer_id = db.Column(db.Integer, nullable=True)
     submitted_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    submission_key = db.Column(db.String(64), unique=True, nullable=True) # Client or buffer idempotency key
 
 class QuestionAnswer(db.Model):
+    __table_args__ = (
+        db.Index('ix_question_answer_response_question', 'response_id', 'question_id'),
+        db.Index('ix_question_answer_question', 'question_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     response_id = db.Column(db.Integer, db.ForeignKey("survey_response.id"), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey("survey_question.id"), nullable=False)
     answer_text = db.Column(db.Text, nullable=True)
     answer_value = db.Column(db.Integer, nullable=True) # For rating questions
 
+class QuestionAggregate(db.Model):
+    # Running per-question totals maintained on each submission (option is '' for the numeric totals row)
+    __table_args__ = (
+        db.UniqueConstraint('question_id', 'option', name='uq_question_aggregate_option'),
+    )
 
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey("survey_question.id"), nullable=False)
+    option = db.Column(db.String(255), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    value_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=False, default=0.0)
+    value_sum_squares = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
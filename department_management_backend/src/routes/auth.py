@@ -5,23 +5,32 @@ import re
 from functools import wraps
 
 from src.models.auth import db, User, UserRole, UserPermission, AuditLog, Permission, init_default_roles_permissions
+from src.services.audit_writer import audit_writer
+from src.services.pagination import paginate_request, InvalidCursor
+from src.services.search import search_ids
 
 auth_bp = Blueprint('auth', __name__)
 
+def _get_request_token():
+    """استخراج التوكن من ترويسة الطلب"""
+    token = request.headers.get('Authorization')
+    
+    # إزالة "Bearer " من بداية التوكن
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    
+    return token
+
 def token_required(f):
     """ديكوريتر للتحقق من وجود token صالح"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+        token = _get_request_token()
         
         if not token:
             return jsonify({'message': 'Token مطلوب'}), 401
         
         try:
-            # إزالة "Bearer " من بداية التوكن
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
             current_user = User.verify_token(token, current_app.config['SECRET_KEY'])
             if not current_user:
                 return jsonify({'message': 'Token غير صالح'}), 401
@@ -36,6 +45,36 @@ def token_required(f):
     
     return decorated
 
+def token_claims_required(f):
+    """ديكوريتر للمسارات القرائية: يكتفي بمطالبات التوكن الموقعة دون تحميل المستخدم عند تفعيل JWT_STATELESS_AUTH"""
+    verified = token_required(f)
+    
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_app.config.get('JWT_STATELESS_AUTH', False):
+            return verified(*args, **kwargs)
+        
+        token = _get_request_token()
+        
+        if not token:
+            return jsonify({'message': 'Token مطلوب'}), 401
+        
+        try:
+            current_user = User.verify_token_claims(token, current_app.config['SECRET_KEY'])
+        except Exception as e:
+            return jsonify({'message': 'Token غير صالح'}), 401
+        
+        # التوكنات القديمة التي لا تحتوي على المطالبات تمر بالتحقق الكامل
+        if not current_user:
+            return verified(*args, **kwargs)
+        
+        if not current_user.is_active:
+            return jsonify({'message': 'الحساب غير مفعل'}), 401
+        
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
 def permission_required(permission):
     """ديكوريتر للتحقق من وجود صلاحية معينة"""
     def decorator(f):
@@ -54,17 +93,29 @@ def permission_required(permission):
 def log_audit(user_id, action, resource=None, resource_id=None, details=None):
     """تسجيل العمليات في سجل المراجعة"""
     try:
-        audit_log = AuditLog(
-            user_id=user_id,
-            action=action,
-            resource=resource,
-            resource_id=resource_id,
-            details=details,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent', '')
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        entry = {
+            'user_id': user_id,
+            'action': action,
+            'resource': resource,
+            'resource_id': resource_id,
+            'details': details,
+            'ip_address': request.remote_addr,
+            'user_agent': request.headers.get('User-Agent', ''),
+            'timestamp': datetime.utcnow()
+        }
+        
+        # الكتابة عبر الطابور غير المتزامن دون المساس بجلسة الطلب الحالية
+        if current_app.config.get('AUDIT_ASYNC', True):
+            audit_writer.start(current_app._get_current_object())
+            audit_writer.enqueue(entry)
+        else:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(AuditLog.__table__.insert(), [entry])
+            except Exception:
+                audit_writer.configure(current_app._get_current_object())
+                audit_writer.save_failed([entry])
+                raise
     except Exception as e:
         print(f"خطأ في تسجيل المراجعة: {e}")
 
@@ -87,6 +138,16 @@ def validate_password(password):
     
     return True, "كلمة مرور قوية"
 
+def _claims_token(user):
+    """توكن المطالبات قصير العمر للمسارات القرائية عند تفعيل JWT_STATELESS_AUTH (يُجدد عبر /refresh-claims)"""
+    if not current_app.config.get('JWT_STATELESS_AUTH', False):
+        return {}
+    lifetime = current_app.config.get('JWT_CLAIMS_LIFETIME', 300)
+    return {
+        'claims_token': user.generate_token(current_app.config['SECRET_KEY'], lifetime, embed_claims=True),
+        'claims_expires_in': lifetime
+    }
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """تسجيل الدخول"""
@@ -120,15 +181,23 @@ def login():
         
         log_audit(user.id, 'LOGIN_SUCCESS', 'user', username, 'تسجيل دخول ناجح')
         
-        return jsonify({
+        return jsonify(dict({
             'message': 'تم تسجيل الدخول بنجاح',
             'token': token,
             'user': user.to_dict()
-        }), 200
+        }, **_claims_token(user))), 200
         
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
+@auth_bp.route('/refresh-claims', methods=['POST'])
+@token_required
+def refresh_claims(current_user):
+    """إصدار توكن مطالبات جديد بالصلاحيات الحالية باستخدام توكن الجلسة"""
+    if not current_app.config.get('JWT_STATELESS_AUTH', False):
+        return jsonify({'message': 'توكنات المطالبات غير مفعلة'}), 400
+    return jsonify(_claims_token(current_user)), 200
+
 @auth_bp.route('/register', methods=['POST'])
 @token_required
 @permission_required(Permission.MANAGE_USERS)
@@ -260,15 +329,19 @@ def change_password(current_user):
         if not is_valid:
             return jsonify({'message': message}), 400
         
-        # تحديث كلمة المرور
+        # تحديث كلمة المرور وإبطال جميع التوكنات السابقة (بما فيها الجلسات الأخرى)
         current_user.set_password(data['new_password'])
+        current_user.revoke_tokens()
         current_user.updated_at = datetime.utcnow()
         db.session.commit()
         
         log_audit(current_user.id, 'PASSWORD_CHANGED', 'user', str(current_user.id), 
                  'تم تغيير كلمة المرور بنجاح')
         
-        return jsonify({'message': 'تم تغيير كلمة المرور بنجاح'}), 200
+        return jsonify(dict({
+            'message': 'تم تغيير كلمة المرور بنجاح',
+            'token': current_user.generate_token(current_app.config['SECRET_KEY'])
+        }, **_claims_token(current_user))), 200
         
     except Exception as e:
         db.session.rollback()
@@ -280,35 +353,58 @@ def change_password(current_user):
 def get_users(current_user):
     """الحصول على قائمة المستخدمين"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
         
         query = User.query
         
         if search:
-            query = query.filter(
-                db.or_(
-                    User.username.contains(search),
-                    User.full_name.contains(search),
-                    User.email.contains(search),
-                    User.national_id.contains(search)
-                )
-            )
-        
-        users = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+            query = query.filter(User.id.in_(search_ids('user', search)))
         
-        return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'total': users.total,
-            'pages': users.pages,
-            'current_page': page
-        }), 200
+        return jsonify(paginate_request(
+            query, 'users',
+            User.to_dict_list,
+            sort_column=User.id,
+            descending=False
+        )), 200
         
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
+@auth_bp.route('/audit/metrics', methods=['GET'])
+@token_required
+@permission_required(Permission.MANAGE_USERS)
+def get_audit_metrics(current_user):
+    """الحصول على مقاييس طابور سجل المراجعة"""
+    return jsonify({'metrics': audit_writer.metrics()}), 200
+
+@auth_bp.route('/audit/logs', methods=['GET'])
+@token_required
+@permission_required(Permission.MANAGE_USERS)
+def get_audit_logs(current_user):
+    """الحصول على سجل المراجعة"""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        action = request.args.get('action', '')
+        
+        query = AuditLog.query
+        
+        if user_id:
+            query = query.filter(AuditLog.user_id == user_id)
+        
+        if action:
+            query = query.filter(AuditLog.action == action)
+        
+        return jsonify(paginate_request(
+            query, 'logs',
+            lambda logs: [log.to_dict() for log in logs],
+            sort_column=AuditLog.timestamp,
+            id_column=AuditLog.id
+        )), 200
+    
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
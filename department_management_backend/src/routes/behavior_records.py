@@ -1,9 +1,26 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, current_app
 from department_management_backend.src.models.behavior_records import BehaviorRecord
 from department_management_backend.src.database import db
+from department_management_backend.src.services.pagination import keyset_paginate, cursor_requested, InvalidCursor
+from department_management_backend.src.services.behavior_ingestion import ingest_behavior_records
+from department_management_backend.src.services.activity_rollups import record_behavior_incidents
 
 behavior_records_bp = Blueprint("behavior_records", __name__)
 
+# الحقول المتاحة للإسقاط عبر ?fields=
+RECORD_FIELDS = {
+    "id": BehaviorRecord.id,
+    "trainee_id": BehaviorRecord.trainee_id,
+    "behavior_type": BehaviorRecord.behavior_type,
+    "description": BehaviorRecord.description,
+    "date_recorded": BehaviorRecord.date_recorded,
+    "recorded_by_trainer_id": BehaviorRecord.recorded_by_trainer_id
+}
+
+MAX_PER_PAGE = 200
+
 @behavior_records_bp.route("/behavior_records", methods=["POST"])
 def add_behavior_record():
     data = request.get_json()
@@ -14,22 +31,120 @@ def add_behavior_record():
         recorded_by_trainer_id=data["recorded_by_trainer_id"]
     )
     db.session.add(new_record)
+    db.session.flush()
+    record_behavior_incidents(db.session.connection(), [{
+        "behavior_type": new_record.behavior_type,
+        "date_recorded": new_record.date_recorded
+    }])
     db.session.commit()
     return jsonify({"message": "Behavior record added successfully"}), 201
 
+@behavior_records_bp.route("/behavior_records/batch", methods=["POST"])
+def add_behavior_records_batch():
+    data = request.get_json() or {}
+    records = data.get("records")
+    if not isinstance(records, list) or not records:
+        return jsonify({"message": "records must be a non-empty list"}), 400
+
+    max_size = current_app.config.get("BEHAVIOR_BATCH_MAX_SIZE", 500)
+    if len(records) > max_size:
+        return jsonify({"message": f"Batch size exceeds the limit of {max_size} records"}), 413
+
+    # القيم المشتركة لجميع سجلات الدفعة (مثلاً مخالفة واحدة لشعبة كاملة)
+    defaults = {
+        field: data.get(field)
+        for field in ("recorded_by_trainer_id", "behavior_type", "description", "date_recorded")
+    }
+    # سجل مراجعة واحد للدفعة بدلاً من سجل لكل متدرب، يُحفظ مع السجلات في المعاملة نفسها
+    results = ingest_behavior_records(records, defaults, audit={
+        "user_id": data.get("recorded_by_trainer_id"),
+        "ip_address": request.remote_addr,
+        "user_agent": request.headers.get("User-Agent", "")
+    })
+    created = [result for result in results if result["status"] == "created"]
+    failed = len(results) - len(created)
+
+    return jsonify({
+        "results": results,
+        "created": len(created),
+        "failed": failed
+    }), 207 if failed else 201
+
 @behavior_records_bp.route("/behavior_records", methods=["GET"])
 def get_behavior_records():
-    records = BehaviorRecord.query.all()
-    output = []
-    for record in records:
-        output.append({
-            "id": record.id,
-            "trainee_id": record.trainee_id,
-            "behavior_type": record.behavior_type,
-            "description": record.description,
-            "date_recorded": record.date_recorded.isoformat(),
-            "recorded_by_trainer_id": record.recorded_by_trainer_id
-        })
-    return jsonify(output)
+    fields = request.args.get("fields")
+    if fields:
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in RECORD_FIELDS]
+        if unknown:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown)}"}), 400
+    else:
+        fields = list(RECORD_FIELDS)
+
+    # id وتاريخ التسجيل مطلوبان دائماً لبناء مؤشر الصفحة التالية
+    selected = set(fields) | {"id", "date_recorded"}
+    query = db.session.query(*[RECORD_FIELDS[field] for field in RECORD_FIELDS if field in selected])
+
+    trainee_id = request.args.get("trainee_id", type=int)
+    if trainee_id:
+        query = query.filter(BehaviorRecord.trainee_id == trainee_id)
+
+    trainer_id = request.args.get("trainer_id", type=int)
+    if trainer_id:
+        query = query.filter(BehaviorRecord.recorded_by_trainer_id == trainer_id)
+
+    behavior_type = request.args.get("behavior_type")
+    if behavior_type:
+        query = query.filter(BehaviorRecord.behavior_type == behavior_type)
+
+    try:
+        date_from = request.args.get("date_from")
+        if date_from:
+            query = query.filter(BehaviorRecord.date_recorded >= datetime.fromisoformat(date_from))
+
+        date_to = request.args.get("date_to")
+        if date_to:
+            end = datetime.fromisoformat(date_to)
+            if len(date_to) == 10:
+                # تاريخ بدون وقت يشمل اليوم كاملاً
+                query = query.filter(BehaviorRecord.date_recorded < end + timedelta(days=1))
+            else:
+                query = query.filter(BehaviorRecord.date_recorded <= end)
+    except ValueError:
+        return jsonify({"message": "Invalid date format"}), 400
+
+    def serialize(rows):
+        output = []
+        for row in rows:
+            record = {field: getattr(row, field) for field in fields}
+            if record.get("date_recorded"):
+                record["date_recorded"] = record["date_recorded"].isoformat()
+            output.append(record)
+        return output
+
+    # بدون معاملات تصفح تبقى الاستجابة مصفوفة كاملة كما كانت للعملاء الحاليين
+    if not (cursor_requested() or "per_page" in request.args or "count" in request.args):
+        rows = query.order_by(BehaviorRecord.date_recorded.desc(), BehaviorRecord.id.desc()).all()
+        return jsonify(serialize(rows))
 
+    per_page = max(1, min(request.args.get("per_page", 50, type=int), MAX_PER_PAGE))
+    try:
+        page = keyset_paginate(
+            query,
+            BehaviorRecord.date_recorded,
+            BehaviorRecord.id,
+            per_page=per_page,
+            after=request.args.get("after") or None,
+            count=request.args.get("count")
+        )
+    except InvalidCursor:
+        return jsonify({"message": "Invalid page cursor"}), 400
 
+    result = {
+        "records": serialize(page["items"]),
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"]
+    }
+    if page["total"] is not None:
+        result["total"] = page["total"]
+    return jsonify(result)
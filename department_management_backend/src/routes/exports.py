@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+
+from src.services.exports import EXPORT_DATASETS, EXPORT_FORMATS, stream_export
+from src.routes.auth import token_required, permission_required, log_audit, Permission
+
+exports_bp = Blueprint('exports', __name__)
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+def _parse_date(value, end=False):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    # تاريخ بدون وقت في نهاية الفترة يشمل اليوم كاملاً
+    if end and len(value) == 10:
+        parsed += timedelta(days=1) - timedelta(microseconds=1)
+    return parsed
+
+def _export(current_user, dataset):
+    """بث ملف التصدير دون Content-Length (نقل مجزأ) ليبدأ الإرسال قبل اكتمال القراءة"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'message': f'صيغة التصدير غير مدعومة: {fmt}'}), 400
+    
+    try:
+        filters = {
+            'date_from': _parse_date(request.args.get('date_from')),
+            'date_to': _parse_date(request.args.get('date_to'), end=True)
+        }
+    except ValueError:
+        return jsonify({'message': 'صيغة التاريخ غير صالحة'}), 400
+    
+    for name, type_ in EXPORT_DATASETS[dataset]['filters'].items():
+        filters[name] = request.args.get(name, type=type_)
+    
+    log_audit(current_user.id, 'DATA_EXPORTED', dataset, None,
+             f'تصدير {dataset} بصيغة {fmt}')
+    
+    filename = f'{dataset}_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 2000)
+    return Response(
+        stream_with_context(stream_export(dataset, fmt, batch_size, **filters)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@exports_bp.route('/exports/behavior-records', methods=['GET'])
+@token_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def export_behavior_records(current_user):
+    """تصدير سجلات السلوك (?format=csv|xlsx&date_from&date_to&trainee_id&recorded_by_trainer_id)"""
+    return _export(current_user, 'behavior_records')
+
+@exports_bp.route('/exports/survey-responses', methods=['GET'])
+@token_required
+@permission_required(Permission.VIEW_SURVEYS)
+def export_survey_responses(current_user):
+    """تصدير استجابات الاستبيانات (?format=csv|xlsx&date_from&date_to&survey_id)"""
+    return _export(current_user, 'survey_responses')
+
+@exports_bp.route('/exports/audit-logs', methods=['GET'])
+@token_required
+@permission_required(Permission.MANAGE_USERS)
+def export_audit_logs(current_user):
+    """تصدير سجل المراجعة (?format=csv|xlsx&date_from&date_to&user_id&action)"""
+    return _export(current_user, 'audit_logs')
@@ -0,0 +1,68 @@
+from datetime import date
+
+from flask import Blueprint, request, jsonify
+
+from src.models.initiatives import BehaviorRecord, FollowUpReminder
+from src.services.follow_ups import due_follow_ups, follow_up_summary
+from src.services.pagination import paginate_request, InvalidCursor
+from src.routes.auth import token_claims_required, permission_required, Permission
+
+follow_ups_bp = Blueprint('follow_ups', __name__)
+
+@follow_ups_bp.route('/follow-ups/due', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def get_due_follow_ups(current_user):
+    """متابعات سجلات السلوك المستحقة (?scope=due|overdue|today|upcoming) مع ملخص الأعداد"""
+    try:
+        days = min(request.args.get('days', 7, type=int), 90)
+        today = date.today()
+        
+        try:
+            query = due_follow_ups(request.args.get('scope', 'due'), today, days)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        reported_by = request.args.get('reported_by', type=int)
+        if reported_by:
+            query = query.filter_by(reported_by=reported_by)
+        
+        try:
+            result = paginate_request(
+                query, 'follow_ups',
+                lambda records: [record.to_dict() for record in records],
+                BehaviorRecord.follow_up_date,
+                BehaviorRecord.id,
+                descending=False
+            )
+        except InvalidCursor as e:
+            return jsonify({'message': str(e)}), 400
+        
+        result['summary'] = follow_up_summary(today, days)
+        return jsonify(result), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
+@follow_ups_bp.route('/follow-ups/reminders', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def get_follow_up_reminders(current_user):
+    """تذكيرات المتابعة الموجهة للمستخدم الحالي"""
+    try:
+        query = FollowUpReminder.query.filter_by(recipient_id=current_user.id)
+        
+        try:
+            result = paginate_request(
+                query, 'reminders',
+                lambda reminders: [reminder.to_dict() for reminder in reminders],
+                FollowUpReminder.created_at,
+                FollowUpReminder.id
+            )
+        except InvalidCursor as e:
+            return jsonify({'message': str(e)}), 400
+        
+        return jsonify(result), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
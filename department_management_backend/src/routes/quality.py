@@ -3,6 +3,7 @@ from datetime import datetime, date, timedelta
 import os
 import pandas as pd
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
 import json
 
 from src.models.quality import (
@@ -10,13 +11,28 @@ from src.models.quality import (
     ReportTemplate, GeneratedReport, RayatImport, KPI, KPIValue,
     init_default_quality_standards, init_default_kpis
 )
-from src.routes.auth import token_required, permission_required, log_audit, Permission
+from src.services.kpi_latest import get_latest_kpi_values, record_kpi_value
+from src.services.kpi_rollups import record_kpi_rollups, get_kpi_series
+from src.services.quality_scores import get_quality_scores, current_period
+from src.services.job_runner import enqueue_job, start_job_runner, REPORT_RENDERERS
+from src.services.rayat_import import ROW_READERS
+from src.services.report_renderer import resolve_sections, forbidden_sections
+from src.services.pagination import paginate_request, InvalidCursor
+from src.services.search import search_ids
+from src.services.response_cache import response_cache, cached_response
+from src.routes.auth import token_required, token_claims_required, permission_required, log_audit, Permission
 
 quality_bp = Blueprint('quality', __name__)
 
 # إعدادات رفع الملفات
 UPLOAD_FOLDER = 'uploads/rayat'
-ALLOWED_EXTENSIONS = {'pdf', 'csv', 'xlsx', 'xls'}
+# الأنواع التي يستطيع معالج رايات قراءتها فقط، حتى لا تُقبل ملفات تفشل لاحقاً في المهمة
+ALLOWED_EXTENSIONS = set(ROW_READERS)
+
+@quality_bp.before_app_request
+def _start_job_runner():
+    # تشغيل المنفذ مع أول طلب للتطبيق لتبدأ استعادة المهام العالقة دون انتظار رفع ملف أو طلب تقرير
+    start_job_runner(current_app._get_current_object(), notify=False)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -27,13 +43,12 @@ def ensure_upload_folder():
         os.makedirs(UPLOAD_FOLDER)
 
 @quality_bp.route('/standards', methods=['GET'])
-@token_required
+@token_claims_required
 @permission_required(Permission.VIEW_QUALITY)
+@cached_response('standards')
 def get_quality_standards(current_user):
     """الحصول على معايير الجودة"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
         category = request.args.get('category', '')
         search = request.args.get('search', '')
         
@@ -43,27 +58,17 @@ def get_quality_standards(current_user):
             query = query.filter(QualityStandard.category == category)
         
         if search:
-            query = query.filter(
-                db.or_(
-                    QualityStandard.name.contains(search),
-                    QualityStandard.code.contains(search),
-                    QualityStandard.description.contains(search)
-                )
-            )
+            query = query.filter(QualityStandard.id.in_(search_ids('quality_standard', search)))
         
-        standards = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
-        
-        return jsonify({
-            'standards': [standard.to_dict() for standard in standards.items],
-            'total': standards.total,
-            'pages': standards.pages,
-            'current_page': page
-        }), 200
+        return jsonify(paginate_request(
+            query, 'standards',
+            lambda standards: [standard.to_dict() for standard in standards],
+            sort_column=QualityStandard.id,
+            descending=False
+        )), 200
         
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
@@ -98,6 +103,7 @@ def create_quality_standard(current_user):
         
         db.session.add(standard)
         db.session.commit()
+        response_cache.invalidate('standards', 'dashboard')
         
         log_audit(current_user.id, 'QUALITY_STANDARD_CREATED', 'quality_standard', str(standard.id),
                  f'تم إنشاء معيار جودة جديد: {standard.name}')
@@ -112,8 +118,9 @@ def create_quality_standard(current_user):
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
 @quality_bp.route('/kpis', methods=['GET'])
-@token_required
+@token_claims_required
 @permission_required(Permission.VIEW_QUALITY)
+@cached_response('kpis')
 def get_kpis(current_user):
     """الحصول على مؤشرات الأداء الرئيسية"""
     try:
@@ -130,15 +137,14 @@ def get_kpis(current_user):
         
         kpis = query.all()
         
-        # إضافة آخر قيمة لكل مؤشر
+        # إضافة آخر قيمة لكل مؤشر (استعلام واحد لجميع المؤشرات)
+        latest_values = get_latest_kpi_values([kpi.id for kpi in kpis])
+        
         kpis_data = []
         for kpi in kpis:
             kpi_dict = kpi.to_dict()
             
-            # الحصول على آخر قيمة
-            latest_value = KPIValue.query.filter_by(kpi_id=kpi.id)\
-                .order_by(KPIValue.measurement_date.desc()).first()
-            
+            latest_value = latest_values.get(kpi.id)
             if latest_value:
                 kpi_dict['latest_value'] = latest_value.to_dict()
             else:
@@ -152,7 +158,7 @@ def get_kpis(current_user):
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
 @quality_bp.route('/kpis/<int:kpi_id>/values', methods=['GET'])
-@token_required
+@token_claims_required
 @permission_required(Permission.VIEW_QUALITY)
 def get_kpi_values(current_user, kpi_id):
     """الحصول على قيم مؤشر أداء محدد"""
@@ -178,6 +184,33 @@ def get_kpi_values(current_user, kpi_id):
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
+@quality_bp.route('/kpis/<int:kpi_id>/series', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_QUALITY)
+@cached_response('kpis')
+def get_kpi_series_data(current_user, kpi_id):
+    """سلسلة قيم مؤشر أداء للرسم البياني (أسبوعية، شهرية، فصلية، سنوية) بعدد نقاط محدود"""
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        try:
+            series = get_kpi_series(
+                kpi_id,
+                granularity=request.args.get('granularity', 'auto'),
+                start_date=datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
+                end_date=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None,
+                max_points=request.args.get('max_points', 200, type=int),
+                value=request.args.get('value', 'mean')
+            )
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        return jsonify(series), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
 @quality_bp.route('/kpis/<int:kpi_id>/values', methods=['POST'])
 @token_required
 @permission_required(Permission.MANAGE_QUALITY)
@@ -217,7 +250,11 @@ def add_kpi_value(current_user, kpi_id):
         )
         
         db.session.add(kpi_value)
+        db.session.flush()
+        record_kpi_value(kpi_value)
+        record_kpi_rollups(kpi_value)
         db.session.commit()
+        response_cache.invalidate('kpis', 'dashboard')
         
         log_audit(current_user.id, 'KPI_VALUE_ADDED', 'kpi_value', str(kpi_value.id),
                  f'تم إضافة قيمة جديدة لمؤشر الأداء: {kpi.name}')
@@ -227,6 +264,10 @@ def add_kpi_value(current_user, kpi_id):
             'value': kpi_value.to_dict()
         }), 201
         
+    except IntegrityError:
+        # قيد التفرد (kpi_id, measurement_date) يمنع التكرار عند الإضافات المتزامنة
+        db.session.rollback()
+        return jsonify({'message': 'يوجد قيمة مسجلة في هذا التاريخ مسبقاً'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
@@ -249,7 +290,7 @@ def upload_rayat_file(current_user):
             return jsonify({'message': 'لم يتم اختيار ملف'}), 400
         
         if not allowed_file(file.filename):
-            return jsonify({'message': 'نوع الملف غير مدعوم'}), 400
+            return jsonify({'message': f"نوع الملف غير مدعوم، الأنواع المدعومة: {', '.join(sorted(ALLOWED_EXTENSIONS))}"}), 400
         
         # حفظ الملف
         filename = secure_filename(file.filename)
@@ -269,14 +310,17 @@ def upload_rayat_file(current_user):
         )
         
         db.session.add(rayat_import)
+        db.session.flush()
+        
+        # معالجة الملف في الخلفية (تُحفظ المهمة في نفس المعاملة)
+        enqueue_job('process_rayat_import', {'import_id': rayat_import.id})
         db.session.commit()
+        response_cache.invalidate('dashboard')
+        start_job_runner(current_app._get_current_object())
         
         log_audit(current_user.id, 'RAYAT_FILE_UPLOADED', 'rayat_import', str(rayat_import.id),
                  f'تم رفع ملف رايات: {file.filename}')
         
-        # هنا يمكن إضافة معالجة الملف في الخلفية
-        # process_rayat_file.delay(rayat_import.id)
-        
         return jsonify({
             'message': 'تم رفع الملف بنجاح',
             'import': rayat_import.to_dict()
@@ -292,8 +336,6 @@ def upload_rayat_file(current_user):
 def get_rayat_imports(current_user):
     """الحصول على قائمة استيرادات رايات"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
         import_type = request.args.get('import_type', '')
         status = request.args.get('status', '')
         
@@ -305,25 +347,22 @@ def get_rayat_imports(current_user):
         if status:
             query = query.filter(RayatImport.status == status)
         
-        imports = query.order_by(RayatImport.imported_at.desc()).paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
-        
-        return jsonify({
-            'imports': [imp.to_dict() for imp in imports.items],
-            'total': imports.total,
-            'pages': imports.pages,
-            'current_page': page
-        }), 200
+        return jsonify(paginate_request(
+            query, 'imports',
+            lambda imports: [imp.to_dict() for imp in imports],
+            sort_column=RayatImport.imported_at,
+            id_column=RayatImport.id
+        )), 200
         
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
 @quality_bp.route('/reports/templates', methods=['GET'])
-@token_required
+@token_claims_required
 @permission_required(Permission.VIEW_REPORTS)
+@cached_response('reports')
 def get_report_templates(current_user):
     """الحصول على قوالب التقارير"""
     try:
@@ -364,6 +403,20 @@ def generate_report(current_user):
         if not template:
             return jsonify({'message': 'قالب التقرير غير موجود'}), 404
         
+        if template.output_format not in REPORT_RENDERERS:
+            return jsonify({'message': f'صيغة الإخراج غير مدعومة: {template.output_format}'}), 400
+        
+        # التحقق من أقسام القالب والمعاملات قبل إضافة المهمة إلى الطابور
+        try:
+            resolve_sections(template, data.get('parameters'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        # أقسام التقرير لا تكشف بيانات ممنوعة على المستدعي في مساراتها الأصلية (مثل سجل المراجعة)
+        forbidden = forbidden_sections(template, current_user)
+        if forbidden:
+            return jsonify({'message': f"ليس لديك صلاحية لقراءة بيانات الأقسام: {', '.join(forbidden)}"}), 403
+        
         # إنشاء سجل التقرير
         report = GeneratedReport(
             template_id=data['template_id'],
@@ -376,14 +429,17 @@ def generate_report(current_user):
             report.set_parameters(data['parameters'])
         
         db.session.add(report)
+        db.session.flush()
+        
+        # إنشاء التقرير في الخلفية (تُحفظ المهمة في نفس المعاملة)
+        enqueue_job('generate_report', {'report_id': report.id})
         db.session.commit()
+        response_cache.invalidate('reports')
+        start_job_runner(current_app._get_current_object())
         
         log_audit(current_user.id, 'REPORT_GENERATED', 'generated_report', str(report.id),
                  f'تم إنشاء تقرير جديد: {report.title}')
         
-        # هنا يمكن إضافة معالجة التقرير في الخلفية
-        # generate_report_task.delay(report.id)
-        
         return jsonify({
             'message': 'تم بدء إنشاء التقرير',
             'report': report.to_dict()
@@ -394,13 +450,11 @@ def generate_report(current_user):
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
 @quality_bp.route('/reports', methods=['GET'])
-@token_required
+@token_claims_required
 @permission_required(Permission.VIEW_REPORTS)
 def get_generated_reports(current_user):
     """الحصول على التقارير المُنشأة"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
         status = request.args.get('status', '')
         
         query = GeneratedReport.query
@@ -412,18 +466,44 @@ def get_generated_reports(current_user):
         if not current_user.has_permission(Permission.MANAGE_QUALITY):
             query = query.filter(GeneratedReport.generated_by == current_user.id)
         
-        reports = query.order_by(GeneratedReport.generated_at.desc()).paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        return jsonify(paginate_request(
+            query, 'reports',
+            lambda reports: [report.to_dict() for report in reports],
+            sort_column=GeneratedReport.generated_at,
+            id_column=GeneratedReport.id
+        )), 200
+    
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
+@quality_bp.route('/reports/<int:report_id>/download', methods=['GET'])
+@token_required
+@permission_required(Permission.VIEW_REPORTS)
+def download_report(current_user, report_id):
+    """تنزيل ملف تقرير مكتمل"""
+    try:
+        report = GeneratedReport.query.get(report_id)
+        if not report:
+            return jsonify({'message': 'التقرير غير موجود'}), 404
         
-        return jsonify({
-            'reports': [report.to_dict() for report in reports.items],
-            'total': reports.total,
-            'pages': reports.pages,
-            'current_page': page
-        }), 200
+        # المدربون يرون تقاريرهم فقط
+        if report.generated_by != current_user.id and not current_user.has_permission(Permission.MANAGE_QUALITY):
+            return jsonify({'message': 'التقرير غير موجود'}), 404
+        
+        if forbidden_sections(report.template, current_user):
+            return jsonify({'message': 'ليس لديك صلاحية للوصول لهذا المورد'}), 403
+        
+        if report.status != 'completed' or not report.file_path or not os.path.exists(report.file_path):
+            return jsonify({'message': 'ملف التقرير غير متوفر'}), 404
+        
+        extension = os.path.splitext(report.file_path)[1]
+        return send_file(
+            os.path.abspath(report.file_path),
+            as_attachment=True,
+            download_name=f'report_{report.id}{extension}'
+        )
         
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
@@ -431,6 +511,7 @@ def get_generated_reports(current_user):
 @quality_bp.route('/dashboard/summary', methods=['GET'])
 @token_required
 @permission_required(Permission.VIEW_QUALITY)
+@cached_response('dashboard', 'standards', 'kpis')
 def get_quality_dashboard_summary(current_user):
     """الحصول على ملخص لوحة تحكم الجودة"""
     try:
@@ -447,10 +528,10 @@ def get_quality_dashboard_summary(current_user):
         # مؤشرات الأداء الحرجة
         critical_kpis = []
         kpis = KPI.query.filter_by(is_active=True).all()
+        latest_values = get_latest_kpi_values([kpi.id for kpi in kpis])
         
         for kpi in kpis:
-            latest_value = KPIValue.query.filter_by(kpi_id=kpi.id)\
-                .order_by(KPIValue.measurement_date.desc()).first()
+            latest_value = latest_values.get(kpi.id)
             
             if latest_value and kpi.critical_threshold:
                 if latest_value.value <= kpi.critical_threshold:
@@ -479,6 +560,26 @@ def get_quality_dashboard_summary(current_user):
     except Exception as e:
         return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
 
+@quality_bp.route('/scores', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_QUALITY)
+def get_quality_score_summary(current_user):
+    """درجات معايير الجودة ومؤشر القسم العام لفترة (سنة، فصل، شهر)"""
+    try:
+        try:
+            scores = get_quality_scores(request.args.get('period') or current_period())
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        # الاستجابة تتغير فقط عند إعادة الحساب، فيكفي لوحة التحكم التحقق بـ If-None-Match
+        response = jsonify(scores)
+        response.add_etag()
+        return response.make_conditional(request)
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
 @quality_bp.route('/init-defaults', methods=['POST'])
 @token_required
 @permission_required(Permission.MANAGE_QUALITY)
@@ -490,6 +591,7 @@ def initialize_defaults(current_user):
         
         # تهيئة مؤشرات الأداء الافتراضية
         init_default_kpis()
+        response_cache.invalidate('standards', 'kpis', 'dashboard')
         
         log_audit(current_user.id, 'QUALITY_DEFAULTS_INITIALIZED', 'system', 'quality',
                  'تم تهيئة البيانات الافتراضية للجودة')
@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify
+
+from src.services.behavior_scorecards import get_scorecards, get_at_risk_trainees
+from src.routes.auth import token_claims_required, permission_required, Permission
+
+scorecards_bp = Blueprint('scorecards', __name__)
+
+# الحد الأقصى لعدد المتدربين في طلب واحد
+MAX_BULK_TRAINEES = 500
+
+@scorecards_bp.route('/scorecards/<int:trainee_id>', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def get_trainee_scorecard(current_user, trainee_id):
+    """بطاقة سلوك متدرب: صافي النقاط وعدد الحوادث حسب الفئة والشدة والمتابعات المفتوحة"""
+    try:
+        return jsonify({'scorecard': get_scorecards([trainee_id])[0]}), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
+@scorecards_bp.route('/scorecards', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def get_trainee_scorecards(current_user):
+    """بطاقات مجموعة متدربين (?trainee_ids=1,2,3)"""
+    try:
+        try:
+            trainee_ids = [int(value) for value in request.args.get('trainee_ids', '').split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'message': 'معرفات المتدربين غير صحيحة'}), 400
+        
+        if not trainee_ids:
+            return jsonify({'message': 'معرفات المتدربين مطلوبة'}), 400
+        
+        if len(trainee_ids) > MAX_BULK_TRAINEES:
+            return jsonify({'message': f'الحد الأقصى {MAX_BULK_TRAINEES} متدرب في الطلب الواحد'}), 400
+        
+        return jsonify({'scorecards': get_scorecards(trainee_ids)}), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
+
+@scorecards_bp.route('/scorecards/at-risk', methods=['GET'])
+@token_claims_required
+@permission_required(Permission.VIEW_TRAINEE_BEHAVIOR)
+def get_at_risk_scorecards(current_user):
+    """المتدربون الأكثر عرضة للخطر مرتبين حسب صافي النقاط ثم المتابعات المفتوحة"""
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), MAX_BULK_TRAINEES))
+        max_net_points = request.args.get('max_net_points', 0, type=int)
+        min_open_follow_ups = request.args.get('min_open_follow_ups', 0, type=int)
+        
+        return jsonify({
+            'trainees': get_at_risk_trainees(limit, max_net_points, min_open_follow_ups)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'خطأ في الخادم: {str(e)}'}), 500
@@ -1,17 +1,28 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_file
 from department_management_backend.src.models.surveys import Survey, SurveyQuestion, SurveyResponse, QuestionAnswer
 from department_management_backend.src.database import db
+from department_management_backend.src.services.survey_submission import submit_survey_responses, validate_submission, InvalidSubmission, SURVEY_FULL_ERROR
+from department_management_backend.src.services.survey_buffer import survey_buffer, start_survey_buffer
+from department_management_backend.src.services.survey_results import get_survey_results
+from department_management_backend.src.services.survey_analytics import export_survey_analytics_archive, EXPORT_FORMATS
 import json
 
 surveys_bp = Blueprint("surveys", __name__)
 
+@surveys_bp.before_app_request
+def _start_survey_buffer():
+    # Start the flusher with the app so journaled responses left by a previous run are replayed right away
+    if current_app.config.get("SURVEY_BUFFERED_INGESTION", False):
+        start_survey_buffer(current_app._get_current_object())
+
 @surveys_bp.route("/surveys", methods=["POST"])
 def create_survey():
     data = request.get_json()
     new_survey = Survey(
         title=data["title"],
         description=data.get("description"),
-        is_active=data.get("is_active", True)
+        is_active=data.get("is_active", True),
+        max_responses=data.get("max_responses")
     )
     db.session.add(new_survey)
     db.session.commit()
@@ -29,25 +40,56 @@ def create_survey():
 
 @surveys_bp.route("/surveys/<int:survey_id>/respond", methods=["POST"])
 def respond_to_survey(survey_id):
+    survey = db.session.get(Survey, survey_id)
+    if survey is None:
+        return jsonify({"message": "Survey not found"}), 404
+
     data = request.get_json()
-    new_response = SurveyResponse(
-        survey_id=survey_id,
-        trainee_id=data.get("trainee_id"),
-        trainer_id=data.get("trainer_id")
-    )
-    db.session.add(new_response)
-    db.session.commit()
 
-    for qa in data.get("answers", []):
-        new_answer = QuestionAnswer(
-            response_id=new_response.id,
-            question_id=qa["question_id"],
-            answer_text=qa.get("answer_text"),
-            answer_value=qa.get("answer_value")
-        )
-        db.session.add(new_answer)
-    db.session.commit()
-    return jsonify({"message": "Survey response submitted successfully"}), 201
+    if current_app.config.get("SURVEY_BUFFERED_INGESTION", False):
+        # The cap is enforced again atomically when the buffer is flushed
+        if survey.max_responses is not None and survey.response_count >= survey.max_responses:
+            return jsonify({"message": SURVEY_FULL_ERROR}), 409
+        try:
+            validate_submission(survey_id, data)
+        except InvalidSubmission as e:
+            return jsonify({"message": str(e)}), 400
+        start_survey_buffer(current_app._get_current_object())
+        submission_key = survey_buffer.append(survey_id, data)
+        return jsonify({"message": "Survey response accepted", "submission_key": submission_key}), 202
+
+    result = submit_survey_responses(survey_id, [data])[0]
+    if result["status"] == "failed" and result.get("retryable"):
+        return jsonify({"message": result["error"]}), 503
+    if result["status"] == "failed":
+        return jsonify({"message": result["error"]}), 409 if result["error"] == SURVEY_FULL_ERROR else 400
+    if result["status"] == "duplicate":
+        return jsonify({"message": "Survey response already submitted", "response_id": result["response_id"]}), 200
+    return jsonify({"message": "Survey response submitted successfully", "response_id": result["response_id"]}), 201
+
+@surveys_bp.route("/surveys/<int:survey_id>/respond/batch", methods=["POST"])
+def respond_to_survey_batch(survey_id):
+    if db.session.get(Survey, survey_id) is None:
+        return jsonify({"message": "Survey not found"}), 404
+
+    data = request.get_json() or {}
+    submissions = data.get("responses")
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({"message": "responses must be a non-empty list"}), 400
+
+    max_size = current_app.config.get("SURVEY_BATCH_MAX_SIZE", 500)
+    if len(submissions) > max_size:
+        return jsonify({"message": f"Batch size exceeds the limit of {max_size} responses"}), 413
+
+    results = submit_survey_responses(survey_id, submissions)
+    created = sum(1 for result in results if result["status"] == "created")
+    failed = sum(1 for result in results if result["status"] == "failed")
+    return jsonify({
+        "results": results,
+        "created": created,
+        "duplicates": len(results) - created - failed,
+        "failed": failed
+    }), 207 if failed else 201
 
 @surveys_bp.route("/surveys", methods=["GET"])
 def get_surveys():
@@ -59,8 +101,40 @@ def get_surveys():
             "title": survey.title,
             "description": survey.description,
             "created_at": survey.created_at.isoformat(),
-            "is_active": survey.is_active
+            "is_active": survey.is_active,
+            "max_responses": survey.max_responses,
+            "response_count": survey.response_count
         })
     return jsonify(output)
 
+@surveys_bp.route("/surveys/<int:survey_id>/results", methods=["GET"])
+def get_survey_results_summary(survey_id):
+    survey = db.session.get(Survey, survey_id)
+    if survey is None:
+        return jsonify({"message": "Survey not found"}), 404
+
+    results = get_survey_results(survey_id)
+    results["response_count"] = survey.response_count
+    return jsonify(results)
 
+@surveys_bp.route("/surveys/<int:survey_id>/analytics", methods=["GET"])
+def export_survey_analytics_file(survey_id):
+    if db.session.get(Survey, survey_id) is None:
+        return jsonify({"message": "Survey not found"}), 404
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": f"Unsupported format: {fmt}"}), 400
+
+    try:
+        archive = export_survey_analytics_archive(
+            survey_id, fmt, scale=current_app.config.get("SURVEY_LIKERT_SCALE", 5)
+        )
+    except ImportError:
+        return jsonify({"message": "Parquet export requires pyarrow"}), 400
+    return send_file(
+        archive,
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=f"survey_{survey_id}_analytics.zip"
+    )
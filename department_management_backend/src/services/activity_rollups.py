@@ -0,0 +1,113 @@
+from datetime import datetime
+
+from sqlalchemy import table, column, case, and_, func
+
+from department_management_backend.src.database import db
+from department_management_backend.src.models.behavior_records import BehaviorRecord
+from department_management_backend.src.models.surveys import SurveyQuestion, SurveyResponse, QuestionAnswer
+from department_management_backend.src.services.sql import dialect_insert
+
+# جدول تجميعات لوحة التحكم معرَّف صراحةً حتى يُكتب عبر جلسة هذه الوحدة مع السجلات التي يلخصها
+dashboard_rollups = table(
+    'dashboard_rollups',
+    column('metric'),
+    column('dimension'),
+    column('period'),
+    column('count'),
+    column('total'),
+    column('updated_at')
+)
+
+# أنواع الأسئلة التي تدخل قيمها في متوسط الرضا
+RATING_QUESTION_TYPES = ('rating',)
+
+def _add(connection, metric, deltas):
+    """إضافة فروقات {(dimension, period): [count, total]} إلى التجميعات بعبارة upsert واحدة"""
+    if not deltas:
+        return
+    
+    statement = dialect_insert(connection.dialect.name)(dashboard_rollups)
+    statement = statement.on_conflict_do_update(
+        index_elements=['metric', 'dimension', 'period'],
+        set_={
+            'count': dashboard_rollups.c.count + statement.excluded.count,
+            'total': dashboard_rollups.c.total + statement.excluded.total,
+            'updated_at': statement.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    connection.execute(statement, [
+        {
+            'metric': metric,
+            'dimension': dimension,
+            'period': period,
+            'count': count,
+            'total': total,
+            'updated_at': now
+        }
+        for (dimension, period), (count, total) in sorted(deltas.items())
+    ])
+
+def record_behavior_incidents(connection, records):
+    """عدد المخالفات لكل نوع سلوك وشهر لمجموعة سجلات مُدرجة (ضمن معاملة الإدراج نفسها)"""
+    deltas = {}
+    for record in records:
+        date_recorded = record.get('date_recorded') or datetime.utcnow()
+        delta = deltas.setdefault((record['behavior_type'], date_recorded.strftime('%Y-%m')), [0, 0.0])
+        delta[0] += 1
+    _add(connection, 'behavior_incidents', deltas)
+
+def respondent_audience(trainee_id, trainer_id):
+    """فئة المستجيب: المدربون إذا حُدد المدرب وحده، وإلا المتدربون (ومنهم الاستبيانات المجهولة)"""
+    return 'trainers' if trainer_id is not None and trainee_id is None else 'trainees'
+
+def record_survey_ratings(connection, items, question_types):
+    """مجموع وعدد قيم أسئلة التقييم لكل فئة مستجيبين لمجموعة استجابات مُدرجة"""
+    deltas = {}
+    for item in items:
+        response = item['response']
+        audience = respondent_audience(response.get('trainee_id'), response.get('trainer_id'))
+        for answer in item['answers']:
+            if question_types.get(answer['question_id']) not in RATING_QUESTION_TYPES:
+                continue
+            if answer.get('answer_value') is None:
+                continue
+            delta = deltas.setdefault((audience, ''), [0, 0.0])
+            delta[0] += 1
+            delta[1] += answer['answer_value']
+    _add(connection, 'survey_rating', deltas)
+
+def rebuild_activity_rollups():
+    """إعادة بناء تجميعات المخالفات والتقييمات من سجلات السلوك وإجابات الاستبيانات"""
+    connection = db.session.connection()
+    connection.execute(dashboard_rollups.delete().where(
+        dashboard_rollups.c.metric.in_(('behavior_incidents', 'survey_rating'))
+    ))
+    
+    month = func.strftime('%Y-%m', BehaviorRecord.date_recorded) \
+        if connection.dialect.name == 'sqlite' else func.to_char(BehaviorRecord.date_recorded, 'YYYY-MM')
+    _add(connection, 'behavior_incidents', {
+        (behavior_type, period): [count, 0.0]
+        for behavior_type, period, count in db.session.query(
+            BehaviorRecord.behavior_type, month, func.count(BehaviorRecord.id)
+        ).group_by(BehaviorRecord.behavior_type, month)
+    })
+    
+    audience = case(
+        (and_(SurveyResponse.trainer_id.isnot(None), SurveyResponse.trainee_id.is_(None)), 'trainers'),
+        else_='trainees'
+    )
+    _add(connection, 'survey_rating', {
+        (name, ''): [count, float(total)]
+        for name, count, total in db.session.query(
+            audience, func.count(QuestionAnswer.id), func.sum(QuestionAnswer.answer_value)
+        ).select_from(QuestionAnswer)
+        .join(SurveyResponse, SurveyResponse.id == QuestionAnswer.response_id)
+        .join(SurveyQuestion, SurveyQuestion.id == QuestionAnswer.question_id)
+        .filter(
+            SurveyQuestion.question_type.in_(RATING_QUESTION_TYPES),
+            QuestionAnswer.answer_value.isnot(None)
+        ).group_by(audience)
+    })
+    
+    db.session.commit()
@@ -0,0 +1,206 @@
+from datetime import datetime
+from threading import Thread, Lock, Event
+import atexit
+import json
+import queue
+import time
+
+from src.models.auth import db, AuditLog
+
+class AuditWriter:
+    """كاتب سجل المراجعة غير المتزامن: طابور محدود داخل العملية وإدراج جماعي في الخلفية"""
+    
+    def __init__(self, maxsize=10000, batch_size=200, flush_interval=1.0, enqueue_timeout=0.05,
+                 write_retries=3, retry_delay=0.5, failed_path='audit_failed.jsonl'):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.write_retries = write_retries
+        self.retry_delay = retry_delay
+        self.failed_path = failed_path
+        self._failed_lock = Lock()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._app = None
+        self._thread = None
+        self._stopping = Event()
+        self._lock = Lock()
+        self._metrics_lock = Lock()
+        
+        # المقاييس
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_at = None
+    
+    def configure(self, app):
+        """قراءة الإعدادات من تطبيق Flask"""
+        self._app = app
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.enqueue_timeout = app.config.get('AUDIT_ENQUEUE_TIMEOUT', self.enqueue_timeout)
+        self.write_retries = app.config.get('AUDIT_WRITE_RETRIES', self.write_retries)
+        self.retry_delay = app.config.get('AUDIT_RETRY_DELAY', self.retry_delay)
+        self.failed_path = app.config.get('AUDIT_FAILED_PATH', self.failed_path)
+        maxsize = app.config.get('AUDIT_QUEUE_MAXSIZE')
+        if maxsize and self._thread is None:
+            self._queue = queue.Queue(maxsize=maxsize)
+    
+    def start(self, app):
+        """تشغيل خيط الكتابة في الخلفية (مرة واحدة)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.configure(app)
+            self._stopping.clear()
+            self._thread = Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+    
+    def enqueue(self, entry):
+        """إضافة سجل إلى الطابور مع ضغط عكسي محدود بالمهلة، ويُسقط السجل عند امتلاء الطابور"""
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._metrics_lock:
+                self.dropped += 1
+            return False
+        
+        with self._metrics_lock:
+            self.enqueued += 1
+        return True
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        # التفريغ النهائي يتم داخل الخيط نفسه حتى لا يتسابق مع stop على الطابور
+        self.flush()
+    
+    def _collect(self):
+        """تجميع دفعة حتى بلوغ الحجم أو انقضاء المهلة الزمنية"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _insert(self, entries):
+        with self._app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(AuditLog.__table__.insert(), entries)
+    
+    def _write(self, batch):
+        """إدراج الدفعة بعبارة واحدة مع إعادة المحاولة بتأخير متزايد، ثم سجلاً سجلاً عند استمرار الفشل"""
+        for attempt in range(self.write_retries + 1):
+            try:
+                self._insert(batch)
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_at = datetime.utcnow()
+                return
+            except Exception as e:
+                error = e
+                if attempt < self.write_retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+        
+        print(f"خطأ في كتابة دفعة سجل المراجعة، الكتابة سجلاً سجلاً: {error}")
+        failed = []
+        for entry in batch:
+            try:
+                self._insert([entry])
+                self.written += 1
+            except Exception:
+                failed.append(entry)
+        self.last_flush_at = datetime.utcnow()
+        if failed:
+            self.save_failed(failed)
+    
+    def save_failed(self, entries):
+        """حفظ السجلات التي تعذرت كتابتها في ملف JSON Lines بدلاً من إسقاطها (تُعاد بالأمر replay-failed-audit)"""
+        self.failed += len(entries)
+        try:
+            with self._failed_lock, open(self.failed_path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            print(f"تعذر حفظ {len(entries)} من سجلات المراجعة في {self.failed_path}: {e}")
+    
+    def replay_failed(self):
+        """إعادة إدراج السجلات المحفوظة في ملف الفشل؛ ما يفشل مجدداً يبقى في الملف"""
+        with self._failed_lock:
+            try:
+                with open(self.failed_path, encoding='utf-8') as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return 0, 0
+            
+            remaining = []
+            for entry in entries:
+                entry['timestamp'] = datetime.fromisoformat(entry['timestamp']) if entry.get('timestamp') else None
+                try:
+                    self._insert([entry])
+                except Exception:
+                    remaining.append(entry)
+            
+            with open(self.failed_path, 'w', encoding='utf-8') as f:
+                for entry in remaining:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        
+        self.failed -= min(self.failed, len(entries) - len(remaining))
+        return len(entries) - len(remaining), len(remaining)
+    
+    def flush(self):
+        """تفريغ كل ما في الطابور بشكل متزامن"""
+        if self._app is None:
+            return
+        
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write(batch)
+    
+    def stop(self, timeout=5.0):
+        """إيقاف خيط الكتابة وتفريغ الطابور عند إغلاق العملية"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is None:
+            self.flush()
+            return
+        # الخيط يفرغ الطابور بنفسه قبل انتهائه؛ لا تفريغ من هنا ما دام يعمل
+        thread.join(timeout)
+        if not thread.is_alive():
+            self._thread = None
+    
+    def metrics(self):
+        """مقاييس الطابور"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
+audit_writer = AuditWriter()
+
+atexit.register(audit_writer.stop)
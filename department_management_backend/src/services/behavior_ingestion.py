@@ -0,0 +1,137 @@
+from datetime import datetime
+
+from sqlalchemy import insert, table, column
+
+from department_management_backend.src.database import db
+from department_management_backend.src.models.behavior_records import BehaviorRecord
+from department_management_backend.src.services.activity_rollups import record_behavior_incidents
+
+# جدول سجل المراجعة معرَّف صراحةً حتى يُكتب عبر جلسة هذه الوحدة وليس عبر نسخة قاعدة بيانات المصادقة
+audit_logs = table(
+    'audit_logs',
+    column('user_id'),
+    column('action'),
+    column('resource'),
+    column('resource_id'),
+    column('details'),
+    column('ip_address'),
+    column('user_agent'),
+    column('timestamp')
+)
+
+class InvalidRecord(ValueError):
+    pass
+
+def _required_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise InvalidRecord(f'Invalid value for {name}: {value}')
+    return value
+
+def _timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f'Invalid date format: {value}')
+
+def _normalize(record, defaults):
+    """التحقق من سجل واحد؛ الحقول غير المحددة تؤخذ من قيم الدفعة (المدرب والتاريخ ونوع السلوك)"""
+    if not isinstance(record, dict):
+        raise InvalidRecord('Invalid record format')
+    values = dict(defaults, **record)
+    
+    behavior_type = values.get('behavior_type')
+    if not isinstance(behavior_type, str) or not behavior_type.strip():
+        raise InvalidRecord('behavior_type is required')
+    if len(behavior_type) > 100:
+        raise InvalidRecord('behavior_type must be at most 100 characters')
+    
+    description = values.get('description')
+    if description is not None and not isinstance(description, str):
+        description = str(description)
+    
+    return {
+        'trainee_id': _required_int(values.get('trainee_id'), 'trainee_id'),
+        'behavior_type': behavior_type.strip(),
+        'description': description,
+        'recorded_by_trainer_id': _required_int(values.get('recorded_by_trainer_id'), 'recorded_by_trainer_id'),
+        'date_recorded': _timestamp(values.get('date_recorded'))
+    }
+
+def _insert(rows):
+    """إدراج السجلات بعبارة جماعية واحدة وتحديث تجميعات لوحة التحكم، مع إرجاع المعرفات بالترتيب"""
+    record_ids = db.session.scalars(
+        insert(BehaviorRecord).returning(BehaviorRecord.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+    record_behavior_incidents(db.session.connection(), rows)
+    return record_ids
+
+def ingest_behavior_records(records, defaults=None, audit=None):
+    """حفظ مجموعة سجلات سلوك في معاملة واحدة، مع نتيجة مستقلة لكل سجل
+    
+    audit: بيانات سجل المراجعة للدفعة (user_id, ip_address, user_agent)، ويُكتب في معاملة السجلات نفسها
+    """
+    defaults = {key: value for key, value in (defaults or {}).items() if value is not None}
+    # سجلات الدفعة الواحدة تُسجَّل بالتوقيت نفسه ما لم يُحدد غير ذلك
+    defaults.setdefault('date_recorded', datetime.utcnow())
+    
+    results = [None] * len(records)
+    valid = []
+    seen = set()
+    for index, record in enumerate(records):
+        try:
+            row = _normalize(record, defaults)
+        except InvalidRecord as e:
+            results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+            continue
+        # إدخال المتدرب نفسه مرتين في القائمة خطأ في الإدخال وليس مخالفتين
+        key = (row['trainee_id'], row['behavior_type'], row['date_recorded'])
+        if key in seen:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Duplicate record in batch'}
+            continue
+        seen.add(key)
+        valid.append((index, row))
+    
+    if valid:
+        try:
+            record_ids = _insert([row for _, row in valid])
+            for (index, _), record_id in zip(valid, record_ids):
+                results[index] = {'index': index, 'status': 'created', 'record_id': record_id}
+            _insert_audit(audit, results)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # فشل الدفعة كاملة: إعادة المحاولة لكل سجل على حدة لتحديد السجلات الفاشلة
+            for index, row in valid:
+                try:
+                    with db.session.begin_nested():
+                        record_id = _insert([row])[0]
+                    results[index] = {'index': index, 'status': 'created', 'record_id': record_id}
+                except Exception as e:
+                    results[index] = {'index': index, 'status': 'failed', 'error': f'Failed to save record: {e}'}
+            _insert_audit(audit, results)
+            db.session.commit()
+    
+    return results
+
+def _insert_audit(audit, results):
+    """سجل مراجعة واحد للدفعة ضمن معاملة السجلات، فلا يُحفظ أحدهما دون الآخر"""
+    if audit is None:
+        return
+    created = [result['record_id'] for result in results if result and result['status'] == 'created']
+    if not created:
+        return
+    
+    db.session.execute(audit_logs.insert().values(
+        user_id=audit.get('user_id'),
+        action='BEHAVIOR_RECORDS_BATCH_ADDED',
+        resource='behavior_record',
+        resource_id=str(created[0]),
+        details=f'Added {len(created)} behavior records ({len(results) - len(created)} failed), '
+                f'ids: {", ".join(str(record_id) for record_id in created)}',
+        ip_address=audit.get('ip_address'),
+        user_agent=audit.get('user_agent'),
+        timestamp=datetime.utcnow()
+    ))
@@ -0,0 +1,185 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from src.models.initiatives import db, BehaviorRecord, BehaviorType, TraineeScorecard, TraineeScorecardCount
+from src.services.sql import dialect_insert
+
+SCORECARD_FIELDS = (
+    'net_points', 'points_awarded', 'points_deducted', 'positive_count',
+    'negative_count', 'unresolved_count', 'open_follow_ups'
+)
+
+# الحقول التي تؤثر في بطاقة السلوك
+RECORD_FIELDS = (
+    'trainee_id', 'behavior_type', 'category', 'severity_level', 'points_awarded',
+    'points_deducted', 'is_resolved', 'follow_up_required'
+)
+
+def _enum_value(value):
+    return value.value if hasattr(value, 'value') else value
+
+def contribution(record):
+    """مساهمة سجل سلوك واحد في بطاقة المتدرب: (حقول البطاقة، عدد الحوادث حسب الفئة والشدة)"""
+    awarded = record['points_awarded'] or 0
+    deducted = record['points_deducted'] or 0
+    behavior_type = _enum_value(record['behavior_type'])
+    resolved = bool(record['is_resolved'])
+    fields = {
+        'net_points': awarded - deducted,
+        'points_awarded': awarded,
+        'points_deducted': deducted,
+        'positive_count': int(behavior_type == BehaviorType.POSITIVE.value),
+        'negative_count': int(behavior_type == BehaviorType.NEGATIVE.value),
+        'unresolved_count': int(not resolved),
+        'open_follow_ups': int(bool(record['follow_up_required']) and not resolved)
+    }
+    counts = {
+        ('category', str(_enum_value(record['category']))): 1,
+        ('severity', str(record['severity_level'] or 1)): 1
+    }
+    return fields, counts
+
+def scorecard_deltas(records, sign=1, deltas=None):
+    """جمع مساهمات السجلات في {trainee_id: (حقول، أعداد)}؛ sign = -1 لطرح المساهمة"""
+    deltas = {} if deltas is None else deltas
+    for record in records:
+        fields, counts = contribution(record)
+        trainee_fields, trainee_counts = deltas.setdefault(record['trainee_id'], ({}, {}))
+        for name, value in fields.items():
+            trainee_fields[name] = trainee_fields.get(name, 0) + sign * value
+        for key, value in counts.items():
+            trainee_counts[key] = trainee_counts.get(key, 0) + sign * value
+    return deltas
+
+def apply_scorecard_deltas(connection, deltas):
+    """إضافة الفروقات إلى بطاقات المتدربين بعبارات upsert ضمن المعاملة الحالية"""
+    if not deltas:
+        return
+    
+    insert = dialect_insert(connection.dialect.name)
+    now = datetime.utcnow()
+    
+    table = TraineeScorecard.__table__
+    statement = insert(table)
+    values = {name: table.c[name] + statement.excluded[name] for name in SCORECARD_FIELDS}
+    values['updated_at'] = statement.excluded.updated_at
+    connection.execute(
+        statement.on_conflict_do_update(index_elements=['trainee_id'], set_=values),
+        [
+            dict({name: fields.get(name, 0) for name in SCORECARD_FIELDS}, trainee_id=trainee_id, updated_at=now)
+            for trainee_id, (fields, _) in sorted(deltas.items())
+        ]
+    )
+    
+    rows = [
+        {'trainee_id': trainee_id, 'dimension': dimension, 'value': value, 'count': count}
+        for trainee_id, (_, counts) in sorted(deltas.items())
+        for (dimension, value), count in sorted(counts.items()) if count
+    ]
+    if rows:
+        table = TraineeScorecardCount.__table__
+        statement = insert(table)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=['trainee_id', 'dimension', 'value'],
+                set_={'count': table.c.count + statement.excluded.count}
+            ),
+            rows
+        )
+
+# التحديث التدريجي للبطاقات عند إدراج السجلات وتعديلها وحذفها
+
+def _keep_history(target, value, oldvalue, initiator):
+    return value
+
+# تحميل القيمة القديمة عند التعديل حتى لو انتهت صلاحية السجل بعد commit، ليمكن طرح مساهمتها
+for _name in RECORD_FIELDS:
+    event.listen(getattr(BehaviorRecord, _name), 'set', _keep_history, active_history=True, retval=True)
+
+def _current(target):
+    return {name: getattr(target, name) for name in RECORD_FIELDS}
+
+def _previous(target):
+    state = db.inspect(target)
+    previous = {}
+    for name in RECORD_FIELDS:
+        history = state.attrs[name].history
+        previous[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    return previous
+
+@event.listens_for(BehaviorRecord, 'after_insert')
+def _record_inserted(mapper, connection, target):
+    apply_scorecard_deltas(connection, scorecard_deltas([_current(target)]))
+
+@event.listens_for(BehaviorRecord, 'after_delete')
+def _record_deleted(mapper, connection, target):
+    apply_scorecard_deltas(connection, scorecard_deltas([_previous(target)], sign=-1))
+
+@event.listens_for(BehaviorRecord, 'after_update')
+def _record_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in RECORD_FIELDS):
+        return
+    
+    deltas = scorecard_deltas([_previous(target)], sign=-1)
+    apply_scorecard_deltas(connection, scorecard_deltas([_current(target)], deltas=deltas))
+
+def _counts_for(trainee_ids):
+    counts = {}
+    rows = TraineeScorecardCount.query.filter(
+        TraineeScorecardCount.trainee_id.in_(trainee_ids),
+        TraineeScorecardCount.count != 0
+    ).order_by(TraineeScorecardCount.trainee_id, TraineeScorecardCount.dimension, TraineeScorecardCount.value)
+    for row in rows:
+        counts.setdefault(row.trainee_id, {}).setdefault(row.dimension, {})[row.value] = row.count
+    return counts
+
+def get_scorecards(trainee_ids):
+    """بطاقات مجموعة من المتدربين باستعلامين؛ المتدرب بلا سجلات يحصل على بطاقة فارغة"""
+    trainee_ids = list(dict.fromkeys(trainee_ids))
+    if not trainee_ids:
+        return []
+    
+    scorecards = {
+        scorecard.trainee_id: scorecard
+        for scorecard in TraineeScorecard.query.filter(TraineeScorecard.trainee_id.in_(trainee_ids))
+    }
+    counts = _counts_for(list(scorecards))
+    return [
+        scorecards[trainee_id].to_dict(counts.get(trainee_id))
+        if trainee_id in scorecards else
+        TraineeScorecard(trainee_id=trainee_id, **{name: 0 for name in SCORECARD_FIELDS}).to_dict()
+        for trainee_id in trainee_ids
+    ]
+
+def get_at_risk_trainees(limit=20, max_net_points=0, min_open_follow_ups=0):
+    """المتدربون الأقل نقاطاً ثم الأكثر متابعات مفتوحة، من فهرس البطاقات"""
+    query = TraineeScorecard.query.filter(TraineeScorecard.net_points <= max_net_points)
+    if min_open_follow_ups:
+        query = query.filter(TraineeScorecard.open_follow_ups >= min_open_follow_ups)
+    
+    scorecards = query.order_by(
+        TraineeScorecard.net_points.asc(),
+        TraineeScorecard.open_follow_ups.desc(),
+        TraineeScorecard.trainee_id.asc()
+    ).limit(limit).all()
+    
+    counts = _counts_for([scorecard.trainee_id for scorecard in scorecards])
+    return [scorecard.to_dict(counts.get(scorecard.trainee_id)) for scorecard in scorecards]
+
+def rebuild_scorecards(batch_size=5000):
+    """إعادة بناء جميع البطاقات من سجلات السلوك"""
+    connection = db.session.connection()
+    connection.execute(TraineeScorecardCount.__table__.delete())
+    connection.execute(TraineeScorecard.__table__.delete())
+    
+    columns = [getattr(BehaviorRecord, name) for name in RECORD_FIELDS]
+    rows = db.session.execute(db.select(*columns).execution_options(yield_per=batch_size))
+    total = 0
+    for partition in rows.partitions():
+        apply_scorecard_deltas(connection, scorecard_deltas(dict(zip(RECORD_FIELDS, row)) for row in partition))
+        total += len(partition)
+    
+    db.session.commit()
+    return total
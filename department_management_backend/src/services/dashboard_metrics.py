@@ -0,0 +1,215 @@
+from datetime import datetime
+from threading import Lock
+import time
+
+from flask import current_app
+
+from src.models.quality import db, DashboardRollup, KPI, RayatGrade
+from src.models.auth import User, UserRole
+from src.services.kpi_latest import get_latest_kpi_values
+from src.services.sql import dialect_insert
+
+# رمز مؤشر نسبة التخرج في الوقت المحدد (من المؤشرات الافتراضية)
+GRADUATION_KPI_CODE = 'KPI005'
+
+def upsert_rollup(connection, metric, dimension='', period='', count=1, total=0.0, replace=False):
+    """زيادة (أو استبدال) عدد ومجموع تجميعة واحدة بعبارة upsert واحدة"""
+    table = DashboardRollup.__table__
+    insert = dialect_insert(connection.dialect.name)
+    
+    statement = insert(table).values(
+        metric=metric,
+        dimension=str(dimension),
+        period=period,
+        count=count,
+        total=total,
+        updated_at=datetime.utcnow()
+    )
+    if replace:
+        values = {'count': statement.excluded.count, 'total': statement.excluded.total}
+    else:
+        values = {'count': table.c.count + statement.excluded.count, 'total': table.c.total + statement.excluded.total}
+    values['updated_at'] = statement.excluded.updated_at
+    
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['metric', 'dimension', 'period'],
+        set_=values
+    ))
+
+# تجميعات المخالفات (behavior_incidents) وتقييمات الاستبيانات (survey_rating) تُحدَّث في activity_rollups
+# ضمن معاملات إدراج سجلات السلوك والاستجابات التي تكتبها مسارات /behavior_records و /surveys
+
+def refresh_grade_rollups(import_id):
+    """إعادة حساب تجميعات الدرجات للمقررات والفصول المتأثرة بعملية استيراد"""
+    pass_mark = current_app.config.get('DASHBOARD_PASS_MARK', 60)
+    
+    affected = db.session.query(RayatGrade.course_code, RayatGrade.semester)\
+        .filter(RayatGrade.import_id == import_id)\
+        .distinct()\
+        .subquery()
+    
+    rows = db.session.query(
+        RayatGrade.course_code,
+        RayatGrade.semester,
+        db.func.count(RayatGrade.id),
+        db.func.sum(db.case((RayatGrade.grade >= pass_mark, 1), else_=0))
+    ).join(
+        affected,
+        db.and_(RayatGrade.course_code == affected.c.course_code, RayatGrade.semester == affected.c.semester)
+    ).group_by(RayatGrade.course_code, RayatGrade.semester).all()
+    
+    connection = db.session.connection()
+    for course_code, semester, count, passed in rows:
+        upsert_rollup(connection, 'course_grades', course_code, semester,
+                      count=count, total=float(passed or 0), replace=True)
+    db.session.commit()
+
+# القراءة من التجميعات مع تخزين مؤقت محدود التقادم
+
+_cache = {}
+_cache_lock = Lock()
+
+def _cached(name, compute):
+    ttl = current_app.config.get('DASHBOARD_CACHE_TTL', 60)
+    now = time.monotonic()
+    
+    with _cache_lock:
+        entry = _cache.get(name)
+    if entry and entry[0] > now:
+        return entry[1]
+    
+    value = compute()
+    with _cache_lock:
+        _cache[name] = (now + ttl, value)
+    return value
+
+def invalidate_dashboard_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _critical_courses():
+    return current_app.config.get('DASHBOARD_CRITICAL_COURSES', [])
+
+def _latest_semester():
+    return db.session.query(db.func.max(DashboardRollup.period))\
+        .filter(DashboardRollup.metric == 'course_grades')\
+        .scalar()
+
+def _course_grade_rollups(semester, courses=None):
+    query = DashboardRollup.query.filter(
+        DashboardRollup.metric == 'course_grades',
+        DashboardRollup.period == semester
+    )
+    if courses:
+        query = query.filter(DashboardRollup.dimension.in_(courses))
+    return query.all()
+
+def _satisfaction_by_audience():
+    """متوسط التقييم لكل فئة مستجيبين من تجميعاتها (صف واحد لكل فئة)"""
+    rollups = DashboardRollup.query.filter(DashboardRollup.metric == 'survey_rating').all()
+    return {rollup.dimension: rollup.total / rollup.count for rollup in rollups if rollup.count}
+
+def _format_rate(value):
+    return f'{value:.0f}%' if value is not None else None
+
+def _format_rating(value):
+    return f'{value:.1f}/5' if value is not None else None
+
+def compute_dashboard_kpis():
+    """مؤشرات لوحة التحكم من التجميعات"""
+    graduation_rate = None
+    graduation_kpi = KPI.query.filter_by(code=GRADUATION_KPI_CODE).first()
+    if graduation_kpi:
+        latest = get_latest_kpi_values([graduation_kpi.id]).get(graduation_kpi.id)
+        graduation_rate = latest.value if latest else None
+    
+    success_rate = None
+    semester = _latest_semester()
+    if semester:
+        rollups = _course_grade_rollups(semester, _critical_courses())
+        count = sum(rollup.count for rollup in rollups)
+        if count:
+            success_rate = sum(rollup.total for rollup in rollups) * 100.0 / count
+    
+    satisfaction = _satisfaction_by_audience()
+    
+    # كل سجل سلوك مخالفة؛ المجموع الشهري عبر جميع أنواع السلوك
+    incidents = db.session.query(DashboardRollup.period, db.func.sum(DashboardRollup.count))\
+        .filter(DashboardRollup.metric == 'behavior_incidents')\
+        .group_by(DashboardRollup.period)\
+        .order_by(DashboardRollup.period.desc())\
+        .limit(12)\
+        .all()
+    incidents_by_month = {period: count for period, count in reversed(incidents)}
+    current_month = datetime.utcnow().strftime('%Y-%m')
+    
+    return {
+        'graduation_rate': _format_rate(graduation_rate),
+        'success_rate_critical_courses': _format_rate(success_rate),
+        'trainer_satisfaction': _format_rating(satisfaction.get('trainers')),
+        'trainee_satisfaction': _format_rating(satisfaction.get('trainees')),
+        'behavior_incidents_per_month': incidents_by_month.get(current_month, 0),
+        'behavior_incidents_by_month': incidents_by_month
+    }
+
+def compute_dashboard_statistics():
+    """إحصائيات عامة من الجداول الفعلية"""
+    semester = _latest_semester()
+    
+    total_trainees = 0
+    critical_courses_enrollment = {}
+    if semester:
+        total_trainees = db.session.query(db.func.count(db.distinct(RayatGrade.trainee_id)))\
+            .filter(RayatGrade.semester == semester)\
+            .scalar()
+        critical_courses_enrollment = {
+            rollup.dimension: rollup.count
+            for rollup in _course_grade_rollups(semester, _critical_courses())
+        }
+    
+    total_trainers = db.session.query(db.func.count(db.distinct(UserRole.user_id)))\
+        .filter(UserRole.role == 'trainer', UserRole.is_active == True)\
+        .scalar()
+    
+    # المتدربون هم المستخدمون الذين ليس لديهم أي دور وظيفي
+    has_role = db.session.query(UserRole.id).filter(UserRole.user_id == User.id).exists()
+    trainees_by_specialization = dict(
+        db.session.query(User.specialization, db.func.count(User.id))
+        .filter(User.is_active == True, User.specialization.isnot(None), ~has_role)
+        .group_by(User.specialization)
+        .all()
+    )
+    
+    return {
+        'total_trainees': total_trainees,
+        'total_trainers': total_trainers,
+        'trainees_by_specialization': trainees_by_specialization,
+        'critical_courses_enrollment': critical_courses_enrollment,
+        'semester': semester
+    }
+
+def get_dashboard_kpis():
+    return _cached('kpis', compute_dashboard_kpis)
+
+def get_dashboard_statistics():
+    return _cached('statistics', compute_dashboard_statistics)
+
+def rebuild_dashboard_rollups():
+    """إعادة بناء جميع التجميعات من الجداول الأصلية"""
+    from department_management_backend.src.services.activity_rollups import rebuild_activity_rollups
+    
+    # تجميعات المخالفات والتقييمات تُبنى عبر جلسة الجداول التي تلخصها وتُثبَّت قبل بدء معاملة الدرجات
+    rebuild_activity_rollups()
+    
+    connection = db.session.connection()
+    connection.execute(DashboardRollup.__table__.delete().where(DashboardRollup.metric == 'course_grades'))
+    
+    pass_mark = current_app.config.get('DASHBOARD_PASS_MARK', 60)
+    for course_code, semester, count, passed in db.session.query(
+            RayatGrade.course_code, RayatGrade.semester, db.func.count(RayatGrade.id),
+            db.func.sum(db.case((RayatGrade.grade >= pass_mark, 1), else_=0))
+    ).group_by(RayatGrade.course_code, RayatGrade.semester):
+        upsert_rollup(connection, 'course_grades', course_code, semester, count=count, total=float(passed or 0))
+    
+    db.session.commit()
+    invalidate_dashboard_cache()
@@ -0,0 +1,168 @@
+from datetime import date, datetime
+from enum import Enum
+import csv
+import io
+import os
+import tempfile
+
+from sqlalchemy import select
+
+from department_management_backend.src.database import db as legacy_db
+from department_management_backend.src.models.behavior_records import BehaviorRecord
+from department_management_backend.src.models.surveys import SurveyResponse
+from src.models.auth import db as auth_db, AuditLog, Permission
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# الأعمدة المصدرة لكل نوع بيانات، وعمود التاريخ لتصفية الفترة، وأعمدة التصفية المسموحة، والصلاحية المطلوبة لقراءته،
+# ونسخة SQLAlchemy التي تملك نماذجه (لكل وحدة نماذج نسختها وجلستها).
+# سجلات السلوك والاستبيانات تُقرأ من الجداول التي تكتبها مسارات /behavior_records و /surveys الحالية
+EXPORT_DATASETS = {
+    'behavior_records': {
+        'columns': (
+            BehaviorRecord.id, BehaviorRecord.trainee_id, BehaviorRecord.behavior_type, BehaviorRecord.description,
+            BehaviorRecord.date_recorded, BehaviorRecord.recorded_by_trainer_id
+        ),
+        'date_column': BehaviorRecord.date_recorded,
+        'filters': {'trainee_id': int, 'recorded_by_trainer_id': int},
+        'permission': Permission.VIEW_TRAINEE_BEHAVIOR,
+        'db': legacy_db
+    },
+    'survey_responses': {
+        'columns': (
+            SurveyResponse.id, SurveyResponse.survey_id, SurveyResponse.trainee_id, SurveyResponse.trainer_id,
+            SurveyResponse.submitted_at
+        ),
+        'date_column': SurveyResponse.submitted_at,
+        'filters': {'survey_id': int},
+        'permission': Permission.VIEW_SURVEYS,
+        'db': legacy_db
+    },
+    'audit_logs': {
+        'columns': (
+            AuditLog.id, AuditLog.timestamp, AuditLog.user_id, AuditLog.action, AuditLog.resource,
+            AuditLog.resource_id, AuditLog.details, AuditLog.ip_address
+        ),
+        'date_column': AuditLog.timestamp,
+        'filters': {'user_id': int, 'action': str},
+        'permission': Permission.MANAGE_USERS,
+        'db': auth_db
+    }
+}
+
+def export_statement(dataset, date_from=None, date_to=None, **filters):
+    """استعلام التصدير مرتباً بالمعرف، مع تصفية الفترة وأعمدة المساواة (مثل survey_id)"""
+    spec = EXPORT_DATASETS[dataset]
+    statement = select(*spec['columns'])
+    if date_from:
+        statement = statement.where(spec['date_column'] >= date_from)
+    if date_to:
+        statement = statement.where(spec['date_column'] <= date_to)
+    for name, value in filters.items():
+        if value is not None:
+            statement = statement.where(spec['columns'][0].table.c[name] == value)
+    return statement.order_by(spec['columns'][0])
+
+def export_headers(dataset):
+    return [column.key for column in EXPORT_DATASETS[dataset]['columns']]
+
+def iter_rows(dataset, statement, batch_size=2000):
+    """قراءة الصفوف بمؤشر من جانب الخادم دون تحميل النتيجة كاملة في الذاكرة، بجلسة النسخة المالكة للنماذج"""
+    session = EXPORT_DATASETS[dataset]['db'].session
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for row in partition:
+            yield row
+
+# بدايات النص التي يفسرها Excel كصيغة عند فتح الملف
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def spreadsheet_text(value):
+    """تعطيل تنفيذ النصوص المدخلة من المستخدمين كصيغ عند فتح CSV في Excel بإضافة ' في بدايتها"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def xlsx_cell(sheet, value):
+    """خلية XLSX نصية بنمط quotePrefix للنصوص التي تبدو كصيغ، دون تغيير قيمتها المعروضة"""
+    if not (isinstance(value, str) and value.startswith(FORMULA_PREFIXES)):
+        return value
+    from openpyxl.cell import WriteOnlyCell
+    
+    cell = WriteOnlyCell(sheet, value=value)
+    cell.data_type = 's'
+    cell.quotePrefix = True
+    return cell
+
+def _value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def stream_csv(headers, rows, chunk_rows=1000):
+    """كتابة CSV على دفعات وإرجاع كل دفعة فور جاهزيتها"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # علامة BOM ليعرض Excel النص العربي بشكل صحيح
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    
+    count = 0
+    for row in rows:
+        writer.writerow(['' if value is None else spreadsheet_text(_value(value)) for value in row])
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue().encode('utf-8')
+
+def write_xlsx(headers, rows, title='export'):
+    """كتابة ملف XLSX بوضع write_only (ذاكرة ثابتة) في ملف مؤقت وإرجاع مساره"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(headers)
+    for row in rows:
+        sheet.append([xlsx_cell(sheet, _value(value)) for value in row])
+    
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def stream_file(path, chunk_size=64 * 1024, remove=True):
+    """إرسال ملف على أجزاء ثم حذفه"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove and os.path.exists(path):
+            os.remove(path)
+
+def stream_export(dataset, fmt='csv', batch_size=2000, **filters):
+    """مولد بايتات ملف التصدير بالصيغة المطلوبة"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'صيغة التصدير غير مدعومة: {fmt}')
+    
+    headers = export_headers(dataset)
+    rows = iter_rows(dataset, export_statement(dataset, **filters), batch_size)
+    if fmt == 'csv':
+        return stream_csv(headers, rows)
+    
+    def generate():
+        # XLSX ملف مضغوط لا يكتمل إلا في النهاية: يُكتب أولاً ثم يُرسل على أجزاء
+        yield from stream_file(write_xlsx(headers, rows, dataset))
+    return generate()
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, case, select
+
+from src.models.initiatives import db, BehaviorRecord, FollowUpReminder
+from src.services.sql import dialect_insert
+
+FOLLOW_UP_SCOPES = ('due', 'overdue', 'today', 'upcoming')
+
+def open_follow_ups():
+    """المتابعات المفتوحة؛ الشروط تطابق شرط الفهرس الجزئي ix_behavior_records_open_follow_ups"""
+    return BehaviorRecord.query.filter(
+        BehaviorRecord.follow_up_required == True,
+        BehaviorRecord.is_resolved == False,
+        BehaviorRecord.follow_up_date.isnot(None)
+    )
+
+def due_follow_ups(scope='due', today=None, days=7):
+    """المتابعات المستحقة: due (اليوم والمتأخرة)، overdue، today، upcoming (خلال days يوماً)"""
+    if scope not in FOLLOW_UP_SCOPES:
+        raise ValueError(f'نطاق غير مدعوم: {scope}')
+    today = today or date.today()
+    
+    query = open_follow_ups()
+    if scope == 'due':
+        return query.filter(BehaviorRecord.follow_up_date <= today)
+    if scope == 'overdue':
+        return query.filter(BehaviorRecord.follow_up_date < today)
+    if scope == 'today':
+        return query.filter(BehaviorRecord.follow_up_date == today)
+    return query.filter(
+        BehaviorRecord.follow_up_date > today,
+        BehaviorRecord.follow_up_date <= today + timedelta(days=days)
+    )
+
+def follow_up_summary(today=None, days=7):
+    """عدد المتابعات المتأخرة والمستحقة اليوم والقادمة باستعلام واحد على الفهرس الجزئي"""
+    today = today or date.today()
+    follow_up_date = BehaviorRecord.follow_up_date
+    overdue, due_today, upcoming = db.session.query(
+        func.sum(case((follow_up_date < today, 1), else_=0)),
+        func.sum(case((follow_up_date == today, 1), else_=0)),
+        func.sum(case((follow_up_date > today, 1), else_=0))
+    ).filter(
+        BehaviorRecord.follow_up_required == True,
+        BehaviorRecord.is_resolved == False,
+        follow_up_date <= today + timedelta(days=days)
+    ).one()
+    return {
+        'overdue': overdue or 0,
+        'due_today': due_today or 0,
+        'upcoming': upcoming or 0,
+        'upcoming_days': days
+    }
+
+def send_follow_up_reminders(batch_size=500, today=None):
+    """إنشاء تذكيرات المتابعات المستحقة على دفعات، مرة واحدة لكل سجل في اليوم"""
+    today = today or date.today()
+    reminded = select(FollowUpReminder.record_id).where(FollowUpReminder.reminded_on == today)
+    table = FollowUpReminder.__table__
+    
+    total = 0
+    while True:
+        rows = db.session.query(
+            BehaviorRecord.id, BehaviorRecord.trainee_id, BehaviorRecord.reported_by, BehaviorRecord.follow_up_date
+        ).filter(
+            BehaviorRecord.follow_up_required == True,
+            BehaviorRecord.is_resolved == False,
+            BehaviorRecord.follow_up_date <= today,
+            BehaviorRecord.id.notin_(reminded)
+        ).order_by(BehaviorRecord.follow_up_date, BehaviorRecord.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        # تجاهل التعارض: عامل آخر ربما أرسل التذكير نفسه في اللحظة ذاتها
+        connection = db.session.connection()
+        statement = dialect_insert(connection.dialect.name)(table).on_conflict_do_nothing(
+            index_elements=['record_id', 'reminded_on']
+        )
+        now = datetime.utcnow()
+        connection.execute(statement, [
+            {
+                'record_id': record_id,
+                'trainee_id': trainee_id,
+                'recipient_id': reported_by,
+                'follow_up_date': follow_up_date,
+                'reminded_on': today,
+                'status': 'overdue' if follow_up_date < today else 'due',
+                'created_at': now
+            }
+            for record_id, trainee_id, reported_by, follow_up_date in rows
+        ])
+        db.session.commit()
+        total += len(rows)
+        
+        if len(rows) < batch_size:
+            break
+    
+    return total
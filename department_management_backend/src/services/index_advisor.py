@@ -0,0 +1,99 @@
+from datetime import date
+import json
+
+from src.models.quality import db, QualityStandard, QualityMeasurement, KPIValue, RayatImport, GeneratedReport
+from src.models.auth import AuditLog
+from src.models.initiatives import BehaviorRecord, SurveyAnswer, SurveyResponse
+
+def endpoint_queries():
+    """الاستعلامات الممثلة لمسارات API الرئيسية"""
+    sample_date = date(2024, 1, 1)
+    return {
+        'kpi_values_history': db.select(KPIValue)
+            .where(KPIValue.kpi_id == 1)
+            .order_by(KPIValue.measurement_date.desc())
+            .limit(50),
+        'kpi_value_duplicate_check': db.select(KPIValue)
+            .where(KPIValue.kpi_id == 1, KPIValue.measurement_date == sample_date),
+        'quality_measurements_by_indicator': db.select(QualityMeasurement)
+            .where(QualityMeasurement.indicator_id == 1, QualityMeasurement.measurement_date >= sample_date),
+        'quality_measurements_recent': db.select(QualityMeasurement)
+            .order_by(QualityMeasurement.created_at.desc())
+            .limit(5),
+        'quality_standards_by_category': db.select(QualityStandard)
+            .where(QualityStandard.category == 'x'),
+        'rayat_imports_recent': db.select(RayatImport)
+            .order_by(RayatImport.imported_at.desc())
+            .limit(10),
+        'generated_reports_by_user': db.select(GeneratedReport)
+            .where(GeneratedReport.generated_by == 1)
+            .order_by(GeneratedReport.generated_at.desc())
+            .limit(10),
+        'behavior_records_by_trainee': db.select(BehaviorRecord)
+            .where(BehaviorRecord.trainee_id == 1)
+            .order_by(BehaviorRecord.incident_date.desc()),
+        'behavior_follow_ups_due': db.select(BehaviorRecord)
+            .where(
+                BehaviorRecord.follow_up_required == True,
+                BehaviorRecord.is_resolved == False,
+                BehaviorRecord.follow_up_date <= sample_date
+            )
+            .order_by(BehaviorRecord.follow_up_date, BehaviorRecord.id),
+        'survey_answers_by_question': db.select(SurveyAnswer)
+            .where(SurveyAnswer.question_id == 1),
+        'survey_responses_by_survey': db.select(SurveyResponse)
+            .where(SurveyResponse.survey_id == 1),
+        'audit_logs_recent': db.select(AuditLog)
+            .order_by(AuditLog.timestamp.desc())
+            .limit(50),
+        'audit_logs_by_user_action': db.select(AuditLog)
+            .where(AuditLog.user_id == 1, AuditLog.action == 'LOGIN_FAILED'),
+    }
+
+def _explain_sqlite(sql):
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    plan = [row[-1] for row in rows]
+    # "SCAN table" بدون فهرس يعني مسحاً كاملاً للجدول
+    full_scans = [
+        detail for detail in plan
+        if detail.startswith('SCAN ') and 'USING' not in detail
+    ]
+    return plan, full_scans
+
+def _collect_seq_scans(node, found):
+    if node.get('Node Type') == 'Seq Scan':
+        found.append(f"Seq Scan on {node.get('Relation Name')}")
+    for child in node.get('Plans', []):
+        _collect_seq_scans(child, found)
+
+def _explain_postgresql(sql):
+    result = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    root = result[0]['Plan']
+    full_scans = []
+    _collect_seq_scans(root, full_scans)
+    return [json.dumps(root, ensure_ascii=False)], full_scans
+
+def analyze_endpoint_queries():
+    """تحليل خطط التنفيذ والإبلاغ عن المسح الكامل للجداول"""
+    dialect = db.engine.dialect
+    if dialect.name == 'sqlite':
+        explain = _explain_sqlite
+    elif dialect.name == 'postgresql':
+        explain = _explain_postgresql
+    else:
+        raise ValueError(f'قاعدة البيانات غير مدعومة: {dialect.name}')
+    
+    report = []
+    for name, statement in endpoint_queries().items():
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        plan, full_scans = explain(sql)
+        report.append({
+            'query': name,
+            'sql': sql,
+            'plan': plan,
+            'full_scans': full_scans
+        })
+    
+    return report
@@ -0,0 +1,352 @@
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+import json
+import os
+import socket
+import traceback
+import uuid
+
+from flask import current_app
+
+from src.models.quality import db, BackgroundJob, GeneratedReport, RayatImport
+from src.services.sql import dialect_insert
+
+# معالجات المهام حسب النوع
+JOB_HANDLERS = {}
+
+# دوال عرض التقارير حسب صيغة الإخراج (pdf, excel, ...)
+REPORT_RENDERERS = {}
+
+# المهام الدورية: نوع المهمة -> (مفتاح إعداد فترة التكرار بالثواني، القيمة الافتراضية)
+PERIODIC_JOBS = {}
+
+def job_handler(job_type, on_failure=None):
+    """تسجيل معالج لنوع مهمة، مع دالة اختيارية تُستدعى عند الفشل النهائي"""
+    def decorator(f):
+        JOB_HANDLERS[job_type] = (f, on_failure)
+        return f
+    return decorator
+
+def periodic_job(job_type, interval_key, default_interval, on_failure=None):
+    """تسجيل معالج لمهمة دورية بلا مدخلات تُجدول تلقائياً أثناء الاستعادة"""
+    def decorator(f):
+        PERIODIC_JOBS[job_type] = (interval_key, default_interval)
+        return job_handler(job_type, on_failure)(f)
+    return decorator
+
+def enqueue_job(job_type, payload, max_attempts=None, timeout_seconds=None, delay=0):
+    """إضافة مهمة إلى الطابور ضمن جلسة الطلب الحالية (تُحفظ مع commit المستدعي)"""
+    job = BackgroundJob(
+        job_type=job_type,
+        max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+        timeout_seconds=timeout_seconds or current_app.config.get('JOB_TIMEOUT', 600),
+        run_after=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    job.set_payload(payload)
+    db.session.add(job)
+    return job
+
+def _enqueue_once(job_type, payload, delay=0):
+    """إضافة مهمة بإدراج شرطي على unique_key: لا تُنشئ عمليتان مهمة نشطة مكررة عند الاستعادة المتزامنة"""
+    payload = json.dumps(payload, ensure_ascii=False)
+    now = datetime.utcnow()
+    statement = dialect_insert(db.session.get_bind().dialect.name)(BackgroundJob.__table__).values(
+        job_type=job_type,
+        payload=payload,
+        status='queued',
+        attempts=0,
+        max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+        timeout_seconds=current_app.config.get('JOB_TIMEOUT', 600),
+        run_after=now + timedelta(seconds=delay),
+        created_at=now,
+        unique_key=f'{job_type}:{payload}'
+    ).on_conflict_do_nothing(index_elements=['unique_key'])
+    return db.session.execute(statement).rowcount == 1
+
+class JobRunner:
+    """منفذ مهام الخلفية: مجموعة عمال تسحب المهام من جدول background_jobs دون وسيط خارجي"""
+    
+    def __init__(self, concurrency=2, poll_interval=2.0, retry_backoff=30, heartbeat_interval=30):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._app = None
+        self._threads = []
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._lock = Lock()
+        self._last_recovery = None
+    
+    def start(self, app):
+        """تشغيل العمال في خيوط داخل العملية الحالية (مرة واحدة)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._configure(app)
+            with app.app_context():
+                self.recover()
+            self._stopping.clear()
+            for index in range(self.concurrency):
+                thread = Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    @property
+    def running(self):
+        return bool(self._threads)
+    
+    def _configure(self, app):
+        self._app = app
+        self.concurrency = app.config.get('JOB_RUNNER_CONCURRENCY', self.concurrency)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.retry_backoff = app.config.get('JOB_RETRY_BACKOFF', self.retry_backoff)
+        self.heartbeat_interval = app.config.get('JOB_HEARTBEAT_INTERVAL', self.heartbeat_interval)
+    
+    def notify(self):
+        """إيقاظ العمال فور إضافة مهمة جديدة"""
+        self._wakeup.set()
+    
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def run_forever(self, app):
+        """تشغيل العمال في عملية مستقلة حتى الإيقاف (سطر الأوامر)"""
+        self.start(app)
+        try:
+            while not self._stopping.is_set():
+                self._stopping.wait(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self._app.app_context():
+                    self._maybe_recover()
+                    job = self._claim()
+                    if job is not None:
+                        self._execute(job)
+                        continue
+            except Exception as e:
+                print(f"خطأ في منفذ المهام: {e}")
+            
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+    
+    def _heartbeat(self):
+        """تحديث locked_at لمهام هذا العامل الجارية حتى لا تعدها الاستعادة متوقفة مهما طال تنفيذها"""
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                with self._app.app_context():
+                    BackgroundJob.query.filter_by(status='running', locked_by=self.worker_id).update(
+                        {'locked_at': datetime.utcnow()}, synchronize_session=False
+                    )
+                    db.session.commit()
+            except Exception as e:
+                print(f"خطأ في نبض منفذ المهام: {e}")
+    
+    def _finish(self, job_id, values):
+        """تحديث حالة المهمة فقط إن كانت لا تزال محجوزة لهذا العامل (لم تُستعد لعامل آخر)"""
+        return BackgroundJob.query.filter_by(id=job_id, status='running', locked_by=self.worker_id).update(
+            values, synchronize_session=False
+        ) == 1
+    
+    def _claim(self):
+        """حجز أقدم مهمة جاهزة بتحديث شرطي ذري (آمن مع عدة عمال وعدة عمليات)"""
+        now = datetime.utcnow()
+        candidate = db.session.query(BackgroundJob.id).filter(
+            BackgroundJob.status == 'queued',
+            BackgroundJob.run_after <= now
+        ).order_by(BackgroundJob.id).limit(1).scalar()
+        
+        if candidate is None:
+            return None
+        
+        claimed = BackgroundJob.query.filter_by(id=candidate, status='queued').update({
+            'status': 'running',
+            'locked_by': self.worker_id,
+            'locked_at': now,
+            'started_at': now,
+            'attempts': BackgroundJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        if claimed != 1:
+            return None
+        return BackgroundJob.query.get(candidate)
+    
+    def _execute(self, job):
+        handler, on_failure = JOB_HANDLERS.get(job.job_type, (None, None))
+        
+        try:
+            if handler is None:
+                raise ValueError(f'لا يوجد معالج لنوع المهمة: {job.job_type}')
+            handler(**job.get_payload())
+        except Exception as e:
+            db.session.rollback()
+            job = BackgroundJob.query.get(job.id)
+            values = {'last_error': f'{e}\n{traceback.format_exc(limit=5)}', 'locked_by': None}
+            
+            if job.attempts < job.max_attempts:
+                # إعادة المحاولة مع تأخير متزايد
+                values['status'] = 'queued'
+                values['run_after'] = datetime.utcnow() + timedelta(seconds=self.retry_backoff * 2 ** (job.attempts - 1))
+            else:
+                values['status'] = 'failed'
+                values['finished_at'] = datetime.utcnow()
+                values['unique_key'] = None
+            if self._finish(job.id, values) and values['status'] == 'failed' and on_failure:
+                on_failure(str(e), **job.get_payload())
+            db.session.commit()
+            return
+        
+        self._finish(job.id, {
+            'status': 'completed', 'locked_by': None, 'unique_key': None, 'finished_at': datetime.utcnow()
+        })
+        db.session.commit()
+    
+    def _maybe_recover(self):
+        if self._last_recovery and datetime.utcnow() - self._last_recovery < timedelta(seconds=60):
+            return
+        self.recover()
+    
+    def recover(self):
+        """استعادة المهام بعد انهيار العملية أو تجاوز المهلة"""
+        now = datetime.utcnow()
+        self._last_recovery = now
+        
+        # المهام الجارية التي تجاوزت مهلتها منذ بدء المحاولة (ولو كان عاملها حياً ينبض)،
+        # أو التي توقف نبضها لثلاث فترات (عامل متوقف أو منهار)
+        heartbeat_grace = timedelta(seconds=3 * self.heartbeat_interval)
+        for job in BackgroundJob.query.filter(BackgroundJob.status == 'running').all():
+            started_at = job.started_at or job.locked_at
+            if started_at and started_at + timedelta(seconds=job.timeout_seconds) <= now:
+                error = 'تجاوزت المهمة المهلة المحددة'
+            elif not job.locked_at or job.locked_at + heartbeat_grace <= now:
+                error = 'توقف العامل أثناء تنفيذ المهمة'
+            else:
+                continue
+            
+            values = {'locked_by': None, 'last_error': error}
+            if job.attempts < job.max_attempts:
+                values.update(status='queued', run_after=now)
+            else:
+                values.update(status='failed', finished_at=now, unique_key=None)
+            # تحديث شرطي على الحجز نفسه حتى لا تستعيد عمليتان المهمة ذاتها مرتين؛
+            # نتيجة العامل العالق تُهمل لاحقاً لأن _finish يشترط بقاء الحجز له
+            reclaimed = BackgroundJob.query.filter_by(
+                id=job.id, status='running', locked_by=job.locked_by, locked_at=job.locked_at
+            ).update(values, synchronize_session=False) == 1
+            if reclaimed and values['status'] == 'failed':
+                _, on_failure = JOB_HANDLERS.get(job.job_type, (None, None))
+                if on_failure:
+                    on_failure(error, **job.get_payload())
+        
+        # السجلات التي بقيت في حالة التنفيذ دون مهمة نشطة تعود إلى الطابور
+        active = {
+            (job.job_type, job.payload)
+            for job in BackgroundJob.query.filter(BackgroundJob.status.in_(['queued', 'running'])).all()
+        }
+        for report in GeneratedReport.query.filter(GeneratedReport.status.in_(['pending', 'generating'])).all():
+            payload = {'report_id': report.id}
+            if ('generate_report', json.dumps(payload, ensure_ascii=False)) not in active:
+                report.status = 'pending'
+                _enqueue_once('generate_report', payload)
+        for rayat_import in RayatImport.query.filter(RayatImport.status.in_(['pending', 'processing'])).all():
+            payload = {'import_id': rayat_import.id}
+            if ('process_rayat_import', json.dumps(payload, ensure_ascii=False)) not in active:
+                rayat_import.status = 'pending'
+                _enqueue_once('process_rayat_import', payload)
+        
+        # جدولة التشغيل التالي للمهام الدورية التي لا توجد لها مهمة منتظرة
+        for job_type, (interval_key, default_interval) in PERIODIC_JOBS.items():
+            interval = current_app.config.get(interval_key, default_interval)
+            if interval and (job_type, json.dumps({})) not in active:
+                _enqueue_once(job_type, {}, delay=interval)
+        
+        db.session.commit()
+
+job_runner = JobRunner()
+
+def start_job_runner(app, notify=True):
+    """تشغيل منفذ المهام داخل العملية إذا كان مفعلاً في الإعدادات"""
+    if app.config.get('JOB_RUNNER_IN_PROCESS', True) and not job_runner.running:
+        job_runner.start(app)
+    if notify:
+        job_runner.notify()
+
+def _fail_report(error, report_id):
+    report = GeneratedReport.query.get(report_id)
+    if report:
+        report.status = 'failed'
+        report.error_message = error
+        report.completed_at = datetime.utcnow()
+
+@job_handler('generate_report', on_failure=_fail_report)
+def run_generate_report(report_id):
+    """إنشاء ملف تقرير"""
+    # تسجيل صيغ الإخراج في REPORT_RENDERERS
+    import src.services.report_renderer
+    
+    report = GeneratedReport.query.get(report_id)
+    if not report:
+        return
+    
+    report.status = 'generating'
+    report.error_message = None
+    db.session.commit()
+    
+    renderer = REPORT_RENDERERS.get(report.template.output_format)
+    if renderer is None:
+        raise ValueError(f'صيغة الإخراج غير مدعومة: {report.template.output_format}')
+    
+    renderer(report)
+    report.status = 'completed'
+    report.completed_at = datetime.utcnow()
+    db.session.commit()
+
+def _fail_rayat_import(error, import_id):
+    rayat_import = RayatImport.query.get(import_id)
+    if rayat_import:
+        rayat_import.status = 'failed'
+        rayat_import.error_log = error
+        rayat_import.completed_at = datetime.utcnow()
+
+@job_handler('process_rayat_import', on_failure=_fail_rayat_import)
+def run_process_rayat_import(import_id):
+    """معالجة ملف رايات (أخطاء الملف نفسه تُسجل في RayatImport ولا تُعاد محاولتها)"""
+    from src.services.rayat_import import process_rayat_import
+    from src.services.response_cache import response_cache
+    
+    process_rayat_import(import_id)
+    # آخر الاستيرادات تظهر في ملخص لوحة التحكم
+    response_cache.invalidate('dashboard')
+
+@periodic_job('send_follow_up_reminders', 'FOLLOW_UP_REMINDER_INTERVAL', 3600)
+def run_send_follow_up_reminders():
+    """إنشاء تذكيرات متابعات سجلات السلوك المستحقة"""
+    from src.services.follow_ups import send_follow_up_reminders
+    
+    send_follow_up_reminders(current_app.config.get('FOLLOW_UP_REMINDER_BATCH_SIZE', 500))
+
+@periodic_job('reconcile_survey_counters', 'SURVEY_COUNTER_RECONCILE_INTERVAL', 3600)
+def run_reconcile_survey_counters():
+    """تصحيح انحراف عدادات استجابات الاستبيانات"""
+    from src.models.initiatives import Survey, SurveyResponse
+    from src.services.survey_counters import reconcile_response_counts
+    from department_management_backend.src.services.survey_submission import reconcile_survey_counters
+    
+    reconcile_response_counts(db.session, Survey, SurveyResponse)
+    db.session.commit()
+    reconcile_survey_counters()
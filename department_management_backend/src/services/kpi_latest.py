@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from src.models.quality import db, KPIValue, KPILatestValue
+from src.services.sql import dialect_insert
+
+def _materialized_enabled():
+    return current_app.config.get('KPI_LATEST_MATERIALIZED', False)
+
+def _query_latest_values(kpi_ids):
+    """آخر قيمة لكل مؤشر باستعلام واحد باستخدام دالة النافذة row_number"""
+    row_number = db.func.row_number().over(
+        partition_by=KPIValue.kpi_id,
+        order_by=(KPIValue.measurement_date.desc(), KPIValue.id.desc())
+    ).label('row_number')
+    
+    ranked = db.session.query(KPIValue.id.label('id'), row_number)\
+        .filter(KPIValue.kpi_id.in_(kpi_ids))\
+        .subquery()
+    
+    values = KPIValue.query\
+        .join(ranked, KPIValue.id == ranked.c.id)\
+        .filter(ranked.c.row_number == 1)\
+        .all()
+    
+    return {value.kpi_id: value for value in values}
+
+def get_latest_kpi_values(kpi_ids):
+    """الحصول على آخر قيمة لمجموعة من المؤشرات بعدد ثابت من الاستعلامات"""
+    kpi_ids = list(set(kpi_ids))
+    if not kpi_ids:
+        return {}
+    
+    if not _materialized_enabled():
+        return _query_latest_values(kpi_ids)
+    
+    latest = {
+        row.kpi_id: row.kpi_value
+        for row in KPILatestValue.query.filter(KPILatestValue.kpi_id.in_(kpi_ids)).all()
+    }
+    
+    # المؤشرات غير الموجودة في الجدول المُجسَّد تُحسب باستعلام واحد إضافي
+    missing = [kpi_id for kpi_id in kpi_ids if kpi_id not in latest]
+    if missing:
+        latest.update(_query_latest_values(missing))
+    
+    return latest
+
+def record_kpi_value(kpi_value):
+    """تحديث الجدول المُجسَّد بعد إضافة قيمة جديدة (ضمن نفس المعاملة)"""
+    if not _materialized_enabled():
+        return
+    
+    connection = db.session.connection()
+    table = KPILatestValue.__table__
+    latest = kpi_value
+    
+    # أول قيمة تُسجَّل للمؤشر تُهيّئ صفه من جميع قيمه حتى لا يُعتمد على تشغيل rebuild-kpi-latest مسبقاً
+    seeded = connection.execute(
+        db.select(table.c.kpi_id).where(table.c.kpi_id == kpi_value.kpi_id)
+    ).first()
+    if seeded is None:
+        latest = _query_latest_values([kpi_value.kpi_id]).get(kpi_value.kpi_id, kpi_value)
+    
+    # upsert مشروط حتى لا تتعارض الإدراجات المتزامنة على المفتاح ولا تستبدل قيمة أحدث بقيمة أقدم
+    statement = dialect_insert(connection.dialect.name)(table)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['kpi_id'],
+        set_={
+            'kpi_value_id': excluded.kpi_value_id,
+            'measurement_date': excluded.measurement_date,
+            'updated_at': excluded.updated_at
+        },
+        where=or_(
+            excluded.measurement_date > table.c.measurement_date,
+            and_(
+                excluded.measurement_date == table.c.measurement_date,
+                excluded.kpi_value_id > table.c.kpi_value_id
+            )
+        )
+    )
+    connection.execute(statement, {
+        'kpi_id': latest.kpi_id,
+        'kpi_value_id': latest.id,
+        'measurement_date': latest.measurement_date,
+        'updated_at': datetime.utcnow()
+    })
+
+def rebuild_latest_values():
+    """إعادة بناء الجدول المُجسَّد بالكامل من قيم المؤشرات"""
+    kpi_ids = [row[0] for row in db.session.query(KPIValue.kpi_id).distinct()]
+    latest = _query_latest_values(kpi_ids) if kpi_ids else {}
+    
+    KPILatestValue.query.delete()
+    for kpi_id, value in latest.items():
+        db.session.add(KPILatestValue(
+            kpi_id=kpi_id,
+            kpi_value_id=value.id,
+            measurement_date=value.measurement_date
+        ))
+    
+    db.session.commit()
+    return len(latest)
@@ -0,0 +1,229 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, case
+
+from src.models.quality import db, KPIValue, KPIRollup
+from src.services.sql import dialect_insert
+
+ROLLUP_GRANULARITIES = ('week', 'month', 'quarter', 'year')
+
+# متوسط طول الفترة بالأيام لتقدير عدد النقاط عند الاختيار التلقائي
+GRANULARITY_DAYS = {'week': 7, 'month': 30.44, 'quarter': 91.31, 'year': 365.25}
+
+SERIES_VALUES = ('mean', 'min', 'max', 'last')
+
+MAX_SERIES_POINTS = 1000
+
+def period_start(day, granularity):
+    """بداية الفترة التي يقع فيها التاريخ (الأسبوع يبدأ الاثنين)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    if granularity == 'year':
+        return date(day.year, 1, 1)
+    raise ValueError(f'دقة التجميع غير مدعومة: {granularity}')
+
+def rollup_deltas(values):
+    """تجميع قيم [(kpi_id, measurement_date, value)] في {(kpi_id, granularity, period_start): [count, min, max, sum, last_date, last]}"""
+    deltas = {}
+    for kpi_id, measurement_date, value in values:
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (kpi_id, granularity, period_start(measurement_date, granularity))
+            delta = deltas.get(key)
+            if delta is None:
+                deltas[key] = [1, value, value, value, measurement_date, value]
+                continue
+            delta[0] += 1
+            delta[1] = min(delta[1], value)
+            delta[2] = max(delta[2], value)
+            delta[3] += value
+            if measurement_date >= delta[4]:
+                delta[4] = measurement_date
+                delta[5] = value
+    return deltas
+
+def _least(dialect_name, a, b):
+    # SQLite: min/max بمعاملين دالتان عاديتان وليستا تجميعيتين
+    return func.min(a, b) if dialect_name == 'sqlite' else func.least(a, b)
+
+def _greatest(dialect_name, a, b):
+    return func.max(a, b) if dialect_name == 'sqlite' else func.greatest(a, b)
+
+def apply_kpi_rollups(connection, deltas):
+    """دمج الفروقات في التجميعات بعبارة upsert واحدة"""
+    if not deltas:
+        return
+    
+    dialect_name = connection.dialect.name
+    table = KPIRollup.__table__
+    statement = dialect_insert(dialect_name)(table)
+    excluded = statement.excluded
+    newer = excluded.last_date >= table.c.last_date
+    statement = statement.on_conflict_do_update(
+        index_elements=['kpi_id', 'granularity', 'period_start'],
+        set_={
+            'count': table.c.count + excluded.count,
+            'min_value': _least(dialect_name, table.c.min_value, excluded.min_value),
+            'max_value': _greatest(dialect_name, table.c.max_value, excluded.max_value),
+            'value_sum': table.c.value_sum + excluded.value_sum,
+            'last_value': case((newer, excluded.last_value), else_=table.c.last_value),
+            'last_date': case((newer, excluded.last_date), else_=table.c.last_date),
+            'updated_at': excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    connection.execute(statement, [
+        {
+            'kpi_id': kpi_id,
+            'granularity': granularity,
+            'period_start': start,
+            'count': count,
+            'min_value': min_value,
+            'max_value': max_value,
+            'value_sum': value_sum,
+            'last_date': last_date,
+            'last_value': last_value,
+            'updated_at': now
+        }
+        for (kpi_id, granularity, start), (count, min_value, max_value, value_sum, last_date, last_value)
+        in sorted(deltas.items())
+    ])
+
+def record_kpi_rollups(kpi_value):
+    """تحديث تجميعات المؤشر بعد إضافة قيمة جديدة (ضمن نفس المعاملة)"""
+    apply_kpi_rollups(db.session.connection(), rollup_deltas([
+        (kpi_value.kpi_id, kpi_value.measurement_date, kpi_value.value)
+    ]))
+
+def rebuild_kpi_rollups(kpi_id=None, batch_size=5000):
+    """إعادة بناء التجميعات من قيم المؤشرات (لمؤشر واحد أو للجميع)"""
+    connection = db.session.connection()
+    delete = KPIRollup.__table__.delete()
+    values = db.session.query(KPIValue.kpi_id, KPIValue.measurement_date, KPIValue.value)
+    if kpi_id is not None:
+        delete = delete.where(KPIRollup.kpi_id == kpi_id)
+        values = values.filter(KPIValue.kpi_id == kpi_id)
+    connection.execute(delete)
+    
+    batch = []
+    total = 0
+    for row in values.execution_options(yield_per=batch_size):
+        batch.append(tuple(row))
+        if len(batch) >= batch_size:
+            apply_kpi_rollups(connection, rollup_deltas(batch))
+            total += len(batch)
+            batch = []
+    if batch:
+        apply_kpi_rollups(connection, rollup_deltas(batch))
+        total += len(batch)
+    
+    db.session.commit()
+    return total
+
+def lttb(points, threshold, key=lambda point: point):
+    """تقليص سلسلة زمنية إلى threshold نقطة بخوارزمية Largest-Triangle-Three-Buckets مع الحفاظ على شكلها"""
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+    
+    coordinates = [key(point) for point in points]
+    sampled = [points[0]]
+    # كل النقاط عدا الأولى والأخيرة تُوزع على threshold - 2 حاوية
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        
+        # متوسط الحاوية التالية هو الرأس الثالث للمثلث
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_bucket = coordinates[next_start:next_end]
+        avg_x = sum(x for x, _ in next_bucket) / len(next_bucket)
+        avg_y = sum(y for _, y in next_bucket) / len(next_bucket)
+        
+        ax, ay = coordinates[previous]
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            x, y = coordinates[index]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = index, area
+        
+        sampled.append(points[best])
+        previous = best
+    
+    sampled.append(points[-1])
+    return sampled
+
+def _date_range(kpi_id, start_date, end_date):
+    if start_date and end_date:
+        return start_date, end_date
+    first, last = db.session.query(
+        func.min(KPIValue.measurement_date), func.max(KPIValue.measurement_date)
+    ).filter(KPIValue.kpi_id == kpi_id).one()
+    return start_date or first, end_date or last
+
+def _choose_granularity(kpi_id, start_date, end_date, max_points):
+    """أدق دقة يكفي فيها عدد النقاط للحد المطلوب"""
+    raw_count = db.session.query(func.count(KPIValue.id)).filter(
+        KPIValue.kpi_id == kpi_id,
+        KPIValue.measurement_date.between(start_date, end_date)
+    ).scalar()
+    if raw_count <= max_points:
+        return 'raw'
+    
+    span = (end_date - start_date).days + 1
+    for granularity in ROLLUP_GRANULARITIES:
+        if span / GRANULARITY_DAYS[granularity] <= max_points:
+            return granularity
+    return ROLLUP_GRANULARITIES[-1]
+
+def get_kpi_series(kpi_id, granularity='auto', start_date=None, end_date=None, max_points=200, value='mean'):
+    """سلسلة قيم المؤشر لفترة زمنية بعدد نقاط لا يتجاوز max_points"""
+    if granularity not in ('auto', 'raw') + ROLLUP_GRANULARITIES:
+        raise ValueError(f'دقة التجميع غير مدعومة: {granularity}')
+    if value not in SERIES_VALUES:
+        raise ValueError(f'القيمة غير مدعومة: {value}')
+    max_points = max(3, min(max_points, MAX_SERIES_POINTS))
+    
+    start_date, end_date = _date_range(kpi_id, start_date, end_date)
+    if start_date is None:
+        return {'kpi_id': kpi_id, 'granularity': granularity, 'value': value, 'points': [], 'downsampled': False}
+    
+    if granularity == 'auto':
+        granularity = _choose_granularity(kpi_id, start_date, end_date, max_points)
+    
+    if granularity == 'raw':
+        rows = db.session.query(KPIValue.measurement_date, KPIValue.value).filter(
+            KPIValue.kpi_id == kpi_id,
+            KPIValue.measurement_date.between(start_date, end_date)
+        ).order_by(KPIValue.measurement_date).all()
+        points = [{'date': day.isoformat(), 'value': number} for day, number in rows]
+    else:
+        # الفترة الأولى قد تبدأ قبل start_date
+        rollups = KPIRollup.query.filter(
+            KPIRollup.kpi_id == kpi_id,
+            KPIRollup.granularity == granularity,
+            KPIRollup.period_start.between(period_start(start_date, granularity), end_date)
+        ).order_by(KPIRollup.period_start).all()
+        points = []
+        for rollup in rollups:
+            point = rollup.to_dict()
+            point['date'] = point.pop('period_start')
+            point['value'] = point[value]
+            points.append(point)
+    
+    sampled = lttb(points, max_points, key=lambda point: (date.fromisoformat(point['date']).toordinal(), point['value']))
+    return {
+        'kpi_id': kpi_id,
+        'granularity': granularity,
+        'value': value,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'points': sampled,
+        'downsampled': len(sampled) < len(points)
+    }
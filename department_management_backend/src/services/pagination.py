@@ -0,0 +1,133 @@
+from datetime import datetime, date
+import base64
+import json
+
+from flask import request
+from sqlalchemy import or_, and_, text
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values):
+    """ترميز قيم آخر صف في مؤشر نصي غير شفاف"""
+    values = [value.isoformat() if isinstance(value, (datetime, date)) else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """فك ترميز المؤشر وتحويل القيم إلى أنواع الأعمدة"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('مؤشر الصفحة غير صالح')
+    
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor('مؤشر الصفحة غير صالح')
+    
+    decoded = []
+    try:
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+    except (ValueError, TypeError):
+        raise InvalidCursor('مؤشر الصفحة غير صالح')
+    return decoded
+
+def _seek_condition(columns, values, descending):
+    """شرط البحث بعد آخر صف: (sort < v) OR (sort = v AND id < id_v)"""
+    compare = (lambda column, value: column < value) if descending else (lambda column, value: column > value)
+    if len(columns) == 1:
+        return compare(columns[0], values[0])
+    
+    sort_column, id_column = columns
+    sort_value, id_value = values
+    return or_(
+        compare(sort_column, sort_value),
+        and_(sort_column == sort_value, compare(id_column, id_value))
+    )
+
+def _estimate_count(query):
+    """تقدير عدد الصفوف من خطة التنفيذ في PostgreSQL دون COUNT(*)"""
+    session = query.session
+    dialect = session.get_bind().dialect
+    if dialect.name != 'postgresql':
+        return query.order_by(None).count()
+    
+    sql = str(query.order_by(None).statement.compile(
+        dialect=dialect, compile_kwargs={'literal_binds': True}
+    ))
+    plan = session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def cursor_requested():
+    """هل طلب المستدعي التصفح بالمؤشر (?after= أو ?paginate=cursor)"""
+    return 'after' in request.args or request.args.get('paginate') == 'cursor'
+
+def keyset_paginate(query, sort_column, id_column=None, per_page=10, descending=True, after=None, count=None):
+    """تصفح بالمؤشر بتكلفة ثابتة لكل صفحة بالاعتماد على فهرس (sort_key, id)"""
+    columns = [sort_column] if id_column is None else [sort_column, id_column]
+    
+    total = None
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        total = _estimate_count(query)
+    
+    if after:
+        query = query.filter(_seek_condition(columns, decode_cursor(after, columns), descending))
+    
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+    
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'total': total
+    }
+
+def paginate_request(query, items_key, serialize, sort_column, id_column=None, descending=True):
+    """تصفح موحد للمسارات: بالمؤشر عند طلبه، وإلا التصفح التقليدي بالصفحات"""
+    per_page = request.args.get('per_page', 10, type=int)
+    
+    if cursor_requested():
+        page = keyset_paginate(
+            query, sort_column, id_column,
+            per_page=per_page,
+            descending=descending,
+            after=request.args.get('after') or None,
+            count=request.args.get('count')
+        )
+        result = {
+            items_key: serialize(page['items']),
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
+        }
+        if page['total'] is not None:
+            result['total'] = page['total']
+        return result
+    
+    page = request.args.get('page', 1, type=int)
+    columns = [sort_column] if id_column is None else [sort_column, id_column]
+    order = [column.desc() if descending else column.asc() for column in columns]
+    pagination = query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False)
+    return {
+        items_key: serialize(pagination.items),
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'current_page': page
+    }
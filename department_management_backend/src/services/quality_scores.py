@@ -0,0 +1,263 @@
+from calendar import monthrange
+from datetime import date, datetime
+import re
+
+from sqlalchemy import event, func
+
+from src.models.quality import db, QualityStandard, QualityIndicator, QualityMeasurement, QualityScore
+from src.services.sql import dialect_insert
+
+# ترتيب الحالات من الأفضل إلى الأسوأ؛ حالة المعيار هي أسوأ حالة بين مؤشراته
+STATUSES = ('on_target', 'warning', 'critical')
+
+# معرف صف مؤشر القسم العام في جدول الدرجات
+DEPARTMENT_INDEX = 0
+
+PERIOD_PATTERN = re.compile(r'(\d{4})(?:-Q([1-4])|-(\d{2}))?')
+
+def period_range(period):
+    """تاريخا بداية ونهاية الفترة: سنة (2024) أو فصل (2024-Q1) أو شهر (2024-03)"""
+    match = PERIOD_PATTERN.fullmatch(period or '')
+    if not match:
+        raise ValueError(f'صيغة الفترة غير صحيحة: {period}')
+    
+    year, quarter, month = match.groups()
+    year = int(year)
+    if quarter:
+        first_month = (int(quarter) - 1) * 3 + 1
+        return date(year, first_month, 1), date(year, first_month + 2, monthrange(year, first_month + 2)[1])
+    if month:
+        month = int(month)
+        if not 1 <= month <= 12:
+            raise ValueError(f'صيغة الفترة غير صحيحة: {period}')
+        return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    return date(year, 1, 1), date(year, 12, 31)
+
+def periods_for(day):
+    """الفترات التي يقع فيها التاريخ (السنة والفصل والشهر)"""
+    return [str(day.year), f'{day.year}-Q{(day.month - 1) // 3 + 1}', f'{day.year}-{day.month:02d}']
+
+def current_period():
+    today = date.today()
+    return periods_for(today)[1]
+
+def indicator_score(value, target, warning_threshold=None, critical_threshold=None):
+    """درجة المؤشر (0-100) نسبةً إلى المستهدف، وحالته حسب العتبات"""
+    if target:
+        score = value / target * 100
+    else:
+        # المؤشرات بلا مستهدف تُعامل كنسب مئوية
+        score = value
+    score = max(0.0, min(score, 100.0))
+    
+    if critical_threshold is not None and value <= critical_threshold:
+        status = 'critical'
+    elif warning_threshold is not None and value <= warning_threshold:
+        status = 'warning'
+    else:
+        status = 'on_target'
+    return score, status
+
+def _worst(statuses):
+    statuses = [status for status in statuses if status]
+    return max(statuses, key=STATUSES.index) if statuses else None
+
+def _aggregate(start_date, end_date, standard_ids=None):
+    """متوسط وعدد قياسات كل مؤشر في الفترة باستعلام تجميعي واحد"""
+    query = db.session.query(
+        QualityMeasurement.standard_id,
+        QualityIndicator.weight,
+        QualityIndicator.target_value,
+        QualityIndicator.warning_threshold,
+        QualityIndicator.critical_threshold,
+        func.avg(QualityMeasurement.value),
+        func.count(QualityMeasurement.id)
+    ).join(QualityIndicator, QualityIndicator.id == QualityMeasurement.indicator_id)\
+        .filter(
+            QualityIndicator.is_active == True,
+            QualityMeasurement.measurement_date.between(start_date, end_date)
+        )\
+        .group_by(
+            QualityMeasurement.standard_id,
+            QualityIndicator.id,
+            QualityIndicator.weight,
+            QualityIndicator.target_value,
+            QualityIndicator.warning_threshold,
+            QualityIndicator.critical_threshold
+        )
+    if standard_ids is not None:
+        query = query.filter(QualityMeasurement.standard_id.in_(standard_ids))
+    
+    standards = {}
+    for standard_id, weight, target, warning, critical, average, count in query:
+        score, status = indicator_score(average, target, warning, critical)
+        weight = weight if weight is not None else 1.0
+        totals = standards.setdefault(standard_id, {
+            'weighted': 0.0, 'weight': 0.0, 'indicators_count': 0, 'measurements_count': 0, 'statuses': []
+        })
+        totals['weighted'] += score * weight
+        totals['weight'] += weight
+        totals['indicators_count'] += 1
+        totals['measurements_count'] += count
+        totals['statuses'].append(status)
+    
+    return {
+        standard_id: {
+            'score': totals['weighted'] / totals['weight'] if totals['weight'] else None,
+            'weight': totals['weight'],
+            'indicators_count': totals['indicators_count'],
+            'measurements_count': totals['measurements_count'],
+            'status': _worst(totals['statuses'])
+        }
+        for standard_id, totals in standards.items()
+    }
+
+def _store(connection, period, rows):
+    table = QualityScore.__table__
+    statement = dialect_insert(connection.dialect.name)(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['period', 'standard_id'],
+        set_={
+            column: statement.excluded[column]
+            for column in ('score', 'weight', 'indicators_count', 'measurements_count', 'status', 'is_stale', 'computed_at')
+        }
+    )
+    now = datetime.utcnow()
+    connection.execute(statement, [
+        dict(row, period=period, standard_id=standard_id, is_stale=False, computed_at=now)
+        for standard_id, row in sorted(rows.items())
+    ])
+
+def _empty():
+    return {'score': None, 'weight': 0.0, 'indicators_count': 0, 'measurements_count': 0, 'status': None}
+
+def compute_quality_scores(period, standard_ids=None):
+    """حساب درجات المعايير للفترة (جميعها أو المحددة فقط) ثم مؤشر القسم من الدرجات المخزنة"""
+    start_date, end_date = period_range(period)
+    scores = _aggregate(start_date, end_date, standard_ids)
+    
+    # المعايير المحسوبة سابقاً التي لم تعد لها قياسات في الفترة
+    previous = db.session.query(QualityScore.standard_id).filter(
+        QualityScore.period == period,
+        QualityScore.standard_id != DEPARTMENT_INDEX
+    )
+    if standard_ids is not None:
+        previous = previous.filter(QualityScore.standard_id.in_(standard_ids))
+    for (standard_id,) in previous:
+        scores.setdefault(standard_id, _empty())
+    
+    connection = db.session.connection()
+    if scores:
+        _store(connection, period, scores)
+    
+    # مؤشر القسم: متوسط درجات المعايير موزوناً بمجموع أوزان مؤشراتها المقاسة
+    weighted, weight, indicators, measurements, statuses = 0.0, 0.0, 0, 0, []
+    rows = db.session.query(
+        QualityScore.score, QualityScore.weight, QualityScore.indicators_count,
+        QualityScore.measurements_count, QualityScore.status
+    ).filter(
+        QualityScore.period == period,
+        QualityScore.standard_id != DEPARTMENT_INDEX,
+        QualityScore.score.isnot(None)
+    )
+    for score, standard_weight, indicators_count, measurements_count, status in rows:
+        weighted += score * standard_weight
+        weight += standard_weight
+        indicators += indicators_count
+        measurements += measurements_count
+        statuses.append(status)
+    
+    _store(connection, period, {DEPARTMENT_INDEX: {
+        'score': weighted / weight if weight else None,
+        'weight': weight,
+        'indicators_count': indicators,
+        'measurements_count': measurements,
+        'status': _worst(statuses)
+    }})
+
+def get_quality_scores(period):
+    """درجات الفترة من الجدول المخزن، مع إعادة حساب المعايير المتأثرة بقياسات جديدة فقط"""
+    rows = QualityScore.query.filter_by(period=period).all()
+    department = next((row for row in rows if row.standard_id == DEPARTMENT_INDEX), None)
+    stale = [row.standard_id for row in rows if row.is_stale and row.standard_id != DEPARTMENT_INDEX]
+    
+    if department is None:
+        compute_quality_scores(period)
+    elif stale:
+        compute_quality_scores(period, stale)
+    if department is None or stale:
+        db.session.commit()
+        rows = QualityScore.query.filter_by(period=period).all()
+    
+    standards = {
+        standard.id: standard
+        for standard in QualityStandard.query.filter(
+            QualityStandard.id.in_([row.standard_id for row in rows if row.standard_id != DEPARTMENT_INDEX])
+        )
+    }
+    
+    start_date, end_date = period_range(period)
+    result = {
+        'period': period,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'index': None,
+        'standards': []
+    }
+    for row in sorted(rows, key=lambda row: row.standard_id):
+        if row.standard_id == DEPARTMENT_INDEX:
+            result['index'] = row.to_dict()
+            continue
+        if row.score is None:
+            continue
+        item = row.to_dict()
+        standard = standards.get(row.standard_id)
+        item['code'] = standard.code if standard else None
+        item['name'] = standard.name if standard else None
+        result['standards'].append(item)
+    return result
+
+# تعليم الدرجات المتأثرة بالتغييرات لإعادة حسابها عند الطلب التالي
+
+def mark_stale(connection, standard_id, measurement_date):
+    """تعليم درجات المعيار في الفترات التي تشمل التاريخ (وإنشاؤها إن لم توجد)"""
+    statement = dialect_insert(connection.dialect.name)(QualityScore.__table__)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=['period', 'standard_id'],
+            set_={'is_stale': True}
+        ),
+        [
+            {'period': period, 'standard_id': standard_id, 'weight': 0.0,
+             'indicators_count': 0, 'measurements_count': 0, 'is_stale': True}
+            for period in periods_for(measurement_date)
+        ]
+    )
+
+@event.listens_for(QualityMeasurement, 'after_insert')
+@event.listens_for(QualityMeasurement, 'after_delete')
+def _measurement_changed(mapper, connection, target):
+    mark_stale(connection, target.standard_id, target.measurement_date)
+
+@event.listens_for(QualityMeasurement, 'after_update')
+def _measurement_updated(mapper, connection, target):
+    state = db.inspect(target)
+    changed = [state.attrs[name].history for name in ('standard_id', 'measurement_date', 'value', 'indicator_id')]
+    if not any(history.has_changes() for history in changed):
+        return
+    
+    standard_history, date_history = changed[0], changed[1]
+    old_standard = standard_history.deleted[0] if standard_history.deleted else target.standard_id
+    old_date = date_history.deleted[0] if date_history.deleted else target.measurement_date
+    mark_stale(connection, old_standard, old_date)
+    mark_stale(connection, target.standard_id, target.measurement_date)
+
+@event.listens_for(QualityIndicator, 'after_update')
+def _indicator_updated(mapper, connection, target):
+    state = db.inspect(target)
+    fields = ('weight', 'target_value', 'warning_threshold', 'critical_threshold', 'is_active')
+    if not any(state.attrs[name].history.has_changes() for name in fields):
+        return
+    
+    table = QualityScore.__table__
+    connection.execute(table.update().where(table.c.standard_id == target.standard_id).values(is_stale=True))
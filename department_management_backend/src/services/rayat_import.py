@@ -0,0 +1,337 @@
+from datetime import datetime, date, time
+from itertools import islice
+import csv
+
+from flask import current_app
+
+from src.models.quality import db, RayatImport, RayatAttendance, RayatGrade, RayatSchedule
+from src.services.sql import dialect_insert
+
+# الحد الأقصى لعدد أسطر سجل الأخطاء المحفوظة لكل عملية استيراد
+MAX_ERROR_LOG_LINES = 500
+
+ATTENDANCE_STATUSES = {
+    'حاضر': 'present',
+    'غائب': 'absent',
+    'متأخر': 'late',
+    'معذور': 'excused',
+    'present': 'present',
+    'absent': 'absent',
+    'late': 'late',
+    'excused': 'excused'
+}
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+def _parse_code(value):
+    """تحويل المعرفات إلى نص (ملفات Excel تعيد الأرقام كـ float)"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(str(value), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'تاريخ غير صالح: {value}')
+
+def _parse_time(value):
+    if isinstance(value, (datetime, time)):
+        return value.strftime('%H:%M')
+    for fmt in ('%H:%M', '%H:%M:%S', '%I:%M %p'):
+        try:
+            return datetime.strptime(str(value), fmt).strftime('%H:%M')
+        except ValueError:
+            continue
+    raise ValueError(f'وقت غير صالح: {value}')
+
+def _parse_float(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'قيمة رقمية غير صالحة: {value}')
+
+def _map_attendance(row):
+    status = ATTENDANCE_STATUSES.get(str(row['status']).lower())
+    if not status:
+        raise ValueError(f"حالة حضور غير معروفة: {row['status']}")
+    return {
+        'trainee_id': _parse_code(row['trainee_id']),
+        'course_code': _parse_code(row['course_code']),
+        'attendance_date': _parse_date(row['attendance_date']),
+        'status': status,
+        'hours': _parse_float(row.get('hours'))
+    }
+
+def _map_grade(row):
+    return {
+        'trainee_id': _parse_code(row['trainee_id']),
+        'course_code': _parse_code(row['course_code']),
+        'semester': _parse_code(row['semester']),
+        'grade': _parse_float(row.get('grade')),
+        'letter_grade': row.get('letter_grade')
+    }
+
+def _map_schedule(row):
+    return {
+        'semester': _parse_code(row['semester']),
+        'course_code': _parse_code(row['course_code']),
+        'section': _parse_code(row['section']),
+        'day': str(row['day']),
+        'start_time': _parse_time(row['start_time']),
+        'end_time': _parse_time(row['end_time']) if row.get('end_time') else None,
+        'room': _parse_code(row['room']) if row.get('room') else None,
+        'trainer_name': row.get('trainer_name')
+    }
+
+# تعريف أنواع الاستيراد: الجدول الهدف، أسماء الأعمدة المقبولة، الحقول الإلزامية ومفتاح التحديث
+IMPORT_MAPPINGS = {
+    'attendance': {
+        'model': RayatAttendance,
+        'mapper': _map_attendance,
+        'key': ('trainee_id', 'course_code', 'attendance_date'),
+        'required': ('trainee_id', 'course_code', 'attendance_date', 'status'),
+        'columns': {
+            'trainee_id': ('trainee_id', 'رقم المتدرب', 'الرقم التدريبي'),
+            'course_code': ('course_code', 'رمز المقرر'),
+            'attendance_date': ('date', 'attendance_date', 'التاريخ'),
+            'status': ('status', 'الحالة'),
+            'hours': ('hours', 'الساعات', 'عدد الساعات')
+        }
+    },
+    'grades': {
+        'model': RayatGrade,
+        'mapper': _map_grade,
+        'key': ('trainee_id', 'course_code', 'semester'),
+        'required': ('trainee_id', 'course_code', 'semester'),
+        'columns': {
+            'trainee_id': ('trainee_id', 'رقم المتدرب', 'الرقم التدريبي'),
+            'course_code': ('course_code', 'رمز المقرر'),
+            'semester': ('semester', 'الفصل التدريبي', 'الفصل'),
+            'grade': ('grade', 'الدرجة'),
+            'letter_grade': ('letter_grade', 'التقدير')
+        }
+    },
+    'schedules': {
+        'model': RayatSchedule,
+        'mapper': _map_schedule,
+        'key': ('semester', 'course_code', 'section', 'day', 'start_time'),
+        'required': ('semester', 'course_code', 'section', 'day', 'start_time'),
+        'columns': {
+            'semester': ('semester', 'الفصل التدريبي', 'الفصل'),
+            'course_code': ('course_code', 'رمز المقرر'),
+            'section': ('section', 'الشعبة'),
+            'day': ('day', 'اليوم'),
+            'start_time': ('start_time', 'من', 'وقت البداية'),
+            'end_time': ('end_time', 'إلى', 'وقت النهاية'),
+            'room': ('room', 'القاعة', 'المعمل'),
+            'trainer_name': ('trainer', 'trainer_name', 'المدرب')
+        }
+    }
+}
+
+def _detect_encoding(file_path):
+    """تحديد ترميز ملف CSV من عينة صغيرة (UTF-8 أو Windows-1256)"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(65536)
+    try:
+        sample.decode('utf-8-sig')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # قد تنقطع العينة في منتصف حرف متعدد البايتات
+        if e.start >= len(sample) - 3:
+            return 'utf-8-sig'
+        return 'cp1256'
+
+def iter_csv_rows(file_path):
+    """قراءة ملف CSV سطراً بسطر"""
+    with open(file_path, newline='', encoding=_detect_encoding(file_path)) as f:
+        for row in csv.reader(f):
+            yield row
+
+def iter_xlsx_rows(file_path):
+    """قراءة ملف XLSX في وضع القراءة فقط دون تحميل الورقة كاملة في الذاكرة"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+ROW_READERS = {
+    'csv': iter_csv_rows,
+    'xlsx': iter_xlsx_rows
+}
+
+def _resolve_header(header, mapping):
+    """ربط أعمدة الملف بحقول الجدول"""
+    aliases = {}
+    for field, names in mapping['columns'].items():
+        for name in names:
+            aliases[name.strip().lower()] = field
+    
+    positions = {}
+    for index, name in enumerate(header):
+        field = aliases.get(str(name).strip().lower()) if name is not None else None
+        if field and field not in positions:
+            positions[field] = index
+    
+    missing = [field for field in mapping['required'] if field not in positions]
+    if missing:
+        raise ValueError(f"أعمدة مطلوبة غير موجودة في الملف: {', '.join(missing)}")
+    
+    return positions
+
+def _upsert(model, key, rows):
+    """إدراج أو تحديث دفعة من السجلات بعبارة واحدة"""
+    insert = dialect_insert(db.engine.dialect.name)
+    statement = insert(model.__table__)
+    update_columns = {
+        name: statement.excluded[name]
+        for name in rows[0].keys()
+        if name not in key
+    }
+    statement = statement.on_conflict_do_update(index_elements=list(key), set_=update_columns)
+    db.session.execute(statement, rows)
+
+class _ImportProgress:
+    """تتبع تقدم الاستيراد وتحديث سجل RayatImport بعد كل دفعة"""
+    
+    def __init__(self, rayat_import):
+        self.rayat_import = rayat_import
+        self.errors = []
+        self.error_count = 0
+    
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERROR_LOG_LINES:
+            self.errors.append(f'سطر {line_number}: {message}' if line_number else message)
+    
+    def save(self, processed, success, failed):
+        rayat_import = self.rayat_import
+        rayat_import.records_processed = (rayat_import.records_processed or 0) + processed
+        rayat_import.records_success = (rayat_import.records_success or 0) + success
+        rayat_import.records_failed = (rayat_import.records_failed or 0) + failed
+        rayat_import.error_log = self.error_log()
+        db.session.commit()
+    
+    def error_log(self):
+        if not self.errors:
+            return None
+        log = '\n'.join(self.errors)
+        if self.error_count > len(self.errors):
+            log += f'\n... و {self.error_count - len(self.errors)} أخطاء أخرى'
+        return log
+
+def _process_chunk(chunk, positions, mapping, rayat_import, progress):
+    """تحويل دفعة من الأسطر وإدراجها، مع إرجاع عدد الناجح والفاشل"""
+    records = {}
+    accepted = 0
+    failed = 0
+    
+    for line_number, raw in chunk:
+        row = {
+            field: _clean(raw[index]) if index < len(raw) else None
+            for field, index in positions.items()
+        }
+        if not any(value is not None for value in row.values()):
+            continue
+        
+        try:
+            missing = [field for field in mapping['required'] if row.get(field) is None]
+            if missing:
+                raise ValueError(f"قيم مفقودة: {', '.join(missing)}")
+            record = mapping['mapper'](row)
+        except ValueError as e:
+            failed += 1
+            progress.add_error(line_number, str(e))
+            continue
+        
+        accepted += 1
+        record['import_id'] = rayat_import.id
+        record['updated_at'] = datetime.utcnow()
+        # آخر سطر يفوز عند تكرار المفتاح داخل الدفعة نفسها
+        records[tuple(record[field] for field in mapping['key'])] = record
+    
+    if not records:
+        return 0, failed
+    
+    try:
+        _upsert(mapping['model'], mapping['key'], list(records.values()))
+    except Exception as e:
+        db.session.rollback()
+        progress.add_error(chunk[0][0], f'فشل حفظ الدفعة: {e}')
+        return 0, failed + accepted
+    
+    # الأسطر المكررة داخل الدفعة تُحسب ناجحة لأن آخرها هو المحفوظ
+    return accepted, failed
+
+def process_rayat_import(import_id, chunk_size=None):
+    """معالجة ملف رايات على دفعات محدودة الحجم مع تحديث التقدم تدريجياً"""
+    rayat_import = RayatImport.query.get(import_id)
+    if not rayat_import:
+        raise ValueError(f'عملية الاستيراد غير موجودة: {import_id}')
+    
+    chunk_size = chunk_size or current_app.config.get('RAYAT_IMPORT_CHUNK_SIZE', 1000)
+    progress = _ImportProgress(rayat_import)
+    
+    rayat_import.status = 'processing'
+    rayat_import.records_processed = 0
+    rayat_import.records_success = 0
+    rayat_import.records_failed = 0
+    rayat_import.error_log = None
+    db.session.commit()
+    
+    try:
+        mapping = IMPORT_MAPPINGS.get(rayat_import.import_type)
+        if not mapping:
+            raise ValueError(f'نوع الاستيراد غير مدعوم: {rayat_import.import_type}')
+        
+        reader = ROW_READERS.get(rayat_import.file_type)
+        if not reader:
+            raise ValueError(f'نوع الملف غير مدعوم للمعالجة: {rayat_import.file_type}')
+        
+        rows = enumerate(reader(rayat_import.file_path), start=1)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError('الملف فارغ')
+        positions = _resolve_header(header[1], mapping)
+        
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            success, failed = _process_chunk(chunk, positions, mapping, rayat_import, progress)
+            progress.save(success + failed, success, failed)
+        
+        # تحديث تجميعات نسب النجاح في لوحة التحكم للمقررات المتأثرة فقط
+        if rayat_import.import_type == 'grades':
+            from src.services.dashboard_metrics import refresh_grade_rollups
+            refresh_grade_rollups(rayat_import.id)
+        
+        rayat_import.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        rayat_import.status = 'failed'
+        progress.add_error(None, str(e))
+        rayat_import.error_log = progress.error_log()
+    
+    rayat_import.completed_at = datetime.utcnow()
+    db.session.commit()
+    return rayat_import
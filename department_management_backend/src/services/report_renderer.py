@@ -0,0 +1,367 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from xml.sax.saxutils import escape
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from flask import current_app
+
+from src.models.auth import Permission
+from src.models.quality import KPI, GeneratedReport
+from src.services.exports import EXPORT_DATASETS, export_statement, export_headers, iter_rows, xlsx_cell
+from src.services.quality_scores import get_quality_scores, current_period
+from src.services.kpi_rollups import get_kpi_series
+from src.services.kpi_latest import get_latest_kpi_values
+from src.services.behavior_scorecards import get_at_risk_trainees
+from src.services.follow_ups import follow_up_summary
+from src.services.job_runner import REPORT_RENDERERS
+
+# مصادر بيانات أقسام التقارير: الاسم -> (دالة تُرجع الأعمدة والصفوف، الصلاحية المطلوبة، المعاملات المسموحة وأنواعها،
+# والقيم الافتراضية المعتمدة على التاريخ التي تُحسب عند تحديد الأقسام لتصبح جزءاً من مفتاح اللقطة)
+REPORT_DATASETS = {}
+
+def report_dataset(name, permission, defaults=None, **params):
+    """تسجيل مصدر بيانات يمكن استخدامه في أقسام template_config، بالصلاحية نفسها المطلوبة لمساره"""
+    def decorator(f):
+        REPORT_DATASETS[name] = (f, permission, params, defaults or {})
+        return f
+    return decorator
+
+def _date_param(value):
+    return datetime.fromisoformat(value)
+
+def _end_date_param(value):
+    parsed = datetime.fromisoformat(value)
+    # تاريخ بدون وقت في نهاية الفترة يشمل اليوم كاملاً
+    if len(value) == 10:
+        parsed += timedelta(days=1) - timedelta(microseconds=1)
+    return parsed
+
+def _max_rows():
+    return current_app.config.get('REPORT_MAX_ROWS', 10000)
+
+@report_dataset('quality_scores', Permission.VIEW_QUALITY, defaults={'period': current_period}, period=str)
+def quality_scores_dataset(period):
+    """درجات معايير الجودة للفترة (الفصل الحالي افتراضياً) مع مؤشر القسم"""
+    result = get_quality_scores(period)
+    columns = ['code', 'name', 'score', 'weight', 'status', 'indicators_count', 'measurements_count']
+    items = result['standards']
+    if result['index']:
+        items = items + [dict(result['index'], name='مؤشر القسم')]
+    return columns, ([item.get(column) for column in columns] for item in items)
+
+@report_dataset('kpi_latest', Permission.VIEW_QUALITY, category=str)
+def kpi_latest_dataset(category=None):
+    """آخر قيمة لكل مؤشر أداء نشط"""
+    query = KPI.query.filter_by(is_active=True)
+    if category:
+        query = query.filter_by(category=category)
+    kpis = query.order_by(KPI.code).all()
+    latest = get_latest_kpi_values([kpi.id for kpi in kpis])
+    
+    columns = ['code', 'name', 'category', 'target_value', 'warning_threshold', 'critical_threshold',
+               'value', 'measurement_date']
+    rows = []
+    for kpi in kpis:
+        value = latest.get(kpi.id)
+        rows.append([
+            kpi.code, kpi.name, kpi.category, kpi.target_value, kpi.warning_threshold, kpi.critical_threshold,
+            value.value if value else None, value.measurement_date if value else None
+        ])
+    return columns, rows
+
+@report_dataset('kpi_series', Permission.VIEW_QUALITY, kpi_id=int, granularity=str, start_date=date.fromisoformat,
+                end_date=date.fromisoformat, value=str)
+def kpi_series_dataset(kpi_id=None, granularity='auto', start_date=None, end_date=None, value='mean'):
+    """سلسلة قيم مؤشر من جداول التجميع"""
+    if kpi_id is None:
+        raise ValueError('معرف المؤشر kpi_id مطلوب لقسم kpi_series')
+    series = get_kpi_series(kpi_id, granularity, start_date, end_date, value=value)
+    return ['date', 'value'], ([point['date'], point['value']] for point in series['points'])
+
+@report_dataset('at_risk_trainees', Permission.VIEW_TRAINEE_BEHAVIOR, limit=int, max_net_points=int, min_open_follow_ups=int)
+def at_risk_trainees_dataset(limit=50, max_net_points=0, min_open_follow_ups=0):
+    """المتدربون الأقل نقاطاً من بطاقات السلوك"""
+    columns = ['trainee_id', 'net_points', 'points_awarded', 'points_deducted', 'positive_count',
+               'negative_count', 'unresolved_count', 'open_follow_ups']
+    scorecards = get_at_risk_trainees(min(limit, _max_rows()), max_net_points, min_open_follow_ups)
+    return columns, ([scorecard[column] for column in columns] for scorecard in scorecards)
+
+@report_dataset('follow_up_summary', Permission.VIEW_TRAINEE_BEHAVIOR, defaults={'today': date.today},
+                today=date.fromisoformat, days=int)
+def follow_up_summary_dataset(today, days=7):
+    """أعداد متابعات سجلات السلوك المتأخرة والمستحقة والقادمة (بالنسبة لتاريخ اليوم افتراضياً)"""
+    summary = follow_up_summary(today, days)
+    columns = ['overdue', 'due_today', 'upcoming', 'upcoming_days']
+    return columns, [[summary[column] for column in columns]]
+
+def _export_dataset(name):
+    def run(date_from=None, date_to=None, **filters):
+        statement = export_statement(name, date_from, date_to, **filters).limit(_max_rows())
+        return export_headers(name), iter_rows(name, statement)
+    run.__doc__ = f'صفوف {name} بأعمدة التصدير نفسها (بحد أقصى REPORT_MAX_ROWS)'
+    return run
+
+for _name, _spec in EXPORT_DATASETS.items():
+    report_dataset(
+        _name, _spec['permission'], date_from=_date_param, date_to=_end_date_param, **_spec['filters']
+    )(_export_dataset(_name))
+
+# تحديد أقسام التقرير ومفتاح لقطة البيانات
+
+def _json_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'قيمة غير قابلة للتحويل: {value!r}')
+
+def _canonical(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=_json_value)
+
+def _digest(value):
+    return hashlib.sha256(_canonical(value).encode('utf-8')).hexdigest()
+
+def resolve_sections(template, parameters=None):
+    """أقسام التقرير من template_config بالصيغة:
+    {"sections": [{"title": "...", "dataset": "quality_scores", "params": {"period": "2024-Q1"}}]}
+    معاملات القسم الثابتة في القالب تتقدم على معاملات طلب التقرير، وتُهمل المعاملات غير المسموحة للمصدر،
+    والقيم الافتراضية المعتمدة على التاريخ تُحسب هنا فتتغير اللقطة بتغير الفترة أو اليوم"""
+    parameters = parameters or {}
+    if not isinstance(parameters, dict):
+        raise ValueError('معاملات التقرير يجب أن تكون كائن JSON')
+    
+    sections = template.get_config().get('sections')
+    if not sections or not isinstance(sections, list):
+        raise ValueError('تكوين القالب لا يحتوي على أقسام')
+    
+    resolved = []
+    for section in sections:
+        dataset = section.get('dataset') if isinstance(section, dict) else None
+        if dataset not in REPORT_DATASETS:
+            raise ValueError(f'مصدر بيانات غير مدعوم: {dataset}')
+        
+        _, _, accepted, defaults = REPORT_DATASETS[dataset]
+        values = dict(parameters, **(section.get('params') or {}))
+        params = {}
+        for name, type_ in accepted.items():
+            if values.get(name) in (None, ''):
+                continue
+            try:
+                params[name] = type_(values[name])
+            except (TypeError, ValueError):
+                raise ValueError(f'قيمة غير صالحة للمعامل {name}: {values[name]}')
+        for name, default in defaults.items():
+            params.setdefault(name, default())
+        resolved.append({'title': section.get('title') or dataset, 'dataset': dataset, 'params': params})
+    return resolved
+
+def forbidden_sections(template, user):
+    """عناوين أقسام القالب التي لا يملك المستخدم صلاحية قراءة بياناتها"""
+    forbidden = []
+    for section in template.get_config().get('sections') or []:
+        dataset = section.get('dataset') if isinstance(section, dict) else None
+        if dataset in REPORT_DATASETS and not user.has_permission(REPORT_DATASETS[dataset][1]):
+            forbidden.append(section.get('title') or dataset)
+    return forbidden
+
+# التخزين المعنون بالمحتوى: لقطات البيانات ومفتاحها (القالب والمعاملات الفعلية لكل قسم)،
+# وملفات الإخراج ومفتاحها (محتوى اللقطة والعنوان والصيغة)
+
+def _folder(name):
+    path = os.path.join(current_app.config.get('REPORTS_FOLDER', 'reports'), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _write_atomic(path, write):
+    """الكتابة في ملف مؤقت ثم الاستبدال الذري حتى لا يُقرأ ملف ناقص"""
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _run_section(section):
+    function, _, _, _ = REPORT_DATASETS[section['dataset']]
+    columns, rows = function(**section['params'])
+    return dict(section, columns=list(columns), rows=[list(row) for row in rows])
+
+def load_snapshot(template, parameters=None):
+    """بيانات التقرير من لقطة مخزنة إن كان عمرها أقل من REPORT_SNAPSHOT_TTL، وإلا تشغيل الاستعلامات وحفظ لقطة جديدة"""
+    sections = resolve_sections(template, parameters)
+    key = _digest({'template_id': template.id, 'sections': sections})
+    path = os.path.join(_folder('snapshots'), f'{key}.json')
+    
+    ttl = current_app.config.get('REPORT_SNAPSHOT_TTL', 3600)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    
+    snapshot = {
+        'key': key,
+        'template_id': template.id,
+        'created_at': datetime.utcnow(),
+        'sections': [_run_section(section) for section in sections]
+    }
+    # التحويل إلى JSON ثم القراءة منه حتى تتطابق اللقطة الجديدة والمخزنة في أنواع القيم
+    content = _canonical(snapshot)
+    
+    def write(temp_path):
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    _write_atomic(path, write)
+    return json.loads(content)
+
+def render_report(report, extension, write):
+    """إخراج التقرير وتحديث file_path و file_size؛ البيانات نفسها بالعنوان نفسه تعيد استخدام الملف السابق"""
+    snapshot = load_snapshot(report.template, report.get_parameters())
+    digest = _digest({'sections': snapshot['sections'], 'title': report.title, 'format': extension})
+    path = os.path.join(_folder('files'), f'{digest}.{extension}')
+    
+    if not os.path.exists(path):
+        _write_atomic(path, lambda temp_path: write(temp_path, report.title, snapshot['sections']))
+    
+    report.file_path = path
+    report.file_size = os.path.getsize(path)
+    return path
+
+def _expired(folder, ttl):
+    """ملفات المجلد الأقدم من ttl (الملفات المؤقتة لعمليات كتابة جارية لا تُحذف)"""
+    now = time.time()
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not name.startswith('.tmp') and now - os.path.getmtime(path) >= ttl:
+            yield name, path
+
+def prune_report_cache():
+    """حذف اللقطات المنتهية وملفات الإخراج القديمة التي لا يشير إليها أي تقرير"""
+    ttl = current_app.config.get('REPORT_SNAPSHOT_TTL', 3600)
+    removed = 0
+    
+    for _, path in _expired(_folder('snapshots'), ttl):
+        os.remove(path)
+        removed += 1
+    
+    referenced = {
+        os.path.basename(file_path)
+        for (file_path,) in GeneratedReport.query.with_entities(GeneratedReport.file_path)
+            .filter(GeneratedReport.file_path.isnot(None))
+    }
+    # ملف حديث قد يكون لتقرير لم تُحفظ حالته بعد
+    for name, path in _expired(_folder('files'), ttl):
+        if name not in referenced:
+            os.remove(path)
+            removed += 1
+    
+    return removed
+
+# صيغ الإخراج
+
+def _sheet_title(index, title):
+    # أسماء أوراق Excel لا تتجاوز 31 حرفاً ولا تقبل بعض الرموز
+    return re.sub(r'[\[\]:*?/\\]', ' ', f'{index}. {title}')[:31]
+
+def write_excel(path, title, sections):
+    """ورقة لكل قسم بوضع write_only (ذاكرة ثابتة)"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    for index, section in enumerate(sections, 1):
+        sheet = workbook.create_sheet(_sheet_title(index, section['title']))
+        sheet.sheet_view.rightToLeft = True
+        sheet.append([xlsx_cell(sheet, title)])
+        sheet.append([xlsx_cell(sheet, section['title'])])
+        sheet.append([])
+        sheet.append(section['columns'])
+        for row in section['rows']:
+            sheet.append([
+                _canonical(value) if isinstance(value, (dict, list)) else xlsx_cell(sheet, value) for value in row
+            ])
+    workbook.save(path)
+
+def _shape(text):
+    """تشكيل الحروف العربية وترتيبها بصرياً لأن reportlab يرسم النص من اليسار لليمين"""
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+    
+    return get_display(arabic_reshaper.reshape(text))
+
+def _pdf_font():
+    """خط TrueType يدعم العربية من REPORT_PDF_FONT، أو Helvetica إن لم يتوفر الملف"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    
+    font_path = current_app.config.get('REPORT_PDF_FONT')
+    if not font_path or not os.path.exists(font_path):
+        return 'Helvetica'
+    if 'ReportFont' not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont('ReportFont', font_path))
+    return 'ReportFont'
+
+def _pdf_cell(value, max_length=60):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        value = _canonical(value)
+    text = str(value)
+    # ملف PDF للعرض فقط: النصوص الطويلة تُختصر والقيم الكاملة في صيغة Excel
+    if len(text) > max_length:
+        text = text[:max_length - 1] + '…'
+    return _shape(text)
+
+def write_pdf(path, title, sections):
+    """جدول لكل قسم في صفحات أفقية مع تكرار صف العناوين"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_RIGHT
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    
+    font = _pdf_font()
+    title_style = ParagraphStyle('ReportTitle', fontName=font, fontSize=16, leading=22, alignment=TA_RIGHT)
+    heading_style = ParagraphStyle('ReportHeading', fontName=font, fontSize=12, leading=18, alignment=TA_RIGHT,
+                                   spaceBefore=12, spaceAfter=6)
+    body_style = ParagraphStyle('ReportBody', fontName=font, fontSize=9, leading=12, alignment=TA_RIGHT)
+    
+    story = [Paragraph(escape(_shape(title)), title_style), Spacer(0, 8)]
+    for section in sections:
+        story.append(Paragraph(escape(_shape(section['title'])), heading_style))
+        if not section['rows']:
+            story.append(Paragraph(escape(_shape('لا توجد بيانات')), body_style))
+            continue
+        
+        data = [[_pdf_cell(column) for column in section['columns']]]
+        data.extend([_pdf_cell(value) for value in row] for row in section['rows'])
+        table = Table(data, repeatRows=1, hAlign='RIGHT')
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP')
+        ]))
+        story.append(table)
+    
+    document = SimpleDocTemplate(path, pagesize=landscape(A4), title=title,
+                                 leftMargin=24, rightMargin=24, topMargin=24, bottomMargin=24)
+    document.build(story)
+
+def render_excel(report):
+    return render_report(report, 'xlsx', write_excel)
+
+def render_pdf(report):
+    return render_report(report, 'pdf', write_pdf)
+
+REPORT_RENDERERS['excel'] = render_excel
+REPORT_RENDERERS['pdf'] = render_pdf
@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+from flask import current_app, request, make_response
+
+from src.models.auth import TokenPrincipal, permission_resolver
+
+class MemoryBackend:
+    """تخزين مؤقت داخل العملية بسياسة LRU وحد أقصى لعدد العناصر"""
+    
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # العناصر بلا مدة صلاحية (أرقام الأجيال) لا تخضع للإزالة
+        self._pinned = {}
+        self._lock = Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._pinned:
+                return self._pinned[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            if not ttl:
+                self._pinned[key] = value
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+
+class FileBackend:
+    """تخزين مؤقت في ملفات محلية مشتركة بين عمليات الخادم على الجهاز نفسه"""
+    
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.cache')
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+    
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        # الكتابة في ملف مؤقت ثم الاستبدال الذري حتى لا يقرأ طلب آخر ملفاً ناقصاً
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                os.remove(os.path.join(self.directory, name))
+
+class ResponseCache:
+    """تخزين مؤقت لاستجابات المسارات القرائية مع إبطال بالمجموعات ودعم ETag"""
+    
+    def __init__(self):
+        self.backend = None
+        self.default_ttl = 60
+        self._lock = Lock()
+    
+    def _configure(self, app):
+        with self._lock:
+            if self.backend is not None:
+                return
+            self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', self.default_ttl)
+            if app.config.get('RESPONSE_CACHE_BACKEND', 'memory') == 'file':
+                directory = app.config.get('RESPONSE_CACHE_DIR') or \
+                    os.path.join(app.root_path, 'database', 'response_cache')
+                self.backend = FileBackend(directory)
+            else:
+                self.backend = MemoryBackend(app.config.get('RESPONSE_CACHE_MAXSIZE', 512))
+    
+    def enabled(self):
+        return current_app.config.get('RESPONSE_CACHE_BACKEND', 'memory') != 'none'
+    
+    def _backend(self):
+        if self.backend is None:
+            self._configure(current_app)
+        return self.backend
+    
+    def _generation(self, namespace):
+        return self._backend().get(f'generation:{namespace}') or 0
+    
+    def invalidate(self, *namespaces):
+        """إبطال جميع الاستجابات المخزنة للمجموعات المحددة برفع رقم الجيل"""
+        if not self.enabled():
+            return
+        backend = self._backend()
+        for namespace in namespaces:
+            # رقم الجيل فريد زمنياً فلا يتعارض بين العمليات التي تشترك في الملفات
+            backend.set(f'generation:{namespace}', time.time_ns())
+    
+    def key(self, namespaces, scope):
+        generations = ','.join(f'{namespace}={self._generation(namespace)}' for namespace in namespaces)
+        # معاملات المسار (مثل kpi_id) جزء من المفتاح حتى لا تتشارك الموارد المختلفة استجابة واحدة
+        view_args = ','.join(f'{name}={value}' for name, value in sorted((request.view_args or {}).items()))
+        args = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+        return f'{request.endpoint}/{view_args}?{args}|{scope}|{generations}'
+    
+    def get(self, key):
+        return self._backend().get(key)
+    
+    def set(self, key, value, ttl=None):
+        self._backend().set(key, value, ttl or self.default_ttl)
+    
+    def clear(self):
+        self._backend().clear()
+
+response_cache = ResponseCache()
+
+def _permission_scope(user):
+    """بصمة صلاحيات المستدعي: المستخدمون بالصلاحيات نفسها يتشاركون الاستجابات المخزنة"""
+    if isinstance(user, TokenPrincipal):
+        permissions = user.permissions
+    else:
+        permissions = permission_resolver.resolve(user.id).permissions
+    return hashlib.sha1(','.join(sorted(permissions)).encode('utf-8')).hexdigest()
+
+def _conditional(response, etag):
+    """إرجاع 304 إذا كانت نسخة العميل مطابقة"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        response.set_data(b'')
+    return response
+
+def cached_response(*namespaces, ttl=None):
+    """ديكوريتر لتخزين استجابات المسارات القرائية (يُوضع بعد ديكوريتر الصلاحيات)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            if not response_cache.enabled():
+                return f(current_user, *args, **kwargs)
+            
+            key = response_cache.key(namespaces, _permission_scope(current_user))
+            entry = response_cache.get(key)
+            if entry is not None:
+                etag, body, mimetype = entry
+                # التحقق من ETag قبل بناء الاستجابة لتجنب إعادة الإرسال
+                return _conditional(current_app.response_class(body, status=200, mimetype=mimetype), etag)
+            
+            response = make_response(f(current_user, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+            
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            response_cache.set(key, (etag, body, response.mimetype), ttl)
+            return _conditional(response, etag)
+        
+        return decorated
+    return decorator
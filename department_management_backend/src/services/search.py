@@ -0,0 +1,245 @@
+from datetime import datetime
+import re
+
+from threading import Lock
+
+from sqlalchemy import event, select, literal_column, table, or_, and_, func, inspect
+
+from src.models.quality import db, QualityStandard, SearchDocument
+from src.models.auth import User
+from src.models.initiatives import Initiative, BehaviorRecord
+from src.services.sql import dialect_insert
+
+# الحقول المفهرسة لكل نوع سجل
+SEARCH_ENTITIES = {
+    'user': (User, ('username', 'full_name', 'email', 'national_id')),
+    'quality_standard': (QualityStandard, ('code', 'name', 'description')),
+    'initiative': (Initiative, ('title', 'description')),
+    'behavior_record': (BehaviorRecord, ('title', 'description'))
+}
+
+# التشكيل وعلامات القرآن والتطويل
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه'
+})
+
+def normalize_arabic(text):
+    """تطبيع النص العربي: حذف التشكيل وتوحيد أشكال الألف والياء والتاء المربوطة"""
+    if not text:
+        return ''
+    return ARABIC_DIACRITICS.sub('', str(text)).translate(ARABIC_FOLDING).lower()
+
+def _tokens(text):
+    return [token for token in re.split(r'\W+', normalize_arabic(text)) if token]
+
+def _like_pattern(text):
+    """نمط LIKE للبحث عن نص داخل المحتوى مع تهريب % و _ المدخلة من المستخدم"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+# هياكل الفهرس الخاصة بكل قاعدة بيانات، تُنشأ مع جدول search_documents
+# مقسم trigram يطابق أي جزء من النص (مثل جزء من رقم الهوية) كما كان البحث بـ contains
+SQLITE_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+    "content, content='search_documents', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END"
+)
+
+POSTGRESQL_INDEX_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING gin (to_tsvector('simple', content))",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_trgm ON search_documents USING gin (content gin_trgm_ops)"
+)
+
+def ensure_search_index(connection):
+    """إنشاء فهرس FTS5 (SQLite) أو فهارس tsvector والتشابه الثلاثي (PostgreSQL)"""
+    dialect = connection.dialect.name
+    rebuild = False
+    if dialect == 'sqlite':
+        existing = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'search_documents_fts'"
+        ).scalar()
+        # فهرس منشأ سابقاً بمقسم unicode61 يُستبدل ويُعاد ملؤه من search_documents
+        if existing and 'trigram' not in existing:
+            connection.exec_driver_sql('DROP TABLE search_documents_fts')
+            rebuild = True
+    
+    statements = {
+        'sqlite': SQLITE_INDEX_DDL,
+        'postgresql': POSTGRESQL_INDEX_DDL
+    }.get(dialect, ())
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    
+    if rebuild:
+        connection.exec_driver_sql(
+            "INSERT INTO search_documents_fts(search_documents_fts) VALUES ('rebuild')"
+        )
+
+@event.listens_for(SearchDocument.__table__, 'after_create')
+def _search_documents_created(target, connection, **kw):
+    ensure_search_index(connection)
+    # عند إضافة الجدول إلى قاعدة قائمة تُفهرس السجلات الموجودة فوراً
+    index_existing_records(connection)
+
+_index_checked = False
+_index_lock = Lock()
+
+def _ensure_index_once():
+    """ترقية فهرس SQLite المنشأ سابقاً مرة واحدة في كل عملية"""
+    global _index_checked
+    if _index_checked:
+        return
+    with _index_lock:
+        if not _index_checked:
+            with db.engine.begin() as connection:
+                ensure_search_index(connection)
+            _index_checked = True
+
+def document_text(target, fields):
+    values = [getattr(target, field) for field in fields]
+    return normalize_arabic(' '.join(str(value) for value in values if value))
+
+def index_documents(connection, documents):
+    """إضافة سجلات إلى الفهرس أو تحديثها: [{'entity_type', 'entity_id', 'content'}]"""
+    if not documents:
+        return
+    
+    statement = dialect_insert(connection.dialect.name)(SearchDocument.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['entity_type', 'entity_id'],
+        set_={'content': statement.excluded.content, 'updated_at': statement.excluded.updated_at}
+    )
+    now = datetime.utcnow()
+    connection.execute(statement, [dict(document, updated_at=now) for document in documents])
+
+def remove_document(connection, entity_type, entity_id):
+    documents = SearchDocument.__table__
+    connection.execute(documents.delete().where(
+        documents.c.entity_type == entity_type,
+        documents.c.entity_id == entity_id
+    ))
+
+def _register(entity_type, model, fields):
+    """مزامنة الفهرس مع السجلات عند الإدراج والتحديث والحذف"""
+    def indexed(mapper, connection, target):
+        state = db.inspect(target)
+        if not any(state.attrs[field].history.has_changes() for field in fields):
+            return
+        index_documents(connection, [{
+            'entity_type': entity_type,
+            'entity_id': target.id,
+            'content': document_text(target, fields)
+        }])
+    
+    def removed(mapper, connection, target):
+        remove_document(connection, entity_type, target.id)
+    
+    event.listen(model, 'after_insert', indexed)
+    event.listen(model, 'after_update', indexed)
+    event.listen(model, 'after_delete', removed)
+
+for _entity_type, (_model, _fields) in SEARCH_ENTITIES.items():
+    _register(_entity_type, _model, _fields)
+
+_indexed_entities = set()
+
+def _has_documents(entity_type):
+    """هل يحتوي الفهرس على سجلات من هذا النوع (النتيجة الإيجابية تُحفظ داخل العملية)"""
+    if entity_type in _indexed_entities:
+        return True
+    documents = SearchDocument.__table__
+    found = db.session.execute(
+        select(documents.c.id).where(documents.c.entity_type == entity_type).limit(1)
+    ).first() is not None
+    if found:
+        _indexed_entities.add(entity_type)
+    return found
+
+def _unindexed_ids(entity_type, text):
+    """البحث المباشر في الجدول الأصلي عندما لا يحتوي الفهرس بعد على أي سجل من هذا النوع"""
+    model, fields = SEARCH_ENTITIES[entity_type]
+    return select(model.id).where(or_(*[getattr(model, field).contains(text, autoescape=True) for field in fields]))
+
+def search_ids(entity_type, text):
+    """استعلام فرعي بمعرفات السجلات المطابقة لنص البحث (يُستخدم مع in_)"""
+    documents = SearchDocument.__table__
+    statement = select(documents.c.entity_id).where(documents.c.entity_type == entity_type)
+    tokens = _tokens(text)
+    if not tokens:
+        return statement
+    
+    _ensure_index_once()
+    if not _has_documents(entity_type):
+        return _unindexed_ids(entity_type, text)
+    
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # كل كلمة مطلوبة في أي موضع من النص؛ مقسم trigram يحتاج ثلاثة أحرف على الأقل
+        conditions = [
+            documents.c.content.like(_like_pattern(token), escape='\\')
+            for token in tokens if len(token) < 3
+        ]
+        trigrams = [token for token in tokens if len(token) >= 3]
+        if trigrams:
+            match = ' '.join(f'"{token}"' for token in trigrams)
+            matched = select(literal_column('rowid'))\
+                .select_from(table('search_documents_fts'))\
+                .where(literal_column('search_documents_fts').op('MATCH')(match))
+            conditions.append(documents.c.id.in_(matched))
+        return statement.where(and_(*conditions))
+    
+    if dialect == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        phrase = normalize_arabic(text).strip()
+        return statement.where(or_(
+            func.to_tsvector('simple', documents.c.content).op('@@')(func.to_tsquery('simple', query)),
+            # التشابه الثلاثي يغطي المطابقة الجزئية داخل الكلمات
+            documents.c.content.ilike(_like_pattern(phrase), escape='\\')
+        ))
+    
+    return statement.where(and_(*[
+        documents.c.content.like(_like_pattern(token), escape='\\') for token in tokens
+    ]))
+
+def index_existing_records(connection, batch_size=1000):
+    """فهرسة جميع السجلات الموجودة في الجداول الأصلية (الجداول غير المنشأة بعد تُتخطى)"""
+    existing_tables = set(inspect(connection).get_table_names())
+    total = 0
+    for entity_type, (model, fields) in SEARCH_ENTITIES.items():
+        if model.__tablename__ not in existing_tables:
+            continue
+        columns = [model.id] + [getattr(model, field) for field in fields]
+        rows = connection.execute(select(*columns).execution_options(yield_per=batch_size))
+        for partition in rows.partitions():
+            index_documents(connection, [
+                {
+                    'entity_type': entity_type,
+                    'entity_id': row[0],
+                    'content': normalize_arabic(' '.join(str(value) for value in row[1:] if value))
+                }
+                for row in partition
+            ])
+            total += len(partition)
+    return total
+
+def rebuild_search_index(batch_size=1000):
+    """إعادة بناء الفهرس من الجداول الأصلية"""
+    connection = db.session.connection()
+    ensure_search_index(connection)
+    connection.execute(SearchDocument.__table__.delete())
+    total = index_existing_records(connection, batch_size)
+    db.session.commit()
+    return total
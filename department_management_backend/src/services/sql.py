@@ -0,0 +1,9 @@
+def dialect_insert(dialect_name):
+    """الحصول على دالة insert الخاصة بقاعدة البيانات (تدعم ON CONFLICT)"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f'قاعدة البيانات غير مدعومة: {dialect_name}')
+    return insert
@@ -0,0 +1,136 @@
+import io
+import os
+import zipfile
+
+import pandas as pd
+from sqlalchemy import select, table, column
+
+from department_management_backend.src.database import db
+from department_management_backend.src.models.surveys import SurveyQuestion, SurveyResponse, QuestionAnswer
+
+# جدول المستخدمين (للتخصص وسنة الالتحاق) دون ربط نماذج الاستبيانات بنموذج المستخدم
+users_table = table('users', column('id'), column('specialization'), column('created_at'))
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+def _read_frame(statement, batch_size):
+    """قراءة نتيجة استعلام على دفعات كبيرة وتحويل كل دفعة إلى أعمدة مباشرة"""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    columns = list(result.keys())
+    frames = [pd.DataFrame.from_records(rows, columns=columns) for rows in result.partitions()]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def load_answer_frame(survey_id, batch_size=50000):
+    """إجابات الاستبيان مع بيانات الاستجابة والمتدرب في إطار بيانات واحد"""
+    answers = _read_frame(
+        select(
+            QuestionAnswer.response_id,
+            QuestionAnswer.question_id,
+            QuestionAnswer.answer_value,
+            QuestionAnswer.answer_text,
+            SurveyResponse.trainee_id,
+            SurveyResponse.submitted_at
+        )
+        .join(SurveyResponse, SurveyResponse.id == QuestionAnswer.response_id)
+        .where(SurveyResponse.survey_id == survey_id),
+        batch_size
+    )
+    
+    questions = _read_frame(
+        select(SurveyQuestion.id.label('question_id'), SurveyQuestion.question_text, SurveyQuestion.question_type)
+        .where(SurveyQuestion.survey_id == survey_id),
+        batch_size
+    )
+    answers = answers.merge(questions, on='question_id', how='left')
+    
+    trainee_ids = answers['trainee_id'].dropna().unique().tolist()
+    trainees = pd.DataFrame(columns=['trainee_id', 'specialization', 'created_at'])
+    if trainee_ids:
+        trainees = _read_frame(
+            select(users_table.c.id.label('trainee_id'), users_table.c.specialization, users_table.c.created_at)
+            .where(users_table.c.id.in_(trainee_ids)),
+            batch_size
+        )
+    answers = answers.merge(trainees, on='trainee_id', how='left')
+    
+    answers['answer_value'] = pd.to_numeric(answers['answer_value'], errors='coerce')
+    answers['specialization'] = answers['specialization'].fillna('غير محدد')
+    # الدفعة = سنة تسجيل المتدرب في النظام
+    years = pd.to_datetime(answers.pop('created_at'), errors='coerce').dt.year
+    answers['cohort'] = years.astype('Int64').astype('string').fillna('غير محدد')
+    return answers
+
+def _likert_index(means, scale):
+    """تحويل المتوسط إلى مؤشر من 0 إلى 100 على مقياس ليكرت"""
+    return (means - 1) / (scale - 1) * 100
+
+def build_survey_analytics(survey_id, scale=5, batch_size=50000):
+    """الجداول التحليلية للاستبيان محسوبة بعمليات متجهة على الأعمدة"""
+    answers = load_answer_frame(survey_id, batch_size)
+    rated = answers[answers['answer_value'].notna()]
+    
+    grouped = rated.groupby('question_id')['answer_value']
+    summary = grouped.agg(['count', 'mean', 'std', 'median'])
+    summary['likert_index'] = _likert_index(summary['mean'], scale)
+    # نسبة الإجابات في أعلى درجتين من المقياس
+    summary['top_two_box'] = (rated['answer_value'] >= scale - 1).groupby(rated['question_id']).mean() * 100
+    summary = answers[['question_id', 'question_text']].drop_duplicates('question_id')\
+        .set_index('question_id')\
+        .join(summary, how='inner')\
+        .reset_index()
+    
+    distribution = pd.crosstab(rated['question_id'], rated['answer_value'], normalize='index') * 100
+    
+    tables = {
+        'question_summary': summary,
+        'distribution': distribution.reset_index(),
+        'by_specialization': rated.pivot_table(
+            index='question_id', columns='specialization', values='answer_value', aggfunc='mean'
+        ).reset_index(),
+        'by_cohort': rated.pivot_table(
+            index='question_id', columns='cohort', values='answer_value', aggfunc='mean'
+        ).reset_index(),
+        'likert_by_specialization': _likert_index(
+            rated.groupby('specialization')['answer_value'].mean(), scale
+        ).rename('likert_index').reset_index(),
+        'answers': answers
+    }
+    for frame in tables.values():
+        frame.columns = [str(name) for name in frame.columns]
+    return tables
+
+def _write(frame, target, fmt):
+    if fmt == 'parquet':
+        # يتطلب pyarrow
+        frame.to_parquet(target, index=False)
+    else:
+        frame.to_csv(target, index=False, encoding='utf-8-sig')
+
+def export_survey_analytics(survey_id, output_dir, fmt='csv', scale=5):
+    """كتابة الجداول التحليلية إلى ملفات CSV أو Parquet للتحليل خارج النظام"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'صيغة التصدير غير مدعومة: {fmt}')
+    
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, frame in build_survey_analytics(survey_id, scale).items():
+        path = os.path.join(output_dir, f'survey_{survey_id}_{name}.{fmt}')
+        _write(frame, path, fmt)
+        paths.append(path)
+    return paths
+
+def export_survey_analytics_archive(survey_id, fmt='csv', scale=5):
+    """الجداول التحليلية في ملف ZIP داخل الذاكرة"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'صيغة التصدير غير مدعومة: {fmt}')
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, frame in build_survey_analytics(survey_id, scale).items():
+            buffer = io.BytesIO()
+            _write(frame, buffer, fmt)
+            zf.writestr(f'survey_{survey_id}_{name}.{fmt}', buffer.getvalue())
+    archive.seek(0)
+    return archive
@@ -0,0 +1,251 @@
+from collections import OrderedDict
+from threading import Thread, Lock, Event
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from department_management_backend.src.services.survey_submission import submit_survey_responses
+
+class SurveyBuffer:
+    """مخزن مؤقت للكتابة المؤجلة: سجل إلحاق محلي (SQLite بوضع WAL) ينقل الاستجابات إلى قاعدة البيانات على دفعات"""
+    
+    def __init__(self, path=None, batch_size=500, max_lag=5.0, lease_seconds=60):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_lag = max_lag
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._connection = None
+        self._app = None
+        self._thread = None
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._lock = Lock()
+        self._journal_lock = Lock()
+    
+    def configure(self, app):
+        """قراءة الإعدادات من تطبيق Flask"""
+        self._app = app
+        self.path = app.config.get('SURVEY_BUFFER_PATH') or self.path or \
+            os.path.join(app.root_path, 'database', 'survey_buffer.db')
+        self.batch_size = app.config.get('SURVEY_BUFFER_BATCH_SIZE', self.batch_size)
+        self.max_lag = app.config.get('SURVEY_BUFFER_MAX_LAG', self.max_lag)
+        self.lease_seconds = app.config.get('SURVEY_BUFFER_LEASE', self.lease_seconds)
+    
+    def _open(self):
+        if self._connection is not None:
+            return self._connection
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # لا يُؤكَّد الاستلام قبل وصول الإدخال إلى القرص
+        connection.execute('PRAGMA synchronous=FULL')
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                survey_id INTEGER NOT NULL,
+                submission_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                claimed_by TEXT,
+                claimed_at REAL
+            )
+        ''')
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS failed_entries (
+                id INTEGER PRIMARY KEY,
+                survey_id INTEGER NOT NULL,
+                submission_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                failed_at REAL NOT NULL,
+                error TEXT
+            )
+        ''')
+        self._connection = connection
+        return connection
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, app):
+        """فتح السجل وتشغيل خيط النقل؛ الإدخالات المتبقية من تشغيل سابق تُعاد معالجتها أولاً"""
+        if self.running:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.configure(app)
+            with self._journal_lock:
+                self._open()
+            self._stopping.clear()
+            self._thread = Thread(target=self._run, name='survey-buffer', daemon=True)
+            self._thread.start()
+    
+    def append(self, survey_id, submission):
+        """إلحاق استجابة بالسجل المحلي بشكل دائم وإرجاع مفتاح الإرسال"""
+        submission = dict(submission)
+        submission['submission_key'] = submission.get('submission_key') or uuid.uuid4().hex
+        
+        with self._journal_lock:
+            self._open().execute(
+                'INSERT INTO entries (survey_id, submission_key, payload, received_at) VALUES (?, ?, ?, ?)',
+                (survey_id, submission['submission_key'], json.dumps(submission, ensure_ascii=False), time.time())
+            )
+        
+        self._wakeup.set()
+        return submission['submission_key']
+    
+    def pending(self):
+        """عدد الإدخالات المنتظرة وعمر أقدمها بالثواني"""
+        with self._journal_lock:
+            count, oldest = self._open().execute('SELECT COUNT(*), MIN(received_at) FROM entries').fetchone()
+        return count, (time.time() - oldest) if oldest else 0.0
+    
+    def _claim(self):
+        """حجز دفعة من الإدخالات؛ حجوزات العمليات المتوقفة تنتهي بعد مدة الإيجار"""
+        now = time.time()
+        with self._journal_lock:
+            connection = self._open()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('''
+                    UPDATE entries SET claimed_by = ?, claimed_at = ?
+                    WHERE id IN (
+                        SELECT id FROM entries
+                        WHERE claimed_by IS NULL OR claimed_by = ? OR claimed_at < ?
+                        ORDER BY id LIMIT ?
+                    )
+                ''', (self.owner, now, self.owner, now - self.lease_seconds, self.batch_size))
+                rows = connection.execute(
+                    'SELECT id, survey_id, submission_key, payload, received_at FROM entries WHERE claimed_by = ? ORDER BY id',
+                    (self.owner,)
+                ).fetchall()
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return rows
+    
+    def _settle(self, done_ids, failed):
+        with self._journal_lock:
+            connection = self._open()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                for (entry_id, survey_id, submission_key, payload, received_at), error in failed:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO failed_entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (entry_id, survey_id, submission_key, payload, received_at, now, error)
+                    )
+                ids = list(done_ids) + [entry[0] for entry, _ in failed]
+                connection.executemany('DELETE FROM entries WHERE id = ?', [(entry_id,) for entry_id in ids])
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+    
+    def _release(self):
+        with self._journal_lock:
+            self._open().execute('UPDATE entries SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?', (self.owner,))
+    
+    def flush_batch(self):
+        """نقل دفعة واحدة إلى قاعدة البيانات وإرجاع عدد الإدخالات المحسومة، ويتطلب سياق التطبيق"""
+        entries = self._claim()
+        if not entries:
+            return 0
+        
+        by_survey = OrderedDict()
+        for entry in entries:
+            by_survey.setdefault(entry[1], []).append(entry)
+        
+        done_ids = []
+        failed = []
+        retry = 0
+        try:
+            for survey_id, survey_entries in by_survey.items():
+                results = submit_survey_responses(survey_id, [json.loads(entry[3]) for entry in survey_entries])
+                for entry, result in zip(survey_entries, results):
+                    if result['status'] != 'failed':
+                        done_ids.append(entry[0])
+                    elif result.get('retryable'):
+                        # خطأ مؤقت في قاعدة البيانات: الإدخال مؤكَّد الاستلام فيبقى في السجل لمحاولة لاحقة
+                        retry += 1
+                    else:
+                        failed.append((entry, result['error']))
+        except Exception:
+            # تعذر الوصول إلى قاعدة البيانات: الإدخالات تبقى في السجل ويُعاد المحاولة لاحقاً
+            # (ما حُفظ منها قبل الخطأ يُتعرَّف عليه بمفتاح الإرسال فلا يتكرر)
+            self._release()
+            raise
+        
+        self._settle(done_ids, failed)
+        if retry:
+            self._release()
+        return len(entries) - retry
+    
+    def flush(self):
+        """نقل جميع الإدخالات المنتظرة"""
+        total = 0
+        while True:
+            count = self.flush_batch()
+            if not count:
+                return total
+            total += count
+    
+    def _due(self):
+        count, age = self.pending()
+        return count >= self.batch_size or (count and age >= self.max_lag)
+    
+    def _run(self):
+        # فترة الفحص ربع الحد الأقصى للتأخير ليبقى التأخير الفعلي ضمن الحد
+        interval = max(self.max_lag / 4.0, 0.05)
+        replay = True
+        while not self._stopping.is_set():
+            try:
+                if replay or self._due():
+                    with self._app.app_context():
+                        self.flush()
+                    replay = False
+            except Exception as e:
+                print(f"خطأ في نقل استجابات الاستبيانات: {e}")
+            
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+    
+    def stop(self, timeout=10.0):
+        """إيقاف خيط النقل ونقل ما تبقى في السجل"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"خطأ في نقل استجابات الاستبيانات: {e}")
+    
+    def failed_entries(self, limit=100):
+        with self._journal_lock:
+            rows = self._open().execute(
+                'SELECT id, survey_id, submission_key, failed_at, error FROM failed_entries ORDER BY id DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [
+            {'id': row[0], 'survey_id': row[1], 'submission_key': row[2], 'failed_at': row[3], 'error': row[4]}
+            for row in rows
+        ]
+
+survey_buffer = SurveyBuffer()
+atexit.register(survey_buffer.stop)
+
+def start_survey_buffer(app):
+    survey_buffer.start(app)
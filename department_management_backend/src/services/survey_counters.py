@@ -0,0 +1,29 @@
+from sqlalchemy import func, or_, select
+
+def reserve_responses(session, survey_model, survey_id, count=1):
+    """حجز مقاعد استجابة بتحديث ذري مشروط (دون أقفال صريحة أو استعلام COUNT)"""
+    table = survey_model.__table__
+    current = func.coalesce(table.c.response_count, 0)
+    result = session.execute(
+        table.update()
+        .where(
+            table.c.id == survey_id,
+            or_(table.c.max_responses.is_(None), current + count <= table.c.max_responses)
+        )
+        .values(response_count=current + count)
+    )
+    return result.rowcount == 1
+
+def reconcile_response_counts(session, survey_model, response_model):
+    """تصحيح انحراف العدادات بمقارنتها بالعدد الفعلي للاستجابات، وإرجاع عدد الاستبيانات المصححة"""
+    table = survey_model.__table__
+    responses = response_model.__table__
+    actual = select(func.count(responses.c.id))\
+        .where(responses.c.survey_id == table.c.id)\
+        .scalar_subquery()
+    result = session.execute(
+        table.update()
+        .where(func.coalesce(table.c.response_count, -1) != actual)
+        .values(response_count=actual)
+    )
+    return result.rowcount
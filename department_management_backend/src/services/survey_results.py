@@ -0,0 +1,151 @@
+from datetime import datetime
+import json
+import math
+
+from department_management_backend.src.database import db
+from department_management_backend.src.models.surveys import SurveyQuestion, QuestionAnswer, QuestionAggregate
+from department_management_backend.src.services.sql import dialect_insert
+
+# أنواع الأسئلة التي تُحسب لها توزيعات الخيارات
+CHOICE_QUESTION_TYPES = ('radio', 'checkbox', 'select', 'choice')
+
+def _options(answer):
+    """خيارات الإجابة؛ أسئلة الاختيار المتعدد تُرسل قائمة JSON في answer_text"""
+    text = answer.get('answer_text')
+    if text is None:
+        return [str(answer['answer_value'])] if answer.get('answer_value') is not None else []
+    if text.startswith('['):
+        try:
+            values = json.loads(text)
+            if isinstance(values, list):
+                return [str(value) for value in values]
+        except ValueError:
+            pass
+    return [text]
+
+def aggregate_answers(answers, question_types):
+    """تجميع دفعة إجابات في فروقات {(question_id, option): [count, value_count, sum, sum_squares]}"""
+    deltas = {}
+    
+    def add(key, value=None):
+        delta = deltas.setdefault(key, [0, 0, 0.0, 0.0])
+        delta[0] += 1
+        if value is not None:
+            delta[1] += 1
+            delta[2] += value
+            delta[3] += value * value
+    
+    for answer in answers:
+        add((answer['question_id'], ''), answer.get('answer_value'))
+        if question_types.get(answer['question_id']) in CHOICE_QUESTION_TYPES:
+            for option in _options(answer):
+                add((answer['question_id'], option[:255]))
+    
+    return deltas
+
+def apply_aggregates(connection, deltas):
+    """إضافة الفروقات إلى التجميعات بعبارة upsert واحدة لكل سؤال وخيار"""
+    if not deltas:
+        return
+    
+    table = QuestionAggregate.__table__
+    statement = dialect_insert(connection.dialect.name)(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['question_id', 'option'],
+        set_={
+            'count': table.c.count + statement.excluded.count,
+            'value_count': table.c.value_count + statement.excluded.value_count,
+            'value_sum': table.c.value_sum + statement.excluded.value_sum,
+            'value_sum_squares': table.c.value_sum_squares + statement.excluded.value_sum_squares,
+            'updated_at': statement.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    # ترتيب ثابت للمفاتيح يقلل احتمال الجمود بين المعاملات المتزامنة
+    connection.execute(statement, [
+        {
+            'question_id': question_id,
+            'option': option,
+            'count': count,
+            'value_count': value_count,
+            'value_sum': value_sum,
+            'value_sum_squares': value_sum_squares,
+            'updated_at': now
+        }
+        for (question_id, option), (count, value_count, value_sum, value_sum_squares) in sorted(deltas.items())
+    ])
+
+def _summary(aggregate):
+    summary = {'answers': aggregate.count if aggregate else 0}
+    if aggregate and aggregate.value_count:
+        n = aggregate.value_count
+        mean = aggregate.value_sum / n
+        variance = (aggregate.value_sum_squares - n * mean * mean) / (n - 1) if n > 1 else 0.0
+        summary.update({
+            'rated': n,
+            'mean': round(mean, 4),
+            'std_dev': round(math.sqrt(max(variance, 0.0)), 4)
+        })
+    return summary
+
+def get_survey_results(survey_id):
+    """نتائج الاستبيان من التجميعات، بتكلفة تتناسب مع عدد الأسئلة وليس عدد الإجابات"""
+    questions = SurveyQuestion.query.filter_by(survey_id=survey_id).order_by(SurveyQuestion.id).all()
+    
+    aggregates = {}
+    if questions:
+        rows = QuestionAggregate.query.filter(
+            QuestionAggregate.question_id.in_([question.id for question in questions])
+        ).all()
+        for row in rows:
+            aggregates.setdefault(row.question_id, {})[row.option] = row
+    
+    results = []
+    for question in questions:
+        question_aggregates = aggregates.get(question.id, {})
+        result = {
+            'question_id': question.id,
+            'question_text': question.question_text,
+            'question_type': question.question_type
+        }
+        result.update(_summary(question_aggregates.get('')))
+        if question.question_type in CHOICE_QUESTION_TYPES:
+            result['options'] = {
+                option: aggregate.count
+                for option, aggregate in sorted(question_aggregates.items()) if option
+            }
+        results.append(result)
+    
+    return {'survey_id': survey_id, 'questions': results}
+
+def rebuild_survey_results(survey_id=None, batch_size=5000):
+    """إعادة حساب التجميعات من الإجابات الأصلية (لاستبيان واحد أو للجميع)"""
+    questions = db.session.query(SurveyQuestion.id, SurveyQuestion.question_type)
+    if survey_id is not None:
+        questions = questions.filter(SurveyQuestion.survey_id == survey_id)
+    question_types = dict(questions.all())
+    if not question_types:
+        return 0
+    
+    question_ids = list(question_types)
+    connection = db.session.connection()
+    connection.execute(QuestionAggregate.__table__.delete().where(QuestionAggregate.question_id.in_(question_ids)))
+    
+    answers = db.session.query(
+        QuestionAnswer.question_id, QuestionAnswer.answer_text, QuestionAnswer.answer_value
+    ).filter(QuestionAnswer.question_id.in_(question_ids)).execution_options(yield_per=batch_size)
+    
+    batch = []
+    total = 0
+    for question_id, answer_text, answer_value in answers:
+        batch.append({'question_id': question_id, 'answer_text': answer_text, 'answer_value': answer_value})
+        if len(batch) >= batch_size:
+            apply_aggregates(connection, aggregate_answers(batch, question_types))
+            total += len(batch)
+            batch = []
+    if batch:
+        apply_aggregates(connection, aggregate_answers(batch, question_types))
+        total += len(batch)
+    
+    db.session.commit()
+    return total
@@ -0,0 +1,172 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from department_management_backend.src.database import db
+from department_management_backend.src.models.surveys import Survey, SurveyQuestion, SurveyResponse, QuestionAnswer
+from department_management_backend.src.services.survey_results import aggregate_answers, apply_aggregates
+from department_management_backend.src.services.survey_counters import reserve_responses, reconcile_response_counts
+from department_management_backend.src.services.activity_rollups import record_survey_ratings
+
+SURVEY_FULL_ERROR = 'Survey has reached its maximum number of responses'
+
+class InvalidSubmission(ValueError):
+    pass
+
+def _optional_int(value, name):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise InvalidSubmission(f'Invalid value for {name}: {value}')
+    return value
+
+def _normalize(submission, question_types):
+    """التحقق من استجابة واحدة وتحويلها إلى صفوف جاهزة للإدراج"""
+    if not isinstance(submission, dict):
+        raise InvalidSubmission('Invalid response format')
+    
+    answers = submission.get('answers', [])
+    if not isinstance(answers, list):
+        raise InvalidSubmission('answers must be a list')
+    
+    rows = []
+    seen = set()
+    for answer in answers:
+        if not isinstance(answer, dict) or 'question_id' not in answer:
+            raise InvalidSubmission('Each answer must include question_id')
+        question_id = answer['question_id']
+        if question_id not in question_types:
+            raise InvalidSubmission(f'Question {question_id} does not belong to this survey')
+        if question_id in seen:
+            raise InvalidSubmission(f'Duplicate answer for question {question_id}')
+        seen.add(question_id)
+        
+        answer_text = answer.get('answer_text')
+        if answer_text is not None and not isinstance(answer_text, str):
+            answer_text = str(answer_text)
+        rows.append({
+            'question_id': question_id,
+            'answer_text': answer_text,
+            'answer_value': _optional_int(answer.get('answer_value'), 'answer_value')
+        })
+    
+    submission_key = submission.get('submission_key')
+    if submission_key is not None and (not isinstance(submission_key, str) or not 0 < len(submission_key) <= 64):
+        raise InvalidSubmission('Invalid submission_key')
+    
+    return {
+        'response': {
+            'trainee_id': _optional_int(submission.get('trainee_id'), 'trainee_id'),
+            'trainer_id': _optional_int(submission.get('trainer_id'), 'trainer_id'),
+            'submission_key': submission_key
+        },
+        'answers': rows
+    }
+
+def _insert(survey_id, items, question_types):
+    """إدراج الاستجابات ثم جميع إجاباتها بعبارتين جماعيتين وتحديث تجميعات النتائج ولوحة التحكم، مع إرجاع معرفات الاستجابات بالترتيب"""
+    submitted_at = datetime.utcnow()
+    response_ids = db.session.scalars(
+        insert(SurveyResponse).returning(SurveyResponse.id, sort_by_parameter_order=True),
+        [dict(item['response'], survey_id=survey_id, submitted_at=submitted_at) for item in items]
+    ).all()
+    
+    answers = [
+        dict(answer, response_id=response_id)
+        for response_id, item in zip(response_ids, items)
+        for answer in item['answers']
+    ]
+    if answers:
+        db.session.execute(insert(QuestionAnswer), answers)
+        apply_aggregates(db.session.connection(), aggregate_answers(answers, question_types))
+        record_survey_ratings(db.session.connection(), items, question_types)
+    
+    return response_ids
+
+def _question_types(survey_id):
+    return dict(
+        db.session.query(SurveyQuestion.id, SurveyQuestion.question_type)
+        .filter(SurveyQuestion.survey_id == survey_id)
+        .all()
+    )
+
+def validate_submission(survey_id, submission):
+    """التحقق من استجابة دون حفظها"""
+    return _normalize(submission, _question_types(survey_id))
+
+def _existing_keys(keys):
+    if not keys:
+        return {}
+    return dict(
+        db.session.query(SurveyResponse.submission_key, SurveyResponse.id)
+        .filter(SurveyResponse.submission_key.in_(keys))
+        .all()
+    )
+
+def _reserve_slots(survey_id, items):
+    """حجز مقاعد للدفعة بتحديث ذري واحد، أو واحداً تلو الآخر عندما لا يتسع الحد الأقصى للدفعة كاملة"""
+    if reserve_responses(db.session, Survey, survey_id, len(items)):
+        return items, []
+    for position in range(len(items)):
+        if not reserve_responses(db.session, Survey, survey_id):
+            return items[:position], items[position:]
+    return items, []
+
+def submit_survey_responses(survey_id, submissions):
+    """حفظ مجموعة استجابات لاستبيان في معاملة واحدة، مع نتيجة مستقلة لكل عنصر"""
+    question_types = _question_types(survey_id)
+    
+    results = [None] * len(submissions)
+    normalized = []
+    for index, submission in enumerate(submissions):
+        try:
+            normalized.append((index, _normalize(submission, question_types)))
+        except InvalidSubmission as e:
+            results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+    
+    # المفتاح المحفوظ سابقاً يعني أن الاستجابة أُدرجت من قبل (إعادة إرسال العميل أو إعادة تشغيل المخزن المؤقت)
+    existing = _existing_keys([item['response']['submission_key'] for _, item in normalized if item['response']['submission_key']])
+    valid = []
+    batch_keys = set()
+    for index, item in normalized:
+        key = item['response']['submission_key']
+        if key in existing:
+            results[index] = {'index': index, 'status': 'duplicate', 'response_id': existing[key]}
+        elif key is not None and key in batch_keys:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Duplicate submission_key in batch'}
+        else:
+            batch_keys.add(key)
+            valid.append((index, item))
+    
+    if valid:
+        try:
+            # الحجز والإدراج في المعاملة نفسها: فشل الإدراج يلغي الحجز تلقائياً
+            accepted, rejected = _reserve_slots(survey_id, valid)
+            response_ids = _insert(survey_id, [item for _, item in accepted], question_types) if accepted else []
+            db.session.commit()
+            for (index, _), response_id in zip(accepted, response_ids):
+                results[index] = {'index': index, 'status': 'created', 'response_id': response_id}
+            for index, _ in rejected:
+                results[index] = {'index': index, 'status': 'failed', 'error': SURVEY_FULL_ERROR}
+        except Exception:
+            db.session.rollback()
+            # فشل الدفعة كاملة: إعادة المحاولة لكل عنصر على حدة لتحديد العناصر الفاشلة
+            for index, item in valid:
+                try:
+                    with db.session.begin_nested():
+                        if not reserve_responses(db.session, Survey, survey_id):
+                            results[index] = {'index': index, 'status': 'failed', 'error': SURVEY_FULL_ERROR}
+                            continue
+                        response_id = _insert(survey_id, [item], question_types)[0]
+                    results[index] = {'index': index, 'status': 'created', 'response_id': response_id}
+                except Exception as e:
+                    results[index] = {'index': index, 'status': 'failed', 'error': f'Failed to save response: {e}', 'retryable': True}
+            db.session.commit()
+    
+    return results
+
+def reconcile_survey_counters():
+    """تصحيح عدادات الاستجابات للاستبيانات"""
+    fixed = reconcile_response_counts(db.session, Survey, SurveyResponse)
+    db.session.commit()
+    return fixed